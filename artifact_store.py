@@ -0,0 +1,61 @@
+"""
+Artifact Store for UniMAP Student Bot
+
+Raw pages captured for debugging (for example a login page that did not
+have the expected form) are written here instead of into the log. The
+store keeps a limited number of files and a limited total size, deleting
+the oldest artifacts first.
+"""
+
+import os
+import re
+import time
+import uuid
+import logging
+
+ARTIFACTS_DIR = "artifacts"
+MAX_ARTIFACTS = 20  # Maximum number of files kept
+MAX_ARTIFACT_BYTES = 10 * 1024 * 1024  # Maximum total size of all files
+MAX_ARTIFACT_SIZE = 1024 * 1024  # Larger artifacts are truncated
+
+
+def save_artifact(name: str, content: str) -> str:
+    """
+    Save a raw page or other debugging artifact and prune old ones.
+
+    Args:
+        name: Short description used in the file name (e.g. "login_form_missing")
+        content: Text to store
+
+    Returns:
+        str: Path of the saved file, or "" if it could not be written
+    """
+    try:
+        os.makedirs(ARTIFACTS_DIR, exist_ok=True)
+        safe_name = re.sub(r'[^A-Za-z0-9_-]+', '_', name)[:50]
+        path = os.path.join(ARTIFACTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}-{safe_name}.html")
+        data = content.encode('utf-8', errors='replace')[:MAX_ARTIFACT_SIZE]
+        with open(path, 'wb') as f:
+            f.write(data)
+        prune_artifacts()
+        return path
+    except Exception as e:
+        logging.error(f"Error saving artifact {name}: {str(e)}")
+        return ""
+
+
+def prune_artifacts():
+    """Delete the oldest artifacts until the count and size limits are met."""
+    entries = []
+    for file_name in os.listdir(ARTIFACTS_DIR):
+        path = os.path.join(ARTIFACTS_DIR, file_name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+
+    total_size = sum(size for _, size, _ in entries)
+    while entries and (len(entries) > MAX_ARTIFACTS or total_size > MAX_ARTIFACT_BYTES):
+        _, size, path = entries.pop(0)
+        os.remove(path)
+        total_size -= size
@@ -1,22 +1,26 @@
 import os
+import copy
 import json
 import requests
 from bs4 import BeautifulSoup
+from dataclasses import replace
 from datetime import datetime
+from urllib.parse import urljoin
 import pytz
 from models import Assignment
-from typing import List, Dict
+from journal import journal
+from blob_store import blobs
+from page_fingerprint import page_cache
+from crawl_planner import planner, load_stale_courses
+from clock import clock
+from search_index import search_index
+from calendar_sync import fetch_calendar_lines, iter_calendar_events, apply_calendar_deadlines
+from moodle_ajax import fetch_overview, apply_deadlines
+from recent_activity import RecentActivity, module_url
+from typing import List, Dict, Optional, Tuple
 import logging
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('assignment_tracker.log'),
-        logging.StreamHandler()
-    ]
-)
+# Logging is configured once by the application (see log_config.py)
 
 # Import course configuration from config.py
 from config import COURSES
@@ -27,7 +31,16 @@ TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8
 # File to store assignments
 ASSIGNMENTS_FILE = "assignments.json"
 
-def load_assignments() -> Dict:
+# Date format used by Moodle for due dates, e.g. "Friday, 14 March 2025, 11:59 PM"
+MOODLE_DATE_FORMAT = '%A, %d %B %Y, %I:%M %p'
+
+# Submission states from the assignment index that mean nothing was submitted yet
+NO_SUBMISSION_STATES = {"No submission", "No attempt", "-", ""}
+
+# Seconds between due date refreshes from the calendar export (see refresh_deadlines)
+DEADLINE_REFRESH_INTERVAL = 3 * 3600
+
+def load_assignments() -> Dict[str, Assignment]:
     """Load saved assignments from file"""
     try:
         logging.info("Loading assignments from assignments.json")
@@ -35,21 +48,87 @@ def load_assignments() -> Dict:
             logging.info("assignments.json not found, creating new file")
             return {}
         with open(ASSIGNMENTS_FILE, 'r') as f:
-            return json.load(f)
+            records = json.load(f)
+        assignments = {}
+        for assignment_id, record in records.items():
+            description_ref = record.pop('description_blob', None)
+            if description_ref:
+                try:
+                    record['description'] = blobs.get_text(description_ref)
+                except ValueError as e:
+                    logging.error(f"Missing description of assignment {assignment_id}: {str(e)}")
+            assignments[assignment_id] = Assignment.from_dict(record)
+        return assignments
     except Exception as e:
         logging.error(f"Error loading assignments: {str(e)}")
         return {}
 
 def save_assignments(assignments: Dict[str, Assignment]):
-    """Save assignments to file"""
+    """
+    Save assignments to file.
+    
+    Descriptions are stored in the blob store and referenced by hash, so the
+    file only holds the compact fields and unchanged descriptions are not
+    written again.
+    """
     try:
         logging.info("Saving assignments to assignments.json")
-        with open(ASSIGNMENTS_FILE, 'w') as f:
-            json.dump({k: v.to_dict() for k, v in assignments.items()}, f, indent=4)
+        records = {assignment_id: assignment.to_dict() for assignment_id, assignment in assignments.items()}
+        described = [record for record in records.values() if record['description']]
+        for record, ref in zip(described, blobs.put_texts([record['description'] for record in described])):
+            record['description_blob'] = ref
+        for record in records.values():
+            del record['description']
+        tmp_path = f"{ASSIGNMENTS_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(records, f, separators=(',', ':'))
+        os.replace(tmp_path, ASSIGNMENTS_FILE)
         logging.info("Successfully saved assignments")
     except Exception as e:
         logging.error(f"Error saving assignments: {str(e)}")
 
+def stored_description_refs() -> List[str]:
+    """Blob hashes of the descriptions referenced by assignments.json"""
+    if not os.path.exists(ASSIGNMENTS_FILE):
+        return []
+    with open(ASSIGNMENTS_FILE, 'r') as f:
+        return [record['description_blob'] for record in json.load(f).values() if record.get('description_blob')]
+
+def save_state_snapshot():
+    """
+    Keep a snapshot of the stored course trees and assignments (see blob_store.py).
+    
+    Only the courses changed since the last snapshot are encoded again; the
+    others point to the blobs of the last snapshot. Safe to call from a
+    worker thread.
+    """
+    try:
+        with journal.lock:
+            courses = journal.load()['courses']
+            changed = journal.take_changed_courses()
+            unchanged = {} if changed is None else {
+                course_code: ref for course_code, ref in blobs.latest_course_refs().items()
+                if course_code in courses and course_code not in changed
+            }
+            trees = {course_code: copy.deepcopy(tree) for course_code, tree in courses.items()
+                     if course_code not in unchanged}
+    except Exception as e:
+        logging.error(f"Error saving state snapshot: {str(e)}")
+        return
+    try:
+        blobs.save_snapshot(trees, {k: v.to_dict() for k, v in load_assignments().items()},
+                            live_refs=stored_description_refs() + page_cache.refs(), course_refs=unchanged)
+    except Exception as e:
+        journal.changed_courses = None  # Encode every course next time
+        logging.error(f"Error saving state snapshot: {str(e)}")
+
+def parse_moodle_date(text: str) -> Optional[datetime]:
+    """Parse a Moodle due date string, returning None if it is not a date"""
+    try:
+        return TIMEZONE.localize(datetime.strptime(text.strip(), MOODLE_DATE_FORMAT))
+    except ValueError:
+        return None
+
 def parse_assignment_page(html: str, url: str, course_code: str) -> Assignment:
     """Parse assignment details from assignment page HTML"""
     try:
@@ -81,9 +160,9 @@ def parse_assignment_page(html: str, url: str, course_code: str) -> Assignment:
                     try:
                         date_str = match.group(1)
                         if '/' in date_str:
-                            title_date = datetime.strptime(date_str, '%d/%m/%y').replace(tzinfo=TIMEZONE)
+                            title_date = TIMEZONE.localize(datetime.strptime(date_str, '%d/%m/%y'))
                         else:
-                            title_date = datetime.strptime(date_str, '%d %B %Y').replace(tzinfo=TIMEZONE)
+                            title_date = TIMEZONE.localize(datetime.strptime(date_str, '%d %B %Y'))
                         break
                     except ValueError:
                         continue
@@ -106,11 +185,8 @@ def parse_assignment_page(html: str, url: str, course_code: str) -> Assignment:
         
         # Try to parse due date from details, fallback to title date
         due_date = None
-        try:
-            if 'Due date' in details:
-                due_date = datetime.strptime(details['Due date'], '%A, %d %B %Y, %I:%M %p').replace(tzinfo=TIMEZONE)
-        except ValueError:
-            pass
+        if 'Due date' in details:
+            due_date = parse_moodle_date(details['Due date'])
         
         if due_date is None:
             due_date = title_date
@@ -124,9 +200,9 @@ def parse_assignment_page(html: str, url: str, course_code: str) -> Assignment:
                     try:
                         date_str = match.group(1)
                         if '/' in date_str:
-                            due_date = datetime.strptime(date_str, '%d/%m/%y').replace(tzinfo=TIMEZONE)
+                            due_date = TIMEZONE.localize(datetime.strptime(date_str, '%d/%m/%y'))
                         else:
-                            due_date = datetime.strptime(date_str, '%d %B %Y').replace(tzinfo=TIMEZONE)
+                            due_date = TIMEZONE.localize(datetime.strptime(date_str, '%d %B %Y'))
                         break
                     except ValueError:
                         continue
@@ -190,52 +266,289 @@ def find_assignments_in_course(session: requests.Session, course_code: str) -> L
         return assignment_urls
     except Exception as e:
         logging.error(f"Error finding assignments in course {course_code}: {str(e)}")
+        raise
+
+def assignment_index_url(course_code: str) -> str:
+    """Get the URL of the assignment index page (all assignments) of a course"""
+    course_url = COURSES[course_code]['url']
+    course_id = course_url.split('id=')[1].split('&')[0]
+    return urljoin(course_url, f"/mod/assign/index.php?id={course_id}")
+
+def parse_assignment_index(html: str, index_url: str, course_code: str) -> List[Assignment]:
+    """
+    Parse the assignment index page of a course.
+    
+    The index lists every assignment in the course with its due date and
+    submission state, so one request covers the whole course. Fields that
+    are only on the assignment page (description, grading status, last
+    modified) are left empty.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', class_='generaltable')
+    if not table:
+        # Moodle renders no table when a course has no assignments
         return []
+    
+    # Map column names to positions, since the columns differ between courses
+    header_row = table.find('thead') or table.find('tr')
+    headers = [th.text.strip() for th in header_row.find_all('th')]
+    columns = {}
+    for position, header in enumerate(headers):
+        if header.startswith('Assignment'):
+            columns['name'] = position
+        elif header.startswith('Due date'):
+            columns['due_date'] = position
+        elif header.startswith('Submission'):
+            columns['submission'] = position
+    if 'name' not in columns:
+        raise ValueError(f"Unexpected assignment index layout for {course_code}: {headers}")
+    
+    body = table.find('tbody') or table
+    assignments = []
+    for row in body.find_all('tr'):
+        cells = row.find_all('td')
+        if len(cells) <= columns['name']:
+            continue
+        link = cells[columns['name']].find('a', href=True)
+        if not link:
+            continue
+        url = urljoin(index_url, link['href'])
+        
+        due_date = None
+        if 'due_date' in columns and len(cells) > columns['due_date']:
+            due_date = parse_moodle_date(cells[columns['due_date']].text)
+        
+        submission_status = "No attempt"
+        if 'submission' in columns and len(cells) > columns['submission']:
+            status_text = cells[columns['submission']].text.strip()
+            if status_text not in NO_SUBMISSION_STATES:
+                submission_status = status_text
+        
+        assignments.append(Assignment(
+            course_code=course_code,
+            course_name=COURSES[course_code]['name'],
+            name=link.text.strip(),
+            due_date=due_date,
+            submission_status=submission_status,
+            url=url,
+            id=url.split('id=')[1].split('&')[0]
+        ))
+    
+    return assignments
+
+def needs_assignment_page(assignment: Assignment, previous: Optional[Assignment]) -> bool:
+    """
+    Decide whether the full assignment page has to be fetched.
+    
+    The page is only needed for open assignments we have no description or
+    due date for yet, or whose name or due date changed on the index (which
+    usually means the lecturer edited the assignment).
+    """
+    if assignment.submission_status != "No attempt":
+        return False  # Submitted assignments are not tracked
+    if assignment.due_date is None:
+        return True
+    if assignment.due_date <= clock.now():
+        return False  # Past due assignments are not tracked
+    if previous is None or not previous.description:
+        return True
+    return assignment.name != previous.name or assignment.due_date != previous.due_date
+
+def fetch_assignment_index(session: requests.Session, course_code: str) -> Optional[List[Assignment]]:
+    """Fetch and parse the assignment index of a course, returning None if the portal has none"""
+    index_url = assignment_index_url(course_code)
+    response = session.get(index_url)
+    if response.status_code != 200:
+        logging.warning(f"Assignment index not available for {course_code} (status {response.status_code}), "
+                        "falling back to assignment pages")
+        return None
+    return parse_assignment_index(response.text, index_url, course_code)
+
+def get_assignments_from_pages(session: requests.Session, course_code: str) -> List[Assignment]:
+    """Get all assignments of a course from the course page and every assignment page"""
+    return [
+        assignment for assignment in (fetch_assignment_page(session, url, course_code)
+                                      for url in find_assignments_in_course(session, course_code))
+        if assignment
+    ]
+
+def assignment_page_url(assignment: Assignment) -> str:
+    """Get the URL to fetch the assignment page of an index entry from"""
+    if assignment.due_date is None and 'due' in assignment.name.lower():
+        # Let parse_assignment_page fall back to the date in the title
+        return f"{assignment.url}#title={assignment.name}"
+    return assignment.url
 
-def get_active_assignments(session: requests.Session) -> Dict[str, Assignment]:
-    """Get all active assignments from all courses"""
+def merge_previous(assignment: Assignment, previous: Optional[Assignment]) -> Assignment:
+    """Take the details that are only on the assignment page from the previous record (if any)"""
+    if previous is None:
+        return assignment  # Submitted or past due before it was ever tracked
+    assignment.description = previous.description
+    assignment.grading_status = previous.grading_status
+    assignment.last_modified = previous.last_modified
+    assignment.time_remaining = previous.time_remaining
+    return assignment
+
+def get_course_assignments(session: requests.Session, course_code: str,
+                           previous_assignments: Dict[str, Assignment]) -> List[Assignment]:
+    """
+    Get all assignments of a course, using the assignment index page.
+    
+    Assignment pages are only fetched when `needs_assignment_page()` says so;
+    otherwise the description and grading details are taken from the
+    previously stored record. If the index page is not available the course
+    page and every assignment page are fetched instead.
+    """
+    indexed = fetch_assignment_index(session, course_code)
+    if indexed is None:
+        return get_assignments_from_pages(session, course_code)
+    
+    assignments = []
+    for assignment in indexed:
+        previous = previous_assignments.get(assignment.id)
+        if needs_assignment_page(assignment, previous):
+            detailed = fetch_assignment_page(session, assignment_page_url(assignment), course_code)
+            if detailed:
+                assignment = detailed
+        else:
+            assignment = merge_previous(assignment, previous)
+        assignments.append(assignment)
+    
+    logging.info(f"Found {len(assignments)} assignments in course {course_code}")
+    return assignments
+
+def fetch_assignment_page(session: requests.Session, url: str, course_code: str) -> Optional[Assignment]:
+    """Fetch and parse a single assignment page, returning None on failure"""
+    try:
+        logging.debug(f"Fetching assignment details from: {url}")
+        response = session.get(url)
+        return parse_assignment_page(response.text, url, course_code)
+    except Exception as e:
+        logging.error(f"Error processing assignment {url}: {str(e)}")
+        return None
+
+def is_active_assignment(assignment: Assignment) -> bool:
+    """Check whether an assignment still needs to be submitted and is not past due"""
+    if assignment.submission_status != "No attempt":
+        logging.debug(f"Assignment excluded: Already attempted ({assignment.name})")
+        return False
+    if not assignment.due_date or assignment.due_date <= clock.now():
+        logging.debug(f"Assignment excluded: Past due date ({assignment.name})")
+        return False
+    return True
+
+def get_active_assignments(session: requests.Session, previous_assignments: Dict[str, Assignment] = None) -> Dict[str, Assignment]:
+    """
+    Get all active assignments from all courses.
+    
+    Each course costs one request for its assignment index, plus one request
+    per assignment whose page is needed (see `needs_assignment_page()`).
+    Indexes and pages are fetched in the order and within the budget of the
+    crawl planner (crawl_planner.py). Courses are processed in isolation. If
+    a course cannot be fetched or did not fit the budget, its assignments
+    from `previous_assignments` are kept so they are neither dropped nor
+    reported as new once the course is fetched again. Indexes and pages
+    fetched earlier in a resumed cycle are taken from the planner's
+    checkpoint instead of being fetched again. For a course checked through
+    its recent activity report (see recent_activity.py) the index is not
+    fetched; only the pages of the assignments the report lists are.
+    """
     try:
         logging.info("Getting active assignments from all courses")
         current_assignments = {}
+        previous_assignments = previous_assignments or {}
         
-        for course_code in COURSES:
-            logging.debug(f"\nProcessing course: {course_code}")
-            # Find all assignments in the course
-            assignment_urls = find_assignments_in_course(session, course_code)
-            logging.debug(f"Found {len(assignment_urls)} assignment URLs in {course_code}")
-            
-            # Process each assignment
-            for url in assignment_urls:
-                logging.debug(f"\nFetching assignment details from: {url}")
-                response = session.get(url)
+        def track(assignment: Assignment):
+            if is_active_assignment(assignment):
+                current_assignments[assignment.id] = assignment
+                logging.debug(f"Assignment added to tracking: {assignment.name}")
+        
+        def keep_previous(course_code: str):
+            # Kept records still go through the checks, so past-due assignments are dropped
+            for assignment in previous_assignments.values():
+                if assignment.course_code == course_code:
+                    track(assignment)
+        
+        pending_pages = []
+        for course_code in planner.order_courses('indexes', COURSES, previous_assignments):
+            logging.debug(f"Processing course: {course_code}")
+            done = planner.result('indexes', course_code)
+            report = planner.result('courses', course_code)
+            if done is None and report is not None and not report['deleted']:
+                # Checked through its recent activity report: only the listed assignments can have changed
+                keep_previous(course_code)
+                for assignment_id in RecentActivity.from_dict(report).assignment_ids():
+                    previous = previous_assignments.get(assignment_id)
+                    listed = Assignment(course_code=course_code, course_name=COURSES[course_code]['name'],
+                                        id=assignment_id, url=module_url('assign', assignment_id))
+                    pending_pages.append((previous or listed, previous))
+                continue
+            if done is not None:
+                indexed = [Assignment.from_dict(record) for record in done['indexed']]
+                tracked = [Assignment.from_dict(record) for record in done['tracked']]
+            elif not planner.allow('indexes', course_code):
+                keep_previous(course_code)
+                continue
+            else:
                 try:
-                    assignment = parse_assignment_page(response.text, url, course_code)
-                    logging.debug(f"Parsed assignment: {assignment.name}")
-                    logging.debug(f"Due date: {assignment.due_date}")
-                    logging.debug(f"Submission status: {assignment.submission_status}")
-                    
-                    # Only include if not submitted and not past due date
-                    if assignment.submission_status == "No attempt":
-                        now = datetime.now(TIMEZONE)
-                        if assignment.due_date and assignment.due_date > now:
-                            current_assignments[assignment.id] = assignment
-                            logging.debug("Assignment added to tracking")
-                        else:
-                            logging.debug("Assignment excluded: Past due date")
-                    else:
-                        logging.debug("Assignment excluded: Already attempted")
+                    indexed = fetch_assignment_index(session, course_code)
+                    tracked = []
+                    if indexed is None:
+                        tracked = get_assignments_from_pages(session, course_code)
+                        planner.charge(len(tracked) + 1)
+                        indexed = []
+                    planner.record_crawled('indexes', course_code)
+                    planner.record_done('indexes', course_code, {
+                        'indexed': [assignment.to_dict() for assignment in indexed],
+                        'tracked': [assignment.to_dict() for assignment in tracked],
+                    })
                 except Exception as e:
-                    logging.error(f"Error processing assignment {url}: {str(e)}")
+                    logging.error(f"Keeping previous assignments for course {course_code}: {str(e)}")
+                    planner.record_failed('indexes', course_code)
+                    keep_previous(course_code)
+                    continue
+            
+            for assignment in tracked:
+                track(assignment)
+            for assignment in indexed:
+                previous = previous_assignments.get(assignment.id)
+                if needs_assignment_page(assignment, previous):
+                    pending_pages.append((assignment, previous))
+                else:
+                    track(merge_previous(assignment, previous))
         
-        logging.info(f"\nTotal active assignments found: {len(current_assignments)}")
+        # Fetch the assignment pages across all courses, most urgent first
+        for assignment, previous in planner.order_assignments(pending_pages):
+            done = planner.result('assignments', assignment.id)
+            if done is not None:
+                current_assignments.pop(assignment.id, None)
+                track(Assignment.from_dict(done))
+            elif planner.allow('assignments', assignment.id):
+                detailed = fetch_assignment_page(session, assignment_page_url(assignment), assignment.course_code)
+                if detailed is not None:
+                    planner.record_done('assignments', assignment.id, detailed.to_dict())
+                    current_assignments.pop(assignment.id, None)  # Kept from a course checked incrementally
+                    track(detailed)
+                else:
+                    # Retried next cycle; a known assignment keeps its record until then
+                    planner.record_failed('assignments', assignment.id)
+                    track(previous or assignment)
+            elif previous is not None:
+                # Report the change once the page is fetched in a later cycle
+                track(previous)
+            # New assignments that did not fit are reported with their details next cycle
+        
+        logging.info(f"Total active assignments found: {len(current_assignments)}")
         return current_assignments
     except Exception as e:
+        # Dropping every assignment would report them all as new next time;
+        # the cycle is retried and resumes from its checkpoint instead
         logging.error(f"Error getting active assignments: {str(e)}")
-        return {}
+        raise
 
 def format_assignment_notification(assignment: Assignment) -> str:
     """Format assignment details for Telegram notification"""
-    now = datetime.now(TIMEZONE)
+    now = clock.now()
     time_until_due = assignment.due_date - now if assignment.due_date else None
     
     message = f"""📚 Assignment Details
@@ -293,11 +606,22 @@ Link: {assignment.url}
 
     return message
 
+def format_stale_courses() -> str:
+    """Note listing the courses that could not be checked, if any"""
+    stale = {course_code: since for course_code, since in load_stale_courses().items() if course_code in COURSES}
+    if not stale:
+        return ""
+    message = "⚠️ Could not be checked, showing the last known data:\n"
+    for course_code, since in sorted(stale.items(), key=lambda item: item[1]):
+        message += f"• {COURSES[course_code]['name']} (failing since {datetime.fromtimestamp(since, TIMEZONE).strftime('%d %b, %I:%M %p')})\n"
+    return message
+
 def format_tracked_assignments_summary() -> str:
     """Format a summary of all currently tracked assignments"""
     assignments = load_assignments()
+    stale_note = format_stale_courses()
     if not assignments:
-        return "No active assignments being tracked."
+        return "No active assignments being tracked." + (f"\n\n{stale_note}" if stale_note else "")
     
     # Sort assignments by due date
     sorted_assignments = sorted(
@@ -325,15 +649,57 @@ def format_tracked_assignments_summary() -> str:
             message += f"  Status: {assignment.submission_status}\n\n"
         message += "----------------------------------------\n\n"
     
-    return message
+    return message + stale_note
+
+def sync_calendar_deadlines(session: requests.Session, assignments: Dict[str, Assignment]) -> List[Assignment]:
+    """
+    Update due dates from Moodle's AJAX service, or from the calendar export
+    if the service is unavailable (either is one request for all courses).
+    
+    Returns the assignments whose due date moved. Failures are logged and
+    leave the assignments unchanged.
+    """
+    try:
+        enrolled, upcoming = fetch_overview(session)
+        untracked = sorted(set(enrolled) - set(COURSES))
+        if untracked:
+            logging.info(f"Enrolled courses not tracked in config.py: {', '.join(untracked)}")
+        return apply_deadlines(assignments, upcoming)
+    except Exception as e:
+        logging.warning(f"AJAX deadlines unavailable ({str(e)}), using the calendar export")
+    try:
+        events = iter_calendar_events(fetch_calendar_lines(session))
+        return apply_calendar_deadlines(assignments, events)
+    except Exception as e:
+        logging.error(f"Error syncing deadlines from calendar export: {str(e)}")
+        return []
 
-def check_assignment_updates(session):
+def refresh_deadlines(session: requests.Session) -> Tuple[List[Assignment], Dict[str, Assignment]]:
+    """
+    Refresh the due dates of tracked assignments between full scrapes.
+    
+    Returns:
+        tuple: (assignments whose due date moved, all tracked assignments);
+               the caller persists them (see outbox.commit_changes)
+    """
+    assignments = load_assignments()
+    if not assignments:
+        return [], assignments
+    moved = sync_calendar_deadlines(session, assignments)
+    search_index.update(moved)
+    return moved, assignments
+
+def check_assignment_updates(session, save: bool = True):
     """
     Check for new and modified assignments.
-    Returns (new_assignments, modified_assignments, [])
+    Returns (new_assignments, modified_assignments, current_assignments)
+    
+    With `save=False` the current assignments are not persisted, so the
+    caller can persist them together with the notifications.
     """
-    current_assignments = get_active_assignments(session)
     previous_assignments = load_assignments()
+    current_assignments = get_active_assignments(session, previous_assignments)
+    sync_calendar_deadlines(session, current_assignments)
     
     # Find new assignments
     new_assignments = []
@@ -341,15 +707,22 @@ def check_assignment_updates(session):
         if assignment_id not in previous_assignments:
             new_assignments.append(assignment)
     
-    # Find modified assignments
+    # Find modified assignments (the "Time remaining" text changes on every
+    # fetch, so it is not treated as a modification)
     modified_assignments = []
     for assignment_id, assignment in current_assignments.items():
         if assignment_id in previous_assignments:
             prev_assignment = previous_assignments[assignment_id]
-            if assignment != prev_assignment:
+            if replace(assignment, time_remaining="") != replace(prev_assignment, time_remaining=""):
                 modified_assignments.append(assignment)
     
-    # Save current assignments
-    save_assignments(current_assignments)
+    # Keep the search index in step with what changed
+    search_index.update(new_assignments + modified_assignments)
+    search_index.remove(set(previous_assignments) - set(current_assignments))
+    
+    # Save current assignments and journal what changed
+    if save:
+        save_assignments(current_assignments)
+        journal.record_assignments({k: v.to_dict() for k, v in current_assignments.items()})
     
-    return new_assignments, modified_assignments, []  # Empty list for upcoming assignments 
\ No newline at end of file
+    return new_assignments, modified_assignments, current_assignments
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Page Fingerprint Benchmark for UniMAP Student Bot
+
+Measures how fast course pages are normalized and hashed (page_fingerprint.py)
+compared with parsing them, and how many parses the fingerprint cache skips.
+
+Pages come from a directory of recorded pages (--pages) or, by default,
+from a synthetic portal (see synthetic_portal.py) whose pages carry a new
+sesskey, timestamps and YUI IDs on every request. Recorded pages of the
+same URL are saved as NAME.1.html, NAME.2.html, ...; consecutive
+recordings of a name are compared in that order.
+
+For the synthetic portal the script also simulates check cycles in which
+--changes courses change, and exits with status 1 if a cached result ever
+differs from what parsing the page gives (a change the fingerprint missed)
+or an unchanged page is not skipped.
+
+Usage:
+    python benchmarks/fingerprint.py [--courses 200] [--activities 100] [--cycles 10] [--changes 5]
+    python benchmarks/fingerprint.py --pages recorded_pages/
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from config import COURSES
+from synthetic_portal import SyntheticPortal
+from course_tracker import scrape_course
+from page_fingerprint import normalize, fingerprint, page_cache
+
+
+def time_per_page(func, pages) -> float:
+    started = time.perf_counter()
+    for page in pages:
+        func(page)
+    return (time.perf_counter() - started) / len(pages)
+
+
+def report_speed(pages):
+    total_bytes = sum(len(page) for page in pages)
+    fingerprint_seconds = time_per_page(fingerprint, pages)
+    parse_seconds = time_per_page(lambda page: BeautifulSoup(page, "html.parser"), pages)
+    stripped = 1 - sum(len(normalize(page)) for page in pages) / total_bytes
+    print(f"Pages:        {len(pages)} ({total_bytes / len(pages) / 1024:.1f} KiB on average)")
+    print(f"Fingerprint:  {fingerprint_seconds * 1000:.3f} ms/page "
+          f"({total_bytes / len(pages) / fingerprint_seconds / 2**20:.0f} MiB/s), {stripped:.1%} of bytes volatile")
+    print(f"Parse:        {parse_seconds * 1000:.3f} ms/page "
+          f"({parse_seconds / fingerprint_seconds:.0f}x the fingerprint)")
+
+
+def recorded_pages(directory: str):
+    """Recorded pages grouped by name, in recording order"""
+    groups = defaultdict(list)
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, 'rb') as f:
+            groups[os.path.basename(path).split('.')[0]].append(f.read())
+    return groups
+
+
+def run_recorded(directory: str) -> bool:
+    groups = recorded_pages(directory)
+    pages = [page for group in groups.values() for page in group]
+    if not pages:
+        print(f"No pages found in {directory}")
+        return False
+    report_speed(pages)
+    comparisons = sum(len(group) - 1 for group in groups.values())
+    skipped = sum(fingerprint(previous) == fingerprint(current)
+                  for group in groups.values() for previous, current in zip(group, group[1:]))
+    if comparisons:
+        print(f"Skip rate:    {skipped}/{comparisons} refetches ({skipped / comparisons:.1%})")
+    return True
+
+
+def run_synthetic(courses: int, activities: int, cycles: int, changes: int) -> bool:
+    portal = SyntheticPortal(courses, activities=activities)
+    COURSES.clear()
+    COURSES.update(portal.courses)
+    pages = [portal.get(course['url']).content for course in portal.courses.values()]
+    report_speed(pages)
+
+    for course_code in portal.courses:
+        scrape_course(portal, course_code)  # First cycle fills the cache
+    page_cache.hits = page_cache.misses = 0
+    expected_misses = 0
+    stale = 0
+    started = time.perf_counter()
+    for _ in range(cycles):
+        changed_before = dict(portal.extra_activities)
+        portal.mutate(changes)
+        expected_misses += sum(portal.extra_activities[code] != changed_before[code] for code in portal.courses)
+        for course_code in portal.courses:
+            if scrape_course(portal, course_code) != portal.course_state(course_code):
+                stale += 1
+    cycle_seconds = (time.perf_counter() - started) / cycles
+
+    fetches = page_cache.hits + page_cache.misses
+    print(f"Cycles:       {cycles} x {courses} courses with {changes} changes each, "
+          f"{cycle_seconds * 1000:.0f} ms/cycle")
+    print(f"Skip rate:    {page_cache.hits}/{fetches} fetches ({page_cache.hits / fetches:.1%}), "
+          f"{page_cache.misses} parsed ({expected_misses} changed)")
+    if stale:
+        print(f"\n{stale} cached results differed from the page (missed changes)")
+    if page_cache.misses != expected_misses:
+        print(f"\n{page_cache.misses - expected_misses} unchanged pages were parsed again")
+    return not stale and page_cache.misses == expected_misses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure page fingerprinting speed and skip rate")
+    parser.add_argument("--pages", help="Directory of recorded pages (NAME.N.html) instead of a synthetic portal")
+    parser.add_argument("--courses", type=int, default=200, help="Synthetic courses")
+    parser.add_argument("--activities", type=int, default=100, help="Activities per synthetic course")
+    parser.add_argument("--cycles", type=int, default=10, help="Check cycles to simulate")
+    parser.add_argument("--changes", type=int, default=5, help="Changed activities per cycle")
+    args = parser.parse_args()
+
+    if args.pages:
+        sys.exit(0 if run_recorded(args.pages) else 1)
+
+    logging.disable(logging.CRITICAL)
+    original_courses = dict(COURSES)
+    workdir = tempfile.mkdtemp(prefix="unimap-fingerprint-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        ok = run_synthetic(args.courses, args.activities, args.cycles, args.changes)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        COURSES.clear()
+        COURSES.update(original_courses)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
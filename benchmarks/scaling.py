@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Scaling Benchmark for UniMAP Student Bot
+
+Times the scraping, diffing, formatting and state load/save code on
+synthetic portals of growing size (see synthetic_portal.py) and checks that
+the cost grows close to linearly. For each case the growth exponent is
+estimated from the smallest and largest size; an exponent above
+MAX_EXPONENT (e.g. ~2 for repeated string concatenation or a `find()` per
+element over the whole page) is reported as a regression and the script
+exits with status 1.
+
+Usage:
+    python benchmarks/scaling.py [--courses 500] [--activities 100]
+
+--courses and --activities set the largest size; each case is also run at
+1/2, 1/4 and 1/8 of it. Runs in a temporary directory, so no state files
+of the bot are touched.
+"""
+
+import os
+import sys
+import math
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import COURSES
+from synthetic_portal import SyntheticPortal
+from course_tracker import scrape_course, check_for_updates, format_notification
+from assignment_tracker import save_assignments, format_tracked_assignments_summary
+from journal import Journal
+from page_fingerprint import page_cache
+
+MAX_EXPONENT = 1.3  # Growth exponents above this are reported as regressions
+REPEATS = 3  # Best of this many runs is used per size
+STEPS = 4  # Sizes per case, each twice the previous one
+
+
+def best_time(func, *args) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def use_courses(portal: SyntheticPortal):
+    """Make the synthetic courses the configured ones (in place, like a config reload)"""
+    COURSES.clear()
+    COURSES.update(portal.courses)
+
+
+def case_scrape_course(size: int):
+    portal = SyntheticPortal(1, sections=10, activities=size)
+    use_courses(portal)
+    course_code = next(iter(portal.courses))
+
+    def scrape_uncached():
+        page_cache.entries = {}  # Measure the parse, not the fingerprint cache
+        scrape_course(portal, course_code)
+
+    return scrape_uncached, ()
+
+
+def case_check_for_updates(size: int, activities: int):
+    portal = SyntheticPortal(size, activities=activities)
+    previous = portal.state()
+    portal.mutate(size)
+    return check_for_updates, (portal.state(), previous)
+
+
+def case_format_updates(size: int, activities: int):
+    portal = SyntheticPortal(size, activities=activities)
+    use_courses(portal)
+    previous = portal.state()
+    portal.mutate(size * 10)
+    return format_notification, (check_for_updates(portal.state(), previous),)
+
+
+def case_format_new_courses(size: int, activities: int):
+    portal = SyntheticPortal(size, activities=activities)
+    use_courses(portal)
+    return format_notification, (check_for_updates(portal.state(), {}),)
+
+
+def case_assignment_summary(size: int):
+    portal = SyntheticPortal(size, activities=10, assignments=10)
+    use_courses(portal)
+    save_assignments(portal.tracked_assignments())
+    return format_tracked_assignments_summary, ()
+
+
+def case_state_save_load(size: int, activities: int):
+    portal = SyntheticPortal(size, activities=activities)
+    before = portal.state()
+    portal.mutate(size)
+    after = portal.state()
+
+    def save_and_load():
+        shutil.rmtree("journal", ignore_errors=True)
+        journal = Journal()
+        journal.record_courses(before)
+        journal.record_courses(after)
+        Journal().load()
+
+    return save_and_load, ()
+
+
+def measure(name: str, make_case, sizes):
+    """Time one case at every size and return its growth exponent"""
+    timings = []
+    for size in sizes:
+        func, args = make_case(size)
+        timings.append(best_time(func, *args))
+    exponent = math.log(timings[-1] / timings[0]) / math.log(sizes[-1] / sizes[0])
+    details = ", ".join(f"{size}: {seconds * 1000:.1f}ms" for size, seconds in zip(sizes, timings))
+    print(f"{name:<32} exponent {exponent:5.2f}  ({details})")
+    return exponent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the bot scales linearly with portal size")
+    parser.add_argument("--courses", type=int, default=500, help="Largest number of courses")
+    parser.add_argument("--activities", type=int, default=100, help="Activities per course")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)  # The code under test logs per call
+    course_sizes = [max(1, args.courses >> shift) for shift in reversed(range(STEPS))]
+    activity_sizes = [max(1, args.activities * 16 >> shift) for shift in reversed(range(STEPS))]
+    cases = [
+        ("scrape_course (activities)", case_scrape_course, activity_sizes),
+        ("check_for_updates (courses)", lambda n: case_check_for_updates(n, args.activities), course_sizes),
+        ("format_notification (changes)", lambda n: case_format_updates(n, args.activities), course_sizes),
+        ("format_notification (new)", lambda n: case_format_new_courses(n, args.activities), course_sizes),
+        ("assignment summary (courses)", case_assignment_summary, course_sizes),
+        ("state save/load (courses)", lambda n: case_state_save_load(n, args.activities), course_sizes),
+    ]
+
+    original_courses = dict(COURSES)
+    workdir = tempfile.mkdtemp(prefix="unimap-scaling-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        regressions = [name for name, make_case, sizes in cases
+                       if measure(name, make_case, sizes) > MAX_EXPONENT]
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        COURSES.clear()
+        COURSES.update(original_courses)
+
+    if regressions:
+        print(f"\nSuperlinear scaling (exponent > {MAX_EXPONENT}): {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nAll cases scale close to linearly")
+
+
+if __name__ == "__main__":
+    main()
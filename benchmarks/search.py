@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Search Benchmark for UniMAP Student Bot
+
+Times the assignment search index (search_index.py) on synthetic
+assignments (see synthetic_portal.py) with generated names and
+descriptions, whose words follow a Zipf-like distribution like natural
+text: building the index, answering queries (whole words, several words
+and the prefixes inline queries send while typing) and re-indexing changed
+assignments.
+
+Exits with status 1 if the 95th percentile query latency at the largest
+size exceeds --budget milliseconds.
+
+Usage:
+    python benchmarks/search.py [--items 8000] [--budget 5]
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+from dataclasses import replace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_portal import synthetic_assignments
+from search_index import SearchIndex
+
+STEPS = 4  # Sizes measured, each twice the previous one
+QUERIES = 500  # Queries timed per size
+CHANGES = 200  # Changed assignments re-indexed per size
+PER_COURSE = 20  # Assignments per synthetic course
+
+TOPIC_WORDS = ("lab report quiz project proposal essay tutorial homework exercise presentation review final "
+               "midterm draft submission group individual chapter reading analysis design circuit signal "
+               "programming data structures calculus algebra thermodynamics materials mechanics statistics "
+               "network database security ethics portfolio reflection worksheet case study poster video").split()
+FILLER_WORDS = "the and of to in for is on with by a your this be will as".split()
+SYLLABLES = "ka ri to ne sa mi lu po de ra chi ve lo ta ni gu be so".split()
+VOCABULARY_SIZE = 3000  # Distinct generated words, drawn with a Zipf-like distribution like natural text
+
+
+def make_vocabulary(rng: random.Random):
+    words = list(TOPIC_WORDS)
+    while len(words) < VOCABULARY_SIZE:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if word not in words:
+            words.append(word)
+    weights = [1 / rank for rank in range(1, len(words) + 1)]
+    return words, weights
+
+
+def generate_text(rng: random.Random, vocabulary, words: int) -> str:
+    words_list, weights = vocabulary
+    text = rng.choices(words_list, weights, k=words)
+    for position in range(0, words, 4):
+        text[position] = rng.choice(FILLER_WORDS)
+    return " ".join(text)
+
+
+def make_assignments(size: int, rng: random.Random, vocabulary):
+    assignments = synthetic_assignments(-(-size // PER_COURSE), PER_COURSE)
+    return {
+        assignment_id: replace(assignment,
+                               name=f"{rng.choice(TOPIC_WORDS).title()} {rng.choice(TOPIC_WORDS)} {rng.randint(1, 12)}",
+                               description=generate_text(rng, vocabulary, rng.randint(20, 200)))
+        for assignment_id, assignment in list(assignments.items())[:size]
+    }
+
+
+def make_queries(rng: random.Random, assignments):
+    """Queries for words that occur in the assignments: whole words, two words and typed prefixes"""
+    documents = list(assignments.values())
+    queries = []
+    for _ in range(QUERIES):
+        words = [word for word in f"{rng.choice(documents).name} {rng.choice(documents).description}".split()
+                 if word not in FILLER_WORDS and not word.isdigit()]
+        kind = rng.randrange(3)
+        if kind == 0:
+            queries.append(rng.choice(words))
+        elif kind == 1:
+            queries.append(" ".join(rng.sample(words, 2)))
+        else:
+            queries.append(f"when is the {rng.choice(words)} {rng.choice(words)[:rng.randint(2, 4)]}")
+    return queries
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def measure(size: int, rng: random.Random, vocabulary):
+    assignments = make_assignments(size, rng, vocabulary)
+    index = SearchIndex()
+    started = time.perf_counter()
+    index.build(assignments)
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in make_queries(rng, assignments):
+        started = time.perf_counter()
+        index.search(query)
+        latencies.append(time.perf_counter() - started)
+
+    changed = [replace(assignment, description=generate_text(rng, vocabulary, 50))
+               for assignment in rng.sample(list(assignments.values()), min(CHANGES, size))]
+    started = time.perf_counter()
+    index.update(changed)
+    update_seconds = (time.perf_counter() - started) / len(changed)
+
+    p50, p95 = percentile(latencies, 0.5) * 1000, percentile(latencies, 0.95) * 1000
+    print(f"{size:>7} items  build {build_seconds * 1000:8.1f}ms  query p50 {p50:6.2f}ms  "
+          f"p95 {p95:6.2f}ms  max {max(latencies) * 1000:6.2f}ms  update {update_seconds * 1000:.3f}ms/item")
+    return p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure assignment search latency")
+    parser.add_argument("--items", type=int, default=8000, help="Largest number of tracked assignments")
+    parser.add_argument("--budget", type=float, default=5.0, help="Allowed p95 query latency in milliseconds")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    rng = random.Random(0)
+    vocabulary = make_vocabulary(rng)
+    sizes = [max(1, args.items >> shift) for shift in reversed(range(STEPS))]
+    p95 = [measure(size, rng, vocabulary) for size in sizes][-1]
+    if p95 > args.budget:
+        print(f"\np95 query latency {p95:.2f}ms exceeds the budget of {args.budget}ms")
+        sys.exit(1)
+    print(f"\np95 query latency within {args.budget}ms")
+
+
+if __name__ == "__main__":
+    main()
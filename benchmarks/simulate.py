@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Semester Simulation for UniMAP Student Bot
+
+Runs the bot's schedule for weeks of virtual time in seconds. The shared
+clock (clock.py) is switched to a virtual clock, and the script then goes
+through the same steps as bot.py:
+
+- the scheduled check cycles (get_next_check_time, stream_check_cycle),
+- the deadline refreshes between them,
+- the grade checks after each cycle,
+- the announcement forum polls every FORUM_POLL_INTERVAL,
+- the delivery of the outbox to the groups and subscribers
+  (outbox.deliver_batch), with the retry backoff after failed sends,
+- the pinned dashboard updates.
+
+Everything runs against a synthetic portal (see synthetic_portal.py) that
+changes activities, posts announcements and releases grades at random
+times. A fake Telegram bot counts what would have been sent and fails a
+share of the sends (--send-failures).
+
+Prints the checks, portal requests, Telegram messages and CPU time of
+every simulated day. Use it to size deployments, and use --max-cpu or
+--max-requests to catch regressions in scheduling cost: the script exits
+with status 1 if a day exceeds either limit. It runs in a temporary
+directory, so no state files of the bot are touched.
+
+Usage:
+    python benchmarks/simulate.py [--days 120] [--courses 10] [--subscribers 50]
+"""
+
+import os
+import sys
+import copy
+import time
+import heapq
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import Counter, defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from telegram.error import TimedOut
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clock import clock, TIMEZONE
+
+START = TIMEZONE.localize(datetime(2025, 3, 3))  # Virtual start: a Monday, midnight
+COLUMNS = ("checks", "refreshes", "forum_polls", "requests", "events", "messages", "retries", "dashboard_edits")
+
+
+class TelegramSink:
+    """Stands in for `telegram.Bot` and counts the calls instead of making them."""
+
+    def __init__(self, failure_rate: float, rng: random.Random):
+        self.calls = Counter()
+        self.failure_rate = failure_rate
+        self.rng = rng
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.rng.random() < self.failure_rate:
+            raise TimedOut("Simulated send failure")
+        self.calls['messages'] += 1
+        return SimpleNamespace(message_id=self.calls['messages'])
+
+    async def pin_chat_message(self, chat_id, message_id, **kwargs):
+        self.calls['pins'] += 1
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.calls['dashboard_edits'] += 1
+
+
+async def simulate(args) -> dict:
+    """
+    Run the schedule for `args.days` virtual days.
+
+    Returns:
+        dict: Counters per simulated day (day number -> Counter)
+    """
+    # Imported here: the working directory has to be the temporary one
+    # first, since several modules load their state files on import
+    from config import COURSES, GROUPS
+    from synthetic_portal import SyntheticPortal
+    from event_queue import EventQueue
+    from outbox import commit_changes, deliver_batch
+    from monitor import get_next_check_time, stream_check_cycle, due_date_event, grade_event, forum_post_event
+    from assignment_tracker import refresh_deadlines, format_tracked_assignments_summary, DEADLINE_REFRESH_INTERVAL
+    from forum_tracker import load_forum_state, check_forum_updates, FORUM_POLL_INTERVAL
+    from grade_tracker import load_grade_state, check_grade_updates
+    from subscriptions import subscriptions, Subscription
+    from chat_registry import chat_registry
+    from dashboard import dashboard
+
+    rng = random.Random(args.seed)
+    random.seed(args.seed)  # Retry backoff jitter
+    clock.set_virtual(START)
+    start = clock.time()
+    end = start + args.days * 86400
+
+    portal = SyntheticPortal(args.courses, sections=args.sections, activities=args.activities,
+                             assignments=args.assignments, seed=args.seed, forums=True)
+    COURSES.clear()
+    COURSES.update(portal.courses)
+    GROUPS[:] = [f"-100{number:010d}" for number in range(args.groups)]
+    course_codes = list(portal.courses)
+    for number in range(args.subscribers):
+        subscriptions.put(Subscription(
+            user_id=str(1000 + number),
+            courses=rng.sample(course_codes, rng.randint(0, min(5, len(course_codes)))),
+            assignments_only=rng.random() < 0.5,
+            within_days=rng.choice([None, 3, 7]),
+        ))
+
+    # Portal changes, announcements and grade releases at random times
+    assignment_ids = sorted(portal.due_dates)
+    happenings = sorted(
+        [(rng.uniform(start, end), 'change', None) for _ in range(int(args.changes * args.days))]
+        + [(rng.uniform(start, end), 'announcement', rng.choice(course_codes))
+           for _ in range(int(args.announcements * args.days))]
+        + [(rng.uniform(start, end), 'grade', rng.choice(assignment_ids)) for _ in range(int(args.grades * args.days))]
+    )
+
+    queue = EventQueue()
+    sink = TelegramSink(args.send_failures, rng)
+    forum_state = load_forum_state()
+    grade_state = load_grade_state()
+    days = defaultdict(Counter)
+    # Due times of the bot's loops, as (time, loop); the check is scheduled on its own
+    schedule = [(start, 'forum_poll'), (start + DEADLINE_REFRESH_INTERVAL, 'refresh')]
+    retry_at = None  # Time of the next delivery attempt after a failed send
+
+    while True:
+        next_check = get_next_check_time().timestamp()
+        wake, loop = min(schedule[0], (next_check, 'check'))
+        if retry_at is not None and retry_at < wake:
+            wake, loop = retry_at, 'retry'
+        if wake >= end:
+            break
+        while happenings and happenings[0][0] <= wake:
+            at, kind, target = happenings.pop(0)
+            clock.advance(at - clock.time())
+            if kind == 'change':
+                portal.mutate(1)
+            elif kind == 'announcement':
+                portal.post_announcement(target)
+            else:
+                portal.release_grade(target, rng.randint(40, 100))
+        clock.advance(wake - clock.time())
+
+        day = days[int((wake - start) // 86400)]
+        requests, cpu, calls = portal.requests, time.process_time(), Counter(sink.calls)
+        dashboard_due = loop == 'check'
+        if loop == 'check':
+            for events, courses, assignments in stream_check_cycle(portal):
+                commit_changes(queue, events, courses, assignments)
+            checked = copy.deepcopy(grade_state)
+            grades = check_grade_updates(portal, checked)
+            commit_changes(queue, [grade_event(grade) for grade in grades], grades=checked)
+            grade_state = checked
+            day['checks'] += 1
+        elif loop == 'refresh':
+            moved, assignments = refresh_deadlines(portal)
+            if moved:
+                commit_changes(queue, [due_date_event(a) for a in moved], assignments=assignments)
+                dashboard_due = True
+            heapq.heapreplace(schedule, (wake + DEADLINE_REFRESH_INTERVAL, loop))
+            day['refreshes'] += 1
+        elif loop == 'forum_poll':
+            polled = copy.deepcopy(forum_state)
+            posts = check_forum_updates(portal, polled)
+            commit_changes(queue, [forum_post_event(post) for post in posts], forums=polled)
+            forum_state = polled
+            heapq.heapreplace(schedule, (wake + FORUM_POLL_INTERVAL, loop))
+            day['forum_polls'] += 1
+
+        # The outbox loop sends new notifications right away, unless it is backing off after a failure
+        if retry_at is None or retry_at <= wake:
+            retry_at = None
+            delivered = True
+            while delivered and retry_at is None:
+                delivered, retry_delay = await deliver_batch(sink, queue)
+                day['events'] += len(delivered)
+                if retry_delay is not None:
+                    retry_at = wake + retry_delay
+                    day['retries'] += 1
+        if dashboard_due:
+            await dashboard.update_all(sink, chat_registry.notification_chats(), format_tracked_assignments_summary())
+
+        day['requests'] += portal.requests - requests
+        day['messages'] += sink.calls['messages'] - calls['messages']
+        day['dashboard_edits'] += sink.calls['dashboard_edits'] - calls['dashboard_edits']
+        day['cpu_ms'] += (time.process_time() - cpu) * 1000
+    return days
+
+
+def report(days: dict, total_days: int):
+    print(f"{'day':>4} {'date':<10} " + " ".join(f"{column:>15}" for column in COLUMNS) + f" {'cpu_ms':>9}")
+    for number in range(total_days):
+        day = days.get(number, Counter())
+        date = datetime.fromtimestamp(START.timestamp() + number * 86400, TIMEZONE).strftime('%Y-%m-%d')
+        print(f"{number + 1:>4} {date:<10} " + " ".join(f"{day[column]:>15}" for column in COLUMNS)
+              + f" {day['cpu_ms']:>9.1f}")
+    totals = Counter()
+    for day in days.values():
+        totals.update(day)
+    print("\nPer day: " + ", ".join(f"{column} {totals[column] / total_days:.1f}" for column in COLUMNS)
+          + f", cpu {totals['cpu_ms'] / total_days:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate weeks of check cycles on a virtual clock")
+    parser.add_argument("--days", type=int, default=120, help="Simulated days")
+    parser.add_argument("--courses", type=int, default=10, help="Synthetic courses")
+    parser.add_argument("--sections", type=int, default=10, help="Sections per course")
+    parser.add_argument("--activities", type=int, default=100, help="Activities per course")
+    parser.add_argument("--assignments", type=int, default=5, help="Assignments per course")
+    parser.add_argument("--groups", type=int, default=2, help="Notified group chats")
+    parser.add_argument("--subscribers", type=int, default=50, help="Users with personal subscriptions")
+    parser.add_argument("--changes", type=float, default=5, help="Activity changes per day, across all courses")
+    parser.add_argument("--announcements", type=float, default=1, help="Announcements per day, across all courses")
+    parser.add_argument("--grades", type=float, default=0.5, help="Grade releases per day")
+    parser.add_argument("--send-failures", type=float, default=0.01, help="Share of Telegram sends that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-cpu", type=float, help="Allowed CPU milliseconds per simulated day")
+    parser.add_argument("--max-requests", type=int, help="Allowed portal requests per simulated day")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    workdir = tempfile.mkdtemp(prefix="unimap-simulate-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        started = time.perf_counter()
+        days = asyncio.run(simulate(args))
+        elapsed = time.perf_counter() - started
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report(days, args.days)
+    print(f"Simulated {args.days} days in {elapsed:.1f}s")
+    failed = False
+    if args.max_cpu is not None:
+        worst = max((day['cpu_ms'] for day in days.values()), default=0)
+        if worst > args.max_cpu:
+            print(f"Busiest day used {worst:.1f}ms of CPU, above the limit of {args.max_cpu}ms")
+            failed = True
+    if args.max_requests is not None:
+        worst = max((day['requests'] for day in days.values()), default=0)
+        if worst > args.max_requests:
+            print(f"Busiest day made {worst} portal requests, above the limit of {args.max_requests}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+Blob Store for UniMAP Student Bot
+
+A content-addressed store for large values, kept in one SQLite file
+(blobs.db). Each blob is compressed with zlib and stored once under the
+SHA-256 hash of its content, so records can keep a short hash instead of
+the value and identical values are stored once no matter how often they
+are saved.
+
+Snapshots of the stored state are kept on top of it: a snapshot is a small
+manifest that points to one blob per course tree and one for the
+assignments, so unchanged courses share their blobs with older snapshots.
+The newest MAX_SNAPSHOTS snapshots are kept; blobs no snapshot or live
+record refers to are removed when an old snapshot is dropped. Snapshots
+are read back by replay_journal.py, which shows what changed since one.
+"""
+
+import json
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set
+
+BLOB_FILE = "blobs.db"
+MAX_SNAPSHOTS = 10  # Snapshots kept for diffing
+COMPRESSION_LEVEL = 6
+
+
+def encode_json(value) -> bytes:
+    # Canonical encoding, so equal values get equal hashes
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+class BlobStore:
+    """Compressed, content-addressed blobs and the snapshots referring to them."""
+
+    def __init__(self, path: str = BLOB_FILE):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+        self.known: Set[str] = set()  # Hashes known to be stored, to skip lookups
+        self.lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        # Opened on first use, so importing this module creates no files
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS snapshots (name TEXT PRIMARY KEY, manifest TEXT NOT NULL)")
+        return self.conn
+
+    def put(self, data: bytes) -> str:
+        """Store data and return its hash (nothing is written if it is already stored)"""
+        return self.put_many([data])[0]
+
+    def put_many(self, items: List[bytes]) -> List[str]:
+        """Store several values in one transaction and return their hashes"""
+        hashes = [hashlib.sha256(data).hexdigest() for data in items]
+        new = {blob_hash: data for blob_hash, data in zip(hashes, items) if blob_hash not in self.known}
+        if new:
+            with self.lock:
+                conn = self.connect()
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.executemany("INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+                                     [(blob_hash, zlib.compress(data, COMPRESSION_LEVEL)) for blob_hash, data in new.items()])
+            self.known.update(new)
+        return hashes
+
+    def get(self, blob_hash: str) -> bytes:
+        """
+        Read a stored blob.
+
+        Raises:
+            ValueError: If the blob does not exist
+        """
+        with self.lock:
+            row = self.connect().execute("SELECT data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        if row is None:
+            raise ValueError(f"Blob {blob_hash} not found")
+        return zlib.decompress(row[0])
+
+    def put_text(self, text: str) -> str:
+        return self.put(text.encode('utf-8'))
+
+    def get_text(self, blob_hash: str) -> str:
+        return self.get(blob_hash).decode('utf-8')
+
+    def put_texts(self, texts: List[str]) -> List[str]:
+        return self.put_many([text.encode('utf-8') for text in texts])
+
+    def put_json(self, value) -> str:
+        return self.put_many([encode_json(value)])[0]
+
+    def get_json(self, blob_hash: str):
+        return json.loads(self.get(blob_hash))
+
+    def list_snapshots(self) -> List[str]:
+        """Names of the stored snapshots, oldest first"""
+        with self.lock:
+            return [row[0] for row in self.connect().execute("SELECT name FROM snapshots ORDER BY name")]
+
+    def latest_course_refs(self) -> Dict[str, str]:
+        """Blobs of the course trees in the newest snapshot, by course code (empty if there is none)"""
+        with self.lock:
+            row = self.connect().execute("SELECT manifest FROM snapshots ORDER BY name DESC LIMIT 1").fetchone()
+        return json.loads(row[0])['courses'] if row else {}
+
+    def save_snapshot(self, courses: Dict, assignments: Dict[str, Dict], live_refs: Iterable[str] = (),
+                      course_refs: Optional[Dict[str, str]] = None) -> str:
+        """
+        Store a snapshot of the course trees and assignments.
+
+        Args:
+            courses: Course trees by course code
+            assignments: Assignment records (`Assignment.to_dict()`) by ID; their
+                         descriptions are stored as blobs
+            live_refs: Blobs still used outside the snapshots, kept when pruning
+            course_refs: Stored blobs of unchanged courses, by course code; these
+                         courses are left out of `courses`
+
+        Returns:
+            str: Name of the snapshot
+        """
+        course_refs = dict(course_refs or {})
+        course_refs.update(zip(courses, self.put_many([encode_json(tree) for tree in courses.values()])))
+        records = {assignment_id: dict(record) for assignment_id, record in assignments.items()}
+        described = [record for record in records.values() if record.get('description')]
+        for record, ref in zip(described, self.put_texts([record['description'] for record in described])):
+            record['description_blob'] = ref
+        for record in records.values():
+            record.pop('description', None)
+        description_refs = {record['description_blob'] for record in described}
+        assignments_ref = self.put_json(records)
+
+        name = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+        manifest = {
+            'courses': course_refs,
+            'assignments': assignments_ref,
+            'refs': sorted(set(course_refs.values()) | description_refs | {assignments_ref}),
+        }
+        with self.lock:
+            self.connect().execute("INSERT INTO snapshots (name, manifest) VALUES (?, ?)",
+                                   (name, json.dumps(manifest, separators=(',', ':'))))
+        self.prune(live_refs)
+        return name
+
+    def load_snapshot(self, name: Optional[str] = None) -> Dict:
+        """
+        Load a snapshot (the newest if no name is given).
+
+        Returns:
+            Dict: {'courses': ..., 'assignments': ...} in the format they were saved in
+
+        Raises:
+            ValueError: If there is no such snapshot
+        """
+        with self.lock:
+            if name is None:
+                row = self.connect().execute("SELECT manifest FROM snapshots ORDER BY name DESC LIMIT 1").fetchone()
+            else:
+                row = self.connect().execute("SELECT manifest FROM snapshots WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"Snapshot {name or '(latest)'} not found")
+        manifest = json.loads(row[0])
+
+        assignments = self.get_json(manifest['assignments'])
+        for record in assignments.values():
+            description_ref = record.pop('description_blob', None)
+            record['description'] = self.get_text(description_ref) if description_ref else ''
+        return {
+            'courses': {course_code: self.get_json(ref) for course_code, ref in manifest['courses'].items()},
+            'assignments': assignments,
+        }
+
+    def prune(self, live_refs: Iterable[str] = (), keep: int = MAX_SNAPSHOTS):
+        """Drop all but the newest `keep` snapshots and the blobs only they used"""
+        names = self.list_snapshots()
+        if len(names) <= keep:
+            return
+        with self.lock:
+            conn = self.connect()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("DELETE FROM snapshots WHERE name = ?", [(name,) for name in names[:-keep]])
+                referenced = set(live_refs)
+                for (manifest,) in conn.execute("SELECT manifest FROM snapshots"):
+                    referenced |= set(json.loads(manifest)['refs'])
+                unused = [row[0] for row in conn.execute("SELECT hash FROM blobs") if row[0] not in referenced]
+                conn.executemany("DELETE FROM blobs WHERE hash = ?", [(blob_hash,) for blob_hash in unused])
+            self.known.difference_update(unused)
+        logging.info(f"Pruned {len(names) - keep} snapshots and {len(unused)} unused blobs")
+
+
+# Blob store of the current process
+blobs = BlobStore()
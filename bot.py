@@ -1,3 +1,7 @@
+# Record the process start before anything else for the startup report
+import time
+PROCESS_STARTED = time.perf_counter()
+
 # Load environment variables first before any other imports
 from dotenv import load_dotenv
 load_dotenv()
@@ -5,339 +9,113 @@ load_dotenv()
 import logging
 import asyncio
 import signal
-import sys
 import os
-import json
-import time
-import datetime
-import pytz
-import requests
-from bs4 import BeautifulSoup
-from telegram import Bot
-from telegram.ext import Application, CommandHandler
-from config import TELEGRAM_BOT_TOKEN, GROUPS, COURSES
+import copy
+import functools
+import contextvars
+from telegram import Bot, Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import Application, ApplicationHandlerStop, ChatMemberHandler, CommandHandler, InlineQueryHandler, TypeHandler
+from config import TELEGRAM_BOT_TOKEN, COURSES
+from portal_client import PortalClient, backoff_delay
+from log_config import setup_logging, new_cycle_id
+from metrics import StartupTimer
+from dashboard import dashboard
+from journal import journal
+from event_queue import EventQueue
+from outbox import commit_changes, apply_pending_states, deliver_batch, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX
 from assignment_tracker import (
-    check_assignment_updates, 
-    format_assignment_notification,
     format_tracked_assignments_summary,
-    get_active_assignments
+    load_assignments,
+    refresh_deadlines,
+    save_state_snapshot,
+    DEADLINE_REFRESH_INTERVAL
 )
-
-# Set up logging for errors and important info
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
+from subscriptions import subscriptions, Subscription, format_subscription
+from chat_registry import chat_registry, handle_membership_update
+from clock import clock
+from search_index import search_index, format_search_result, format_search_results
+from forum_tracker import load_forum_state, check_forum_updates, FORUM_POLL_INTERVAL
+from grade_tracker import load_grade_state, check_grade_updates
+from config_watcher import ConfigWatcher, apply_config, update_tracked_state, CONFIG_POLL_INTERVAL
+from monitor import (
+    get_next_check_time,
+    stream_check_cycle,
+    due_date_event,
+    forum_post_event,
+    grade_event
 )
 
+# Set up logging for errors and important info (queued, JSON, rotated, redacted)
+setup_logging()
+
+startup = StartupTimer(PROCESS_STARTED)
+startup.mark('imports')
+
 # Constants and configuration
 TELEGRAM_CHAT_IDS = os.getenv("TELEGRAM_CHAT_IDS").split(",")
-CHECK_TIMES = [(7, 0), (19, 0)]  # Check times: 7:00 AM and 7:00 PM (GMT+8)
-TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8 timezone
-STATE_FILE = "previous_state.json"  # File to store previous state for comparison
+ERROR_BROADCAST_INTERVAL = 6 * 3600  # Broadcast at most one error every 6 hours
+OUTBOX_POLL_INTERVAL = 5  # seconds between polls of an empty outbox
+MEMBER_CACHE_TTL = 3600  # seconds a user's group membership is remembered for searches
+INLINE_RESULTS = 10  # Results shown for an inline query
+INLINE_CACHE_TIME = 60  # seconds Telegram may cache inline results
+
+# Time of the last error broadcast (time.monotonic), None if no error was sent yet
+last_error_broadcast = None
+
+# Set when notifications were added to the outbox, so they are sent right
+# away instead of at the next poll. Created in the running event loop.
+outbox_wakeup = None
+
+# Serializes portal work (check cycles, deadline refreshes, config baselines),
+# which runs in a worker thread so the event loop stays responsive.
+# Created in the running event loop on first use.
+portal_lock = None
+
+# Held for a whole check cycle, so configuration changes wait for the cycle
+# to finish instead of changing COURSES between its steps
+cycle_lock = None
 
 # Initialize bot application
 application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
 bot = application.bot
 
-# Function to load previous state
-def load_previous_state():
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-# Function to save current state
-def save_current_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f)
-
-# Function to check for updates
-def check_for_updates(current_state, previous_state):
-    updates = {}
-    for course_code, course_data in current_state.items():
-        course_updates = {
-            'new_sections': [],
-            'modified_sections': [],
-            'new_activities': [],
-            'modified_activities': []
-        }
-        
-        # Check if this is a new course
-        if course_code not in previous_state:
-            updates[course_code] = course_data
-            continue
-            
-        prev_course_data = previous_state[course_code]
-        
-        # Compare sections
-        for section_id, section in course_data.items():
-            # New section
-            if section_id not in prev_course_data:
-                course_updates['new_sections'].append(section)
-                continue
-                
-            prev_section = prev_course_data[section_id]
-            
-            # Compare activities within sections
-            current_activities = {act['name']: act for act in section['activities']}
-            previous_activities = {act['name']: act for act in prev_section['activities']}
-            
-            # Find new activities
-            for act_name, activity in current_activities.items():
-                if act_name not in previous_activities:
-                    course_updates['new_activities'].append(activity)
-                else:
-                    # Check if activity was modified
-                    prev_activity = previous_activities[act_name]
-                    if activity != prev_activity:
-                        course_updates['modified_activities'].append({
-                            'name': act_name,
-                            'old': prev_activity,
-                            'new': activity
-                        })
-        
-        # Only include course in updates if there are actual changes
-        if any(updates for updates in course_updates.values()):
-            updates[course_code] = course_updates
-    
-    return updates
-
-# Function to format notification message
-def format_notification(updates):
-    message = "📚 UniMAP E-Learning Updates\n\n"
-    
-    for course_code, course_updates in updates.items():
-        message += f"Course: {COURSES[course_code]['name']}\n"
-        message += "----------------------------------------\n"
-        
-        if isinstance(course_updates, dict) and 'new_sections' in course_updates:
-            # New sections
-            if course_updates['new_sections']:
-                message += "🆕 New Sections:\n"
-                for section in course_updates['new_sections']:
-                    message += f"• {section['name']}\n"
-            
-            # New activities
-            if course_updates['new_activities']:
-                message += "\n🆕 New Activities:\n"
-                for activity in course_updates['new_activities']:
-                    message += f"• {activity['name']}\n"
-                    message += f"  Status: {activity['status']}\n"
-            
-            # Modified activities
-            if course_updates['modified_activities']:
-                message += "\n📝 Modified Activities:\n"
-                for change in course_updates['modified_activities']:
-                    message += f"• {change['name']}\n"
-                    if change['old']['status'] != change['new']['status']:
-                        message += f"  Status changed: {change['old']['status']} ➡️ {change['new']['status']}\n"
-        else:
-            # Handle case where entire course is new
-            message += "New/Updated Activities:\n"
-            for section in course_updates.values():
-                for activity in section['activities']:
-                    message += f"• {activity['name']}\n"
-                    message += f"  Status: {activity['status']}\n"
-        
-        message += "----------------------------------------\n\n"
-    
-    return message
-
-# Function to scrape a single course
-def scrape_course(session, course_code):
-    url = COURSES[course_code]['url']
-    response = session.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
-    
-    sections = {}
-    for section in soup.find_all("li", class_="section main clearfix"):
-        section_id = section.get("id")
-        section_name = section.find("h3", class_="sectionname")
-        if section_name:
-            section_name = section_name.text.strip()
-        else:
-            continue
-        
-        activities = []
-        for activity in section.find_all("li", class_="activity"):
-            name_elem = activity.find("span", class_="instancename")
-            if name_elem:
-                activity_name = name_elem.text.strip()
-                activity_status = activity.find("img", alt=True)["alt"] if activity.find("img", alt=True) else "Unknown"
-                activities.append({
-                    "name": activity_name,
-                    "status": activity_status
-                })
-        
-        sections[section_id] = {
-            "name": section_name,
-            "activities": activities
-        }
-    
-    return sections
+# Notifications waiting to be delivered, committed together with the state
+outbox = EventQueue()
 
-# Function to scrape all courses
-def scrape_portal():
-    try:
-        session = requests.Session()
-        base_url = "https://elearning.unimap.edu.my"
-        login_url = f"{base_url}/login/index.php"
-        
-        # Check if credentials are set
-        username = os.getenv("PORTAL_USERNAME")
-        password = os.getenv("PORTAL_PASSWORD")
-        
-        if not username or not password:
-            raise ValueError("Portal credentials not found in .env file")
-        
-        logging.info("Attempting to log in to portal...")
-        
-        # Get the login page
-        initial_response = session.get(login_url)
-        if initial_response.status_code != 200:
-            raise ValueError(f"Failed to access login page. Status code: {initial_response.status_code}")
-            
-        # Log initial cookies
-        logging.info("Initial cookies:")
-        for cookie in session.cookies:
-            logging.info(f"Cookie {cookie.name}: {cookie.value}")
-        
-        # Parse the login form
-        soup = BeautifulSoup(initial_response.text, 'html.parser')
-        login_form = soup.find('form', id='login')
-        
-        if not login_form:
-            logging.error("Login form structure:")
-            logging.error(soup.prettify())
-            raise ValueError("Login form not found on page - page structure logged above")
-        
-        # Get login form action URL
-        form_action = login_form.get('action', login_url)
-        if not form_action.startswith('http'):
-            form_action = base_url + form_action
-        logging.info(f"Login form action URL: {form_action}")
-        
-        # Get all form inputs including hidden fields
-        form_inputs = login_form.find_all('input')
-        logging.info(f"Found {len(form_inputs)} form inputs")
-        
-        # Build the login payload with all form fields
-        payload = {}
-        
-        # Add any hidden fields to payload first
-        for input_field in form_inputs:
-            input_name = input_field.get('name')
-            input_value = input_field.get('value', '')
-            input_type = input_field.get('type')
-            
-            if input_name:
-                logging.info(f"Found form field: {input_name} (type: {input_type})")
-                if input_type != 'submit':
-                    payload[input_name] = input_value
-        
-        # Now add our login credentials
-        payload.update({
-            "username": username,
-            "password": password,
-            "anchor": ""  # Required by Moodle
-        })
-        
-        logging.info(f"Final payload keys: {', '.join(payload.keys())}")
-        
-        # Set proper headers
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Origin': base_url,
-            'Referer': login_url,
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Cache-Control': 'max-age=0'
-        }
-        
-        # Try to login
-        logging.info("Sending login request...")
-        response = session.post(form_action, data=payload, headers=headers, allow_redirects=True)
-        logging.info(f"Login response status code: {response.status_code}")
-        logging.info(f"Login response URL: {response.url}")
-        
-        # Log cookies after login attempt
-        logging.info("Cookies after login attempt:")
-        for cookie in session.cookies:
-            logging.info(f"Cookie {cookie.name}: {cookie.value}")
-        
-        # Log response headers
-        logging.info("Response headers:")
-        for header, value in response.headers.items():
-            logging.info(f"{header}: {value}")
-        
-        # Verify login success by checking if redirected to dashboard
-        logging.info("Checking login success...")
-        dashboard_check = session.get(f"{base_url}/my/")
-        logging.info(f"Dashboard check URL: {dashboard_check.url}")
-        
-        if "login/index.php" in dashboard_check.url:
-            # Get any error messages
-            error_soup = BeautifulSoup(dashboard_check.text, 'html.parser')
-            
-            # Check for different types of error messages
-            error_msg = error_soup.find('div', {'class': 'loginerrors'})
-            if not error_msg:
-                error_msg = error_soup.find('div', {'class': 'alert-danger'})
-            if not error_msg:
-                error_msg = error_soup.find('div', {'class': 'alert'})
-            if not error_msg:
-                error_msg = error_soup.find('div', {'id': 'notice'})
-                
-            error_text = error_msg.text.strip() if error_msg else "No specific error message found"
-            
-            # Log the page content for debugging
-            logging.error("Login page content after failed attempt:")
-            logging.error(error_soup.prettify())
-            
-            raise ValueError(f"Login failed: {error_text}")
-        
-        logging.info("Login successful!")
-        
-        # Scrape all courses
-        all_courses_data = {}
-        for course_code in COURSES:
-            try:
-                logging.info(f"Scraping course {course_code}...")
-                all_courses_data[course_code] = scrape_course(session, course_code)
-                logging.info(f"Successfully scraped course {course_code}")
-            except Exception as e:
-                logging.error(f"Error scraping course {course_code}: {str(e)}")
-                continue
-        
-        return all_courses_data, session
-        
-    except requests.exceptions.ConnectionError as e:
-        logging.error(f"Connection error details: {str(e)}")
-        raise ValueError("Failed to connect to the portal. Please check your internet connection.")
-    except requests.exceptions.Timeout as e:
-        logging.error(f"Timeout error details: {str(e)}")
-        raise ValueError("Portal request timed out. Please try again later.")
-    except Exception as e:
-        logging.error(f"Unexpected error in scrape_portal: {str(e)}")
-        raise
+# Whether a user is a member of one of the groups, by user ID, with the time it was checked
+member_cache = {}
 
 # Function to send messages to all groups
 async def send_message_to_all_groups(message):
-    """Send a message to all groups in the GROUPS list"""
-    for group_id in GROUPS:
+    """Send a message to all groups in the GROUPS list and the registered chats"""
+    for group_id in chat_registry.notification_chats():
         try:
             await bot.send_message(group_id, message)
         except Exception as e:
             logging.error(f"Failed to send message to group {group_id}: {e}")
             continue
 
+# Function to bring the pinned dashboards up to date
+async def refresh_dashboards(force=False):
+    """Edit the pinned assignment summary of every group (skipped if unchanged)"""
+    calls = await dashboard.update_all(bot, chat_registry.notification_chats(), format_tracked_assignments_summary(), force)
+    logging.info(f"Dashboard updated in {calls} chats" if calls else "Dashboard unchanged")
+
+# Function to send error messages without flooding the groups
+async def broadcast_error(message):
+    """
+    Send an error message to all groups, at most once per ERROR_BROADCAST_INTERVAL.
+
+    Errors that are suppressed are still logged.
+    """
+    global last_error_broadcast
+    now = time.monotonic()
+    if last_error_broadcast is not None and now - last_error_broadcast < ERROR_BROADCAST_INTERVAL:
+        logging.info("Error broadcast suppressed (rate limited)")
+        return
+    last_error_broadcast = now
+    await send_message_to_all_groups(message)
+
 # Signal handler for graceful shutdown
 async def shutdown_handler(signal, loop):
     try:
@@ -355,28 +133,340 @@ async def shutdown_handler(signal, loop):
     finally:
         loop.stop()
 
-def get_next_check_time():
-    """Get the next check time from the defined schedule"""
-    # Get current time in GMT+8
-    now = datetime.datetime.now(TIMEZONE)
-    today = now.replace(second=0, microsecond=0)
-    
-    # Convert check times to full datetime objects for today
-    check_times = [today.replace(hour=h, minute=m, second=0, microsecond=0) for h, m in CHECK_TIMES]
+# Function to run blocking portal work off the event loop
+async def run_portal_task(func, *args, prepare=None):
+    """
+    Run a blocking portal function in a worker thread, one at a time.
     
-    # Add tomorrow's times if needed
-    tomorrow = today + datetime.timedelta(days=1)
-    tomorrow_times = [tomorrow.replace(hour=h, minute=m, second=0, microsecond=0) for h, m in CHECK_TIMES]
-    all_times = check_times + tomorrow_times
-    
-    # Find the next check time
-    next_time = min((t for t in all_times if t > now), default=tomorrow_times[0])
-    return next_time
+    `prepare` is called on the event loop first, under the same lock, for
+    changes that must not happen in the worker thread.
+    """
+    global portal_lock
+    if portal_lock is None:
+        portal_lock = asyncio.Lock()
+    async with portal_lock:
+        if prepare is not None:
+            prepare()
+        context = contextvars.copy_context()  # Keep the cycle ID in the worker thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(context.run, func, *args))
+
+# Function to get the lock held for a whole check cycle
+def get_cycle_lock():
+    global cycle_lock
+    if cycle_lock is None:
+        cycle_lock = asyncio.Lock()
+    return cycle_lock
+
+# Function to check whether a user may search the tracked assignments
+async def is_group_member(user_id):
+    """Only members of the notified groups can search, since results show their courses"""
+    cached = member_cache.get(user_id)
+    if cached and time.monotonic() - cached[1] < MEMBER_CACHE_TTL:
+        return cached[0]
+    allowed = False
+    for group_id in chat_registry.notification_chats():
+        try:
+            member = await bot.get_chat_member(group_id, user_id)
+        except Exception as e:
+            logging.debug(f"Membership check in group {group_id} failed: {e}")
+            continue
+        if member.status not in ("left", "kicked"):
+            allowed = True
+            break
+    member_cache[user_id] = (allowed, time.monotonic())
+    return allowed
+
+# Function to handle the /search command
+async def search_command(update: Update, context):
+    """Reply with the tracked assignments matching the words after /search"""
+    query = " ".join(context.args)
+    if not query:
+        await update.effective_message.reply_text("Usage: /search <words>, e.g. /search lab report")
+        return
+    if str(update.effective_chat.id) not in chat_registry.notification_chats() and not await is_group_member(update.effective_user.id):
+        return
+    await update.effective_message.reply_text(format_search_results(query, search_index.search(query)))
+
+# Function to answer inline queries (@bot lab report)
+async def inline_search(update: Update, context):
+    """Offer the tracked assignments matching an inline query"""
+    inline_query = update.inline_query
+    results = []
+    if inline_query.query.strip() and await is_group_member(inline_query.from_user.id):
+        for assignment in search_index.search(inline_query.query, INLINE_RESULTS):
+            due = assignment.due_date.strftime('%d %b %Y, %I:%M %p') if assignment.due_date else "no due date"
+            results.append(InlineQueryResultArticle(
+                id=assignment.id,
+                title=assignment.name,
+                description=f"{assignment.course_code} · Due {due}",
+                input_message_content=InputTextMessageContent(format_search_result(assignment))
+            ))
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
+# Function to skip updates that were handled before a restart
+async def skip_handled_update(update: Update, context):
+    """Stop Telegram's redelivery of updates handled before a restart from running twice"""
+    if not chat_registry.accept_update(update.update_id, persist=update.inline_query is None):
+        logging.info(f"Skipping update {update.update_id}, handled before the restart")
+        raise ApplicationHandlerStop
+
+# Function to register and deregister chats as the bot is added and removed
+async def membership_update(update: Update, context):
+    """Start or stop notifying a chat when the bot joins or leaves it"""
+    registered = len(chat_registry.notification_chats())
+    await handle_membership_update(bot, update)
+    if len(chat_registry.notification_chats()) > registered:
+        await refresh_dashboards()
+
+# Function to check that a subscription command comes from an allowed private chat
+async def subscription_user(update: Update):
+    """Get the ID of the user sending a subscription command, or None (after replying) if not allowed"""
+    if update.effective_chat.type != "private":
+        await update.effective_message.reply_text("Send me a direct message to manage your subscription.")
+        return None
+    if not await is_group_member(update.effective_user.id):
+        await update.effective_message.reply_text("Subscriptions are only available to members of the course groups.")
+        return None
+    return str(update.effective_user.id)
+
+# Function to parse the course codes of a subscription command
+def parse_course_codes(args):
+    """Split command arguments into known course codes and unknown ones"""
+    codes = [arg.upper() for arg in args]
+    return [code for code in codes if code in COURSES], [code for code in codes if code not in COURSES]
+
+# Function to reply with the subscription commands
+async def help_command(update: Update, context):
+    """Explain the subscription commands in a direct message"""
+    message = "🤖 UniMAP e-learning updates\n\n"
+    message += "/subscribe all - get updates of every tracked course\n"
+    message += "/subscribe <code> ... - get updates of specific courses\n"
+    message += "/unsubscribe [<code> ...] - stop (some) updates\n"
+    message += "/mode all|assignments - everything, or assignments and grades only\n"
+    message += "/urgency <days>|off - only assignments due within that many days\n"
+    message += "/subscriptions - show your settings\n"
+    message += "/search <words> - find a tracked assignment\n\n"
+    message += "Tracked courses:\n"
+    for code, course in COURSES.items():
+        message += f"• {course['name']} ({code})\n"
+    await update.effective_message.reply_text(message)
+
+# Function to handle the /subscribe command
+async def subscribe_command(update: Update, context):
+    """Subscribe to every course or add specific courses"""
+    user_id = await subscription_user(update)
+    if user_id is None:
+        return
+    if not context.args:
+        await update.effective_message.reply_text("Usage: /subscribe all, or /subscribe <course code> ...")
+        return
+    subscription = subscriptions.get(user_id) or Subscription(user_id=user_id)
+    if [arg.lower() for arg in context.args] == ["all"]:
+        subscription.courses = []
+    else:
+        codes, unknown = parse_course_codes(context.args)
+        if unknown:
+            await update.effective_message.reply_text(f"Unknown course codes: {', '.join(unknown)}")
+            return
+        subscription.courses = sorted(set(subscription.courses) | set(codes))
+    subscriptions.put(subscription)
+    await update.effective_message.reply_text(format_subscription(subscription, course_names()))
+
+# Function to handle the /unsubscribe command
+async def unsubscribe_command(update: Update, context):
+    """Unsubscribe from specific courses, or from everything without arguments"""
+    user_id = await subscription_user(update)
+    if user_id is None:
+        return
+    subscription = subscriptions.get(user_id)
+    if subscription is None:
+        await update.effective_message.reply_text(format_subscription(None, course_names()))
+        return
+    if context.args and [arg.lower() for arg in context.args] != ["all"]:
+        codes, _ = parse_course_codes(context.args)
+        if not subscription.courses:
+            subscription.courses = sorted(set(COURSES) - set(codes))  # All courses but these
+        else:
+            subscription.courses = [code for code in subscription.courses if code not in codes]
+        if subscription.courses:
+            subscriptions.put(subscription)
+            await update.effective_message.reply_text(format_subscription(subscription, course_names()))
+            return
+    subscriptions.remove(user_id)
+    await update.effective_message.reply_text("🔕 You are unsubscribed and will get no more messages from me.")
+
+# Function to handle the /mode command
+async def mode_command(update: Update, context):
+    """Choose between every notification and assignments only"""
+    user_id = await subscription_user(update)
+    if user_id is None:
+        return
+    subscription = subscriptions.get(user_id)
+    if subscription is None or [arg.lower() for arg in context.args] not in (["all"], ["assignments"]):
+        await update.effective_message.reply_text("Usage: /mode all or /mode assignments (after /subscribe)")
+        return
+    subscription.assignments_only = context.args[0].lower() == "assignments"
+    subscriptions.put(subscription)
+    await update.effective_message.reply_text(format_subscription(subscription, course_names()))
+
+# Function to handle the /urgency command
+async def urgency_command(update: Update, context):
+    """Only notify about assignments due within a number of days"""
+    user_id = await subscription_user(update)
+    if user_id is None:
+        return
+    subscription = subscriptions.get(user_id)
+    argument = context.args[0].lower() if len(context.args) == 1 else ""
+    if subscription is None or not (argument == "off" or (argument.isdigit() and int(argument) > 0)):
+        await update.effective_message.reply_text("Usage: /urgency <days> or /urgency off (after /subscribe)")
+        return
+    subscription.within_days = None if argument == "off" else int(argument)
+    subscriptions.put(subscription)
+    await update.effective_message.reply_text(format_subscription(subscription, course_names()))
+
+# Function to handle the /subscriptions command
+async def subscriptions_command(update: Update, context):
+    """Show the user's subscription"""
+    user_id = await subscription_user(update)
+    if user_id is not None:
+        await update.effective_message.reply_text(format_subscription(subscriptions.get(user_id), course_names()))
+
+# Function to get the names of the tracked courses
+def course_names():
+    return {code: course['name'] for code, course in COURSES.items()}
+
+# Function to refresh due dates between scheduled checks
+async def deadline_refresh_loop(client):
+    """Refresh due dates from the calendar export and announce moved deadlines"""
+    while True:
+        await clock.sleep(DEADLINE_REFRESH_INTERVAL)
+        try:
+            new_cycle_id()
+            await run_portal_task(client.ensure_logged_in)
+            moved, assignments = await run_portal_task(refresh_deadlines, client)
+            if moved:
+                commit_changes(outbox, [due_date_event(a) for a in moved], assignments=assignments)
+                wake_outbox()
+                await refresh_dashboards()
+        except Exception as e:
+            logging.error(f"Error refreshing deadlines: {str(e)}")
+
+# Function to start delivering newly queued notifications
+def wake_outbox():
+    if outbox_wakeup is not None:
+        outbox_wakeup.set()
+
+# Function to deliver queued notifications
+async def outbox_delivery_loop():
+    """Send queued notifications to every group, resuming where a restart left off"""
+    global outbox_wakeup
+    outbox_wakeup = asyncio.Event()
+    while True:
+        try:
+            delivered, retry_delay = await deliver_batch(bot, outbox)
+            if retry_delay is not None:
+                await clock.sleep(retry_delay)
+                continue
+            if not delivered:
+                await clock.wait(outbox_wakeup, OUTBOX_POLL_INTERVAL)
+                outbox_wakeup.clear()
+        except Exception as e:
+            logging.error(f"Error delivering notifications: {str(e)}")
+            await clock.sleep(OUTBOX_POLL_INTERVAL)
+
+# Function to check the announcement forums between scheduled checks
+async def forum_poll_loop(client):
+    """Poll the announcement forums for new posts every FORUM_POLL_INTERVAL"""
+    forum_state = load_forum_state()
+    while True:
+        try:
+            new_cycle_id()
+            # Poll on a copy: if the commit fails, the posts are found again next time
+            polled = copy.deepcopy(forum_state)
+            posts = await run_portal_task(check_forum_updates, client, polled)
+            commit_changes(outbox, [forum_post_event(post) for post in posts], forums=polled)
+            forum_state = polled
+            if posts:
+                wake_outbox()
+        except Exception as e:
+            logging.error(f"Error polling forums: {str(e)}")
+        await clock.sleep(FORUM_POLL_INTERVAL)
+
+# Function to check for released grades after a check cycle
+async def check_grades(client, grade_state):
+    """Publish the grades released since the last check; failures are retried after the next cycle"""
+    try:
+        # Check on a copy: if the commit fails, the grades are found again next time
+        checked = copy.deepcopy(grade_state)
+        grades = await run_portal_task(check_grade_updates, client, checked)
+        commit_changes(outbox, [grade_event(grade) for grade in grades], grades=checked)
+        grade_state.clear()
+        grade_state.update(checked)
+        if grades:
+            wake_outbox()
+    except Exception as e:
+        logging.error(f"Error checking grades: {str(e)}")
+
+# Function to apply changes to config.py and .env while running
+async def config_watch_loop(client):
+    """Apply added/removed courses and chats without a restart"""
+    watcher = ConfigWatcher()
+    while True:
+        await clock.sleep(CONFIG_POLL_INTERVAL)
+        try:
+            change = watcher.poll()
+            if not change:
+                continue
+            # Applied between check cycles. COURSES and GROUPS are swapped on the event
+            # loop, where the command handlers read them, and no portal work runs
+            # before the new courses are baselined
+            async with get_cycle_lock():
+                if change.added_courses or change.updated_courses:
+                    await run_portal_task(client.ensure_logged_in)
+                await run_portal_task(update_tracked_state, client, change,
+                                      prepare=functools.partial(apply_config, change))
+            
+            if change.added_courses or change.removed_courses:
+                message = "⚙️ Tracked courses updated\n\n"
+                for course_code in change.added_courses:
+                    message += f"➕ {COURSES[course_code]['name']} ({course_code})\n"
+                for course_code in change.removed_courses:
+                    message += f"➖ {course_code}\n"
+                await send_message_to_all_groups(message)
+            
+            # Bring newly added chats up to date
+            for group_id in change.added_groups:
+                try:
+                    await bot.send_message(group_id, "🤖 This chat will now receive UniMAP e-learning updates!")
+                except Exception as e:
+                    logging.error(f"Failed to send message to group {group_id}: {e}")
+            await refresh_dashboards()
+        except Exception as e:
+            logging.error(f"Error applying configuration change: {str(e)}")
+
+# Function to greet the chats and show the dashboards after startup
+async def announce_startup(startup):
+    """Send the startup message and the pinned dashboards, recorded as the 'announced' phase"""
+    try:
+        startup_message = "🤖 Bot is now connected and monitoring courses!\n\n"
+        startup_message += "📚 Tracked Courses:\n"
+        for code, course in COURSES.items():
+            startup_message += f"• {course['name']} ({code})\n"
+        startup_message += f"\n⏰ Checking at 7:00 AM and 7:00 PM daily (GMT+8)\n"
+        await send_message_to_all_groups(startup_message)
+        
+        # Show the assignment summary from the persisted state on the pinned
+        # dashboards (re-created if deleted) while the portal is crawled
+        await refresh_dashboards(force=True)
+        startup.mark('announced')
+    except Exception as e:
+        logging.error(f"Error announcing startup: {str(e)}")
 
 # Main function
 async def main():
-    retry_count = 0
-    max_retries = 3
+    consecutive_failures = 0
+    client = PortalClient()
     
     try:
         # Set up signal handlers for graceful shutdown
@@ -399,188 +489,120 @@ async def main():
         if not os.getenv("PORTAL_PASSWORD"):
             raise ValueError("PORTAL_PASSWORD not found in environment variables")
             
-        # Send startup message
-        startup_message = "🤖 Bot is now connected and monitoring courses!\n\n"
-        startup_message += "📚 Tracked Courses:\n"
-        for code, course in COURSES.items():
-            startup_message += f"• {course['name']} ({code})\n"
-        startup_message += f"\n⏰ Checking at 7:00 AM and 7:00 PM daily (GMT+8)\n"
-        await send_message_to_all_groups(startup_message)
-        
-        # Try to get initial assignments
-        try:
-            logging.info("Getting initial assignments...")
-            # Create a session and scrape portal
-            session = requests.Session()
-            base_url = "https://elearning.unimap.edu.my"
-            login_url = f"{base_url}/login/index.php"
-            
-            # Check if credentials are set
-            username = os.getenv("PORTAL_USERNAME")
-            password = os.getenv("PORTAL_PASSWORD")
-            
-            if not username or not password:
-                raise ValueError("Portal credentials not found in .env file")
-            
-            logging.info("Attempting to log in to portal...")
-            
-            # Get the login page
-            initial_response = session.get(login_url)
-            if initial_response.status_code != 200:
-                raise ValueError(f"Failed to access login page. Status code: {initial_response.status_code}")
-            
-            # Parse the login form
-            soup = BeautifulSoup(initial_response.text, 'html.parser')
-            login_form = soup.find('form', id='login')
-            
-            if not login_form:
-                raise ValueError("Login form not found on page")
-            
-            # Get login form action URL
-            form_action = login_form.get('action', login_url)
-            if not form_action.startswith('http'):
-                form_action = base_url + form_action
-            
-            # Get all form inputs including hidden fields
-            form_inputs = login_form.find_all('input')
-            
-            # Build the login payload with all form fields
-            payload = {}
-            
-            # Add any hidden fields to payload first
-            for input_field in form_inputs:
-                input_name = input_field.get('name')
-                input_value = input_field.get('value', '')
-                input_type = input_field.get('type')
-                
-                if input_name:
-                    if input_type != 'submit':
-                        payload[input_name] = input_value
-            
-            # Now add our login credentials
-            payload.update({
-                "username": username,
-                "password": password,
-                "anchor": ""  # Required by Moodle
-            })
-            
-            # Set proper headers
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'en-US,en;q=0.5',
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'Origin': base_url,
-                'Referer': login_url,
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Cache-Control': 'max-age=0'
-            }
-            
-            # Try to login
-            response = session.post(form_action, data=payload, headers=headers, allow_redirects=True)
-            
-            # Verify login success
-            dashboard_check = session.get(f"{base_url}/my/")
-            if "login/index.php" in dashboard_check.url:
-                raise ValueError("Login failed")
-            
-            if session:
-                current_assignments = get_active_assignments(session)
-                if current_assignments:
-                    initial_message = "🔍 Found active assignments:\n\n"
-                    for assignment in current_assignments.values():
-                        initial_message += f"📝 {assignment.course_name}\n"
-                        initial_message += f"• {assignment.name}\n"
-                        if assignment.due_date:
-                            now = datetime.datetime.now(TIMEZONE)
-                            time_until_due = assignment.due_date - now
-                            days = time_until_due.days
-                            hours = time_until_due.seconds // 3600
-                            minutes = (time_until_due.seconds % 3600) // 60
-                            
-                            # Format time remaining
-                            time_str = []
-                            if days > 0:
-                                time_str.append(f"{days} days")
-                            if hours > 0 or days == 0:  # Show hours if less than a day or if there are hours
-                                time_str.append(f"{hours} hours")
-                            if minutes > 0 and days == 0:  # Show minutes only if less than a day
-                                time_str.append(f"{minutes} minutes")
-                            
-                            initial_message += f"• **Due: {assignment.due_date.strftime('%d %B %Y, %I:%M %p')}**\n"
-                            initial_message += f"• Time remaining: {', '.join(time_str)}\n"
-                        initial_message += "----------------------------------------\n"
-                    await send_message_to_all_groups(initial_message)
-        except Exception as e:
-            logging.error(f"Error getting initial assignments: {str(e)}")
-            await send_message_to_all_groups("⚠️ Could not fetch initial assignments. Will retry on next check.")
-        
-        # Send initial assignment summary
-        summary = format_tracked_assignments_summary()
-        await send_message_to_all_groups(summary)
-        
+        startup.mark('config')
+        
+        # Load the persisted state, which is served until the first check
+        # finishes, including any state a crash left uncommitted
+        journal.load()
+        apply_pending_states(outbox)
+        outbox.release_all()  # This process is the only consumer of its outbox
+        tracked_assignments = load_assignments()
+        startup.mark('state_load')
+        logging.info(f"Warm start with {len(tracked_assignments)} tracked assignments" if tracked_assignments
+                     else "Cold start, no tracked assignments yet")
+        
+        # Answer /search, inline queries and subscription commands, and
+        # register the chats the bot is added to
+        application.add_handler(TypeHandler(Update, skip_handled_update), group=-1)
+        application.add_handler(ChatMemberHandler(membership_update, ChatMemberHandler.MY_CHAT_MEMBER))
+        search_index.build(tracked_assignments)
+        application.add_handler(CommandHandler("search", search_command))
+        application.add_handler(InlineQueryHandler(inline_search))
+        
+        # Manage per-user course subscriptions by direct message
+        application.add_handler(CommandHandler(["start", "help"], help_command))
+        application.add_handler(CommandHandler("subscribe", subscribe_command))
+        application.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+        application.add_handler(CommandHandler("mode", mode_command))
+        application.add_handler(CommandHandler("urgency", urgency_command))
+        application.add_handler(CommandHandler("subscriptions", subscriptions_command))
+        await application.initialize()
+        await application.start()
+        await application.updater.start_polling(allowed_updates=[Update.MESSAGE, Update.INLINE_QUERY,
+                                                              Update.MY_CHAT_MEMBER])
+        startup.mark('ready')
+        startup.report()
+        
+        # Telegram calls for every chat, so they do not count towards 'ready'
+        announcement = asyncio.create_task(announce_startup(startup))
+        
+        # Keep due dates fresh between the scheduled full checks
+        asyncio.create_task(deadline_refresh_loop(client))
+        
+        # Deliver queued notifications, including those left over from before a restart
+        asyncio.create_task(outbox_delivery_loop())
+        
+        # Announcements are checked every few minutes
+        asyncio.create_task(forum_poll_loop(client))
+        
+        # Pick up course and chat changes without a restart
+        asyncio.create_task(config_watch_loop(client))
+        
+        grade_state = load_grade_state()
+        first_cycle = True
         while True:  # Continuous loop
             try:
                 # Calculate time until next check
                 next_check = get_next_check_time()
-                now = datetime.datetime.now(TIMEZONE)
+                now = clock.now()
                 wait_seconds = (next_check - now).total_seconds()
                 
-                logging.info(f"Next check scheduled for {next_check.strftime('%Y-%m-%d %H:%M:%S')}")
-                logging.info(f"Waiting {wait_seconds/3600:.2f} hours")
+                if first_cycle and not consecutive_failures:
+                    # Crawl right after startup to catch up on changes made while the bot was down
+                    wait_seconds = 0
+                    logging.info("Running startup check in the background")
+                elif consecutive_failures:
+                    # Retry the failed cycle with backoff, but never later than the next scheduled check
+                    wait_seconds = min(wait_seconds, backoff_delay(consecutive_failures, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX))
+                    logging.info(f"Retrying failed check in {wait_seconds/60:.1f} minutes")
+                else:
+                    logging.info(f"Next check scheduled for {next_check.strftime('%Y-%m-%d %H:%M:%S')}")
+                    logging.info(f"Waiting {wait_seconds/3600:.2f} hours")
                 
                 # Wait until next check time
-                await asyncio.sleep(wait_seconds)
-                
-                # Load previous state
-                previous_state = load_previous_state()
-                
-                # Scrape all courses and get session
-                logging.info("Starting portal scrape...")
-                current_state, session = scrape_portal()
-                logging.info("Portal scrape completed successfully")
-                
-                # Reset retry count on successful scrape
-                retry_count = 0
+                await clock.sleep(wait_seconds)
                 
-                # Check for course updates
-                updates = check_for_updates(current_state, previous_state)
+                cycle_id = new_cycle_id()
+                logging.info(f"Starting check cycle {cycle_id}")
+                # Each course is notified and saved as soon as it is scraped;
+                # the delivery loop sends the queued notifications
+                async with get_cycle_lock():
+                    cycle = stream_check_cycle(client)
+                    try:
+                        while True:
+                            step = await run_portal_task(next, cycle, None)
+                            if step is None:
+                                break
+                            events, courses, assignments = step
+                            commit_changes(outbox, events, courses, assignments)
+                            if events:
+                                wake_outbox()
+                    finally:
+                        cycle.close()
+                    await check_grades(client, grade_state)
                 
-                # Send notifications if updates are found
-                if updates:
-                    message = format_notification(updates)
-                    await send_message_to_all_groups(message)
+                # Encoding and compressing the snapshot stays off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, save_state_snapshot)
                 
-                # Check for assignment updates
-                new_assignments, modified_assignments, _ = check_assignment_updates(session)
+                if consecutive_failures:
+                    logging.info(f"Portal check recovered after {consecutive_failures} failed attempts")
+                consecutive_failures = 0
+                if first_cycle:
+                    first_cycle = False
+                    startup.mark('first_cycle')
+                    startup.report()
                 
-                # Send notifications for new assignments
-                for assignment in new_assignments:
-                    message = "🆕 New Assignment!\n" + format_assignment_notification(assignment)
-                    await send_message_to_all_groups(message)
-                
-                # Send notifications for modified assignments
-                for assignment in modified_assignments:
-                    message = "📝 Assignment Updated!\n" + format_assignment_notification(assignment)
-                    await send_message_to_all_groups(message)
-                
-                # Save the current state
-                save_current_state(current_state)
+                await announcement  # The pinned dashboards are created there
+                await refresh_dashboards()
                 
             except Exception as e:
-                retry_count += 1
-                logging.error(f"Error during monitoring (attempt {retry_count}/{max_retries}): {str(e)}")
+                consecutive_failures += 1
+                logging.error(f"Error during monitoring (attempt {consecutive_failures}): {str(e)}")
                 
-                if retry_count >= max_retries:
-                    error_message = f"❌ Failed after {max_retries} attempts. Last error: {str(e)}\nBot will now restart..."
-                    await send_message_to_all_groups(error_message)
-                    # Exit the script to allow process manager to restart it
-                    sys.exit(1)
-                else:
-                    error_message = f"An error occurred during monitoring: {str(e)}\nRetrying in 1 minute... (attempt {retry_count}/{max_retries})"
-                    await send_message_to_all_groups(error_message)
-                    await asyncio.sleep(60)  # Wait 1 minute before retrying
+                # The bot stays up and keeps its portal session; the error is only
+                # broadcast if no other error was broadcast recently
+                error_message = f"⚠️ An error occurred during monitoring: {str(e)}\nThe bot will keep retrying with backoff."
+                await broadcast_error(error_message)
                 
     except Exception as e:
         import traceback
@@ -594,6 +616,14 @@ async def main():
             await send_message_to_all_groups("🔴 Bot has stopped running. Service will be unavailable until restart.")
         except:
             logging.error("Failed to send shutdown message")
+        try:
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+                await application.shutdown()
+        except Exception as e:
+            logging.error(f"Failed to stop Telegram polling: {e}")
 
 if __name__ == "__main__":
     try:
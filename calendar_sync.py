@@ -0,0 +1,206 @@
+"""
+Calendar Export Sync for UniMAP Student Bot
+
+Moodle can export the user's calendar as an iCalendar (ICS) file. One
+download contains the due dates of every assignment in every course, so it
+is used as the authoritative source for deadlines and can be refreshed
+between full portal scrapes.
+
+Set PORTAL_CALENDAR_URL to the URL from "Calendar > Export calendar > Get
+calendar URL" to download the export directly. Without it the export form
+is submitted with the logged-in session.
+"""
+
+import os
+import re
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+from urllib.parse import urljoin
+import pytz
+import requests
+from bs4 import BeautifulSoup
+from models import Assignment
+
+BASE_URL = "https://elearning.unimap.edu.my"
+EXPORT_FORM_URL = f"{BASE_URL}/calendar/export.php"
+CALENDAR_URL = os.getenv("PORTAL_CALENDAR_URL")
+
+TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8
+
+# Suffixes Moodle adds to the event name of an assignment deadline
+DUE_SUFFIXES = re.compile(r'\s+(is due|due|should be completed|closes)$', re.IGNORECASE)
+MODULE_ID_PATTERN = re.compile(r'mod/assign/view\.php\?id=(\d+)')
+
+
+def fetch_calendar_lines(session: requests.Session) -> Iterator[str]:
+    """
+    Download the calendar export and yield its lines as they arrive.
+
+    Raises:
+        ValueError: If the export could not be downloaded
+    """
+    if CALENDAR_URL:
+        response = session.get(CALENDAR_URL, stream=True)
+    else:
+        form_page = session.get(EXPORT_FORM_URL)
+        soup = BeautifulSoup(form_page.text, 'html.parser')
+        form = soup.find('form', class_='mform') or soup.find('form')
+        if not form:
+            raise ValueError("Calendar export form not found")
+
+        payload = {}
+        for input_field in form.find_all('input'):
+            name = input_field.get('name')
+            if name and input_field.get('type') not in ('submit', 'radio', 'checkbox'):
+                payload[name] = input_field.get('value', '')
+        payload.update({
+            'events[exportevents]': 'all',
+            'period[timeperiod]': 'recentupcoming',
+            'export': 'Export',
+        })
+        action = urljoin(EXPORT_FORM_URL, form.get('action', EXPORT_FORM_URL))
+        response = session.post(action, data=payload, stream=True)
+
+    if response.status_code != 200:
+        raise ValueError(f"Calendar export failed with status code {response.status_code}")
+
+    first = True
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        if first:
+            if not line.startswith('BEGIN:VCALENDAR'):
+                raise ValueError("Calendar export did not return an iCalendar file")
+            first = False
+        yield line
+
+
+def unfold_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Join iCalendar continuation lines (lines starting with a space or tab)."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def unescape_text(value: str) -> str:
+    return (value.replace('\\n', '\n').replace('\\N', '\n')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def parse_ics_datetime(value: str) -> Optional[datetime]:
+    """Parse an iCalendar DATE-TIME (UTC or floating) or DATE value."""
+    try:
+        if value.endswith('Z'):
+            return pytz.utc.localize(datetime.strptime(value, '%Y%m%dT%H%M%SZ')).astimezone(TIMEZONE)
+        if 'T' in value:
+            return TIMEZONE.localize(datetime.strptime(value, '%Y%m%dT%H%M%S'))
+        return TIMEZONE.localize(datetime.strptime(value, '%Y%m%d'))
+    except ValueError:
+        return None
+
+
+def iter_calendar_events(lines: Iterable[str]) -> Iterator[Dict]:
+    """
+    Parse iCalendar lines incrementally, yielding one dict per VEVENT.
+
+    Each event has the keys uid, summary, description, categories, url and
+    due_date (taken from DTEND, or DTSTART for events without an end).
+    """
+    event = None
+    for line in unfold_lines(lines):
+        if line == 'BEGIN:VEVENT':
+            event = {}
+            continue
+        if line == 'END:VEVENT':
+            if event is not None:
+                start = parse_ics_datetime(event.get('DTSTART', ''))
+                end = parse_ics_datetime(event.get('DTEND', ''))
+                yield {
+                    'uid': event.get('UID', ''),
+                    'summary': unescape_text(event.get('SUMMARY', '')),
+                    'description': unescape_text(event.get('DESCRIPTION', '')),
+                    'categories': unescape_text(event.get('CATEGORIES', '')),
+                    'url': event.get('URL', ''),
+                    'due_date': end or start,
+                }
+            event = None
+            continue
+        if event is None or ':' not in line:
+            continue
+        key, value = line.split(':', 1)
+        event[key.split(';', 1)[0].upper()] = value
+
+
+def normalize_name(name: str) -> str:
+    return DUE_SUFFIXES.sub('', name.strip()).casefold()
+
+
+def match_event(event: Dict, assignments: Dict[str, Assignment],
+                by_name: Dict[str, Dict[tuple, Assignment]]) -> Optional[Assignment]:
+    """
+    Find the tracked assignment a calendar event belongs to.
+
+    Events are matched by the assignment's module ID when the event links to
+    the assignment, otherwise by course and assignment name. An event without
+    a course (no CATEGORIES) only matches if a single tracked assignment has
+    its name. `by_name` maps normalized assignment names to the assignments
+    with that name, keyed by (course code, course name).
+    """
+    for text in (event['url'], event['description']):
+        match = MODULE_ID_PATTERN.search(text)
+        if match and match.group(1) in assignments:
+            return assignments[match.group(1)]
+
+    name = normalize_name(event['summary'])
+    category = event['categories'].casefold()
+    candidates = [
+        (course_code, course_name, assignment)
+        for (course_code, course_name), assignment in by_name.get(name, {}).items()
+    ]
+    if not category:
+        if len(candidates) > 1:
+            logging.warning(f"Skipping calendar event {event['summary']!r}: no course given and "
+                            f"{len(candidates)} tracked assignments have that name")
+            return None
+        return candidates[0][2] if candidates else None
+    for course_code, course_name, assignment in candidates:
+        if course_code.casefold() in category or category in course_name.casefold():
+            return assignment
+    return None
+
+
+def apply_calendar_deadlines(assignments: Dict[str, Assignment], events: Iterable[Dict]) -> List[Assignment]:
+    """
+    Update the due dates of tracked assignments from calendar events.
+
+    Args:
+        assignments: Tracked assignments by ID, updated in place
+        events: Events from `iter_calendar_events()`
+
+    Returns:
+        List[Assignment]: Assignments whose due date changed
+    """
+    by_name: Dict[str, Dict[tuple, Assignment]] = {}
+    for a in assignments.values():
+        by_name.setdefault(normalize_name(a.name), {})[(a.course_code, a.course_name)] = a
+    moved = []
+    for event in events:
+        if not event['due_date']:
+            continue
+        assignment = match_event(event, assignments, by_name)
+        if assignment and assignment.due_date != event['due_date']:
+            logging.info(f"Due date of {assignment.name} moved from {assignment.due_date} to {event['due_date']}")
+            assignment.due_date = event['due_date']
+            moved.append(assignment)
+    return moved
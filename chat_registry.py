@@ -0,0 +1,175 @@
+"""
+Chat Registration for UniMAP Student Bot
+
+Chats no longer have to be found with get_chat_id.py and added to
+TELEGRAM_CHAT_IDS by hand. When the bot is added to a group or channel,
+Telegram sends a `my_chat_member` update and the chat is registered; when
+the bot is removed, it is deregistered. Registered chats are kept in
+chats.json and get every notification from the next delivery on, like the
+chats in TELEGRAM_CHAT_IDS, without a restart.
+
+The ID of the last handled update is kept in chats.json too. Updates that
+Telegram delivers again after a restart are skipped, and the notifier
+worker, which has no command handlers, pages through new updates from
+that offset (`poll_membership_updates()`).
+
+Only members of a chat that already gets notifications can register a new
+chat (CHAT_REGISTRATION=members, the default), since notifications show
+the courses of the portal account. CHAT_REGISTRATION=open lets anyone add
+the bot and CHAT_REGISTRATION=off disables registration.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from telegram import Bot, ChatMember, Update
+from config import GROUPS
+
+CHATS_FILE = "chats.json"
+CHAT_REGISTRATION = os.getenv("CHAT_REGISTRATION", "members").lower()  # "members", "open" or "off"
+REGISTERED_CHAT_TYPES = ("group", "supergroup", "channel")  # Private chats use /subscribe instead
+UPDATES_TIMEOUT = 30  # seconds a getUpdates long poll waits for new updates
+UPDATES_RETRY_DELAY = 10  # seconds to wait after a failed getUpdates
+WELCOME_MESSAGE = "✅ This chat will now receive UniMAP portal notifications."
+
+
+class ChatRegistry:
+    """Chats registered from membership updates and the offset of handled updates."""
+
+    def __init__(self, path: str = CHATS_FILE):
+        self.path = path
+        self.chats: Optional[Dict[str, Dict]] = None  # chat ID -> title, type, added_by, added_at
+        self.update_offset = 0  # ID of the last handled update
+
+    def load(self) -> Dict[str, Dict]:
+        if self.chats is None:
+            self.chats = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        data = json.load(f)
+                    self.chats = data.get('chats', {})
+                    self.update_offset = data.get('update_offset', 0)
+                except Exception as e:
+                    logging.error(f"Error loading registered chats: {str(e)}")
+        return self.chats
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'chats': self.chats, 'update_offset': self.update_offset}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error saving registered chats: {str(e)}")
+
+    def register(self, chat_id: str, title: str, chat_type: str, added_by: Optional[int]):
+        self.load()[chat_id] = {'title': title, 'type': chat_type, 'added_by': added_by, 'added_at': time.time()}
+        self.save()
+        logging.info(f"Registered chat {chat_id} ({title})")
+
+    def deregister(self, chat_id: str) -> bool:
+        """Remove a chat, returning whether it was registered"""
+        if self.load().pop(chat_id, None) is None:
+            return False
+        self.save()
+        logging.info(f"Deregistered chat {chat_id}")
+        return True
+
+    def accept_update(self, update_id: int, persist: bool = True) -> bool:
+        """
+        Advance the offset past an update.
+
+        Args:
+            update_id: ID of the update about to be handled
+            persist: Whether to save the offset now (not needed for updates
+                     that are harmless to see twice, like inline queries)
+
+        Returns:
+            bool: False if the update was handled before (replayed after a restart)
+        """
+        self.load()
+        if update_id <= self.update_offset:
+            return False
+        self.update_offset = update_id
+        if persist:
+            self.save()
+        return True
+
+    def notification_chats(self) -> List[str]:
+        """The chats in TELEGRAM_CHAT_IDS followed by the registered ones"""
+        return GROUPS + [chat_id for chat_id in self.load() if chat_id not in GROUPS]
+
+
+async def may_register(bot: Bot, user_id: Optional[int]) -> bool:
+    """Whether the user who added the bot to a chat may register it"""
+    if CHAT_REGISTRATION == "open":
+        return True
+    if CHAT_REGISTRATION != "members" or user_id is None:
+        return False
+    for chat_id in chat_registry.notification_chats():
+        try:
+            member = await bot.get_chat_member(chat_id, user_id)
+        except Exception as e:
+            logging.debug(f"Membership check in chat {chat_id} failed: {e}")
+            continue
+        if member.status not in (ChatMember.LEFT, ChatMember.BANNED):
+            return True
+    return False
+
+
+async def handle_membership_update(bot: Bot, update: Update):
+    """Register or deregister a chat after the bot was added to or removed from it"""
+    change = update.my_chat_member
+    if change is None or change.chat.type not in REGISTERED_CHAT_TYPES:
+        return
+    chat_id = str(change.chat.id)
+    title = change.chat.title or chat_id
+    status = change.new_chat_member.status
+    if status in (ChatMember.LEFT, ChatMember.BANNED):
+        if not chat_registry.deregister(chat_id) and chat_id in GROUPS:
+            logging.warning(f"Bot was removed from chat {chat_id} ({title}), which is in TELEGRAM_CHAT_IDS")
+        return
+    if status not in (ChatMember.MEMBER, ChatMember.ADMINISTRATOR) or chat_id in chat_registry.notification_chats():
+        return
+    added_by = change.from_user.id if change.from_user else None
+    if not await may_register(bot, added_by):
+        logging.warning(f"Not registering chat {chat_id} ({title}): added by {added_by}, "
+                        f"who is not allowed to (CHAT_REGISTRATION={CHAT_REGISTRATION})")
+        return
+    chat_registry.register(chat_id, title, change.chat.type, added_by)
+    try:
+        await bot.send_message(chat_id, WELCOME_MESSAGE)
+    except Exception as e:
+        logging.warning(f"Could not welcome chat {chat_id}: {e}")
+
+
+async def poll_membership_updates(bot: Bot):
+    """
+    Handle membership updates by long polling getUpdates, for processes
+    without an `Application` (the notifier worker).
+
+    Each page of updates starts after the persisted offset, which also
+    confirms the previous page to Telegram, so nothing is handled twice.
+    """
+    while True:
+        try:
+            chat_registry.load()
+            offset = chat_registry.update_offset + 1 if chat_registry.update_offset else None
+            updates = await bot.get_updates(offset=offset, timeout=UPDATES_TIMEOUT,
+                                            allowed_updates=[Update.MY_CHAT_MEMBER])
+            for update in updates:
+                if chat_registry.accept_update(update.update_id):
+                    await handle_membership_update(bot, update)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Error polling membership updates: {str(e)}")
+            await asyncio.sleep(UPDATES_RETRY_DELAY)
+
+
+# Registered chats of the current process
+chat_registry = ChatRegistry()
@@ -0,0 +1,84 @@
+"""
+Clock for UniMAP Student Bot
+
+The scheduler and the decisions that depend on the time of day (when the
+next check runs, which assignments are still active, how urgent they are,
+when a course is due a full crawl) read the time from `clock` instead of
+the system clock. Normally it is the system clock; the simulation
+(benchmarks/simulate.py) switches it to a virtual clock, which only moves
+when it is advanced, to run weeks of check cycles in seconds.
+
+The scheduled loops (checks, deadline refreshes, forum polls, config
+watching and notification retries) wait with `clock.sleep()`. Timing that
+is about real network calls stays on the system clock: the portal client's
+rate limit, retries and circuit breakers, Telegram long polling, the queue
+leases, caches and metrics.
+"""
+
+import time
+import asyncio
+from datetime import datetime
+from typing import Optional
+import pytz
+
+TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8
+
+
+class Clock:
+    """Wall clock that can be switched to virtual time."""
+
+    def __init__(self):
+        self.virtual_time: Optional[float] = None  # Unix timestamp while virtual, None for the system clock
+
+    def time(self) -> float:
+        """Current Unix timestamp"""
+        return self.virtual_time if self.virtual_time is not None else time.time()
+
+    def now(self, tz=TIMEZONE) -> datetime:
+        """Current time in `tz` (GMT+8 by default)"""
+        return datetime.fromtimestamp(self.time(), tz)
+
+    def set_virtual(self, start: datetime):
+        """Stop following the system clock and stand still at `start` until advanced"""
+        self.virtual_time = start.timestamp()
+
+    def advance(self, seconds: float):
+        """Move virtual time forward"""
+        if self.virtual_time is None:
+            raise ValueError("Only a virtual clock can be advanced")
+        self.virtual_time += max(0.0, seconds)
+
+    async def sleep(self, seconds: float):
+        """Wait `seconds`; a virtual clock skips ahead instead of waiting"""
+        if self.virtual_time is None:
+            await asyncio.sleep(seconds)
+        else:
+            self.advance(seconds)
+            await asyncio.sleep(0)
+
+    def sleep_blocking(self, seconds: float):
+        """`sleep()` for code outside the event loop (the crawler worker)"""
+        if self.virtual_time is None:
+            time.sleep(max(0.0, seconds))
+        else:
+            self.advance(seconds)
+
+    async def wait(self, event: asyncio.Event, timeout: float) -> bool:
+        """
+        Wait until `event` is set, for at most `timeout` seconds.
+
+        Returns:
+            bool: Whether the event was set
+        """
+        if self.virtual_time is None:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        elif not event.is_set():
+            await self.sleep(timeout)
+        return event.is_set()
+
+
+# Clock of the current process
+clock = Clock()
@@ -0,0 +1,168 @@
+"""
+Config Hot Reload for UniMAP Student Bot
+
+Watches config.py and .env for changes and applies them to the running bot.
+The COURSES dict and GROUPS list from config.py are updated in place, so
+every module that imported them sees the new values. New courses get a
+silent baseline scrape (course page and assignment index only), as do
+courses whose entry changed, removed courses are dropped from the stored
+state and the crawl plan, and chat changes take effect
+for the next message. Nothing is rescanned and the bot is not restarted.
+
+The in-place update (`apply_config()`) and the portal work for new and
+removed courses (`update_tracked_state()`) are separate, so bot.py can
+swap the configuration on its event loop and scrape in a worker thread.
+"""
+
+import os
+import runpy
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List
+from dotenv import load_dotenv
+import config
+from config import COURSES, GROUPS
+from journal import journal
+from crawl_planner import planner
+from course_tracker import scrape_course
+from assignment_tracker import load_assignments, save_assignments, get_course_assignments, is_active_assignment
+
+CONFIG_FILE = config.__file__
+ENV_FILE = ".env"
+CONFIG_POLL_INTERVAL = 30  # seconds between checks for changed files
+
+
+@dataclass
+class ConfigChange:
+    """Differences between the running configuration and the files on disk."""
+    added_courses: List[str] = field(default_factory=list)
+    removed_courses: List[str] = field(default_factory=list)
+    updated_courses: List[str] = field(default_factory=list)
+    added_groups: List[str] = field(default_factory=list)
+    removed_groups: List[str] = field(default_factory=list)
+    courses: Dict = field(default_factory=dict)
+    groups: List[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added_courses or self.removed_courses or self.updated_courses
+                    or self.added_groups or self.removed_groups)
+
+
+class ConfigWatcher:
+    """Detect changes to config.py and .env by polling their modification times."""
+
+    def __init__(self, paths=(CONFIG_FILE, ENV_FILE)):
+        self.paths = list(paths)
+        self.mtimes = {path: self._mtime(path) for path in self.paths}
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def changed(self) -> bool:
+        """Check whether any watched file changed since the last call."""
+        changed = False
+        for path in self.paths:
+            mtime = self._mtime(path)
+            if mtime != self.mtimes[path]:
+                self.mtimes[path] = mtime
+                changed = True
+        return changed
+
+    def poll(self) -> ConfigChange:
+        """Read the configuration again if a file changed and return the differences."""
+        if not self.changed():
+            return ConfigChange()
+        try:
+            load_dotenv(ENV_FILE, override=True)
+            values = runpy.run_path(CONFIG_FILE)
+        except Exception as e:
+            logging.error(f"Ignoring invalid configuration: {str(e)}")
+            return ConfigChange()
+        return diff_config(values.get('COURSES', {}), values.get('GROUPS', []))
+
+
+def diff_config(new_courses: Dict, new_groups: List[str]) -> ConfigChange:
+    """Compare a freshly loaded configuration with the running one."""
+    new_groups = [group.strip() for group in new_groups if group.strip()]
+    return ConfigChange(
+        added_courses=[code for code in new_courses if code not in COURSES],
+        removed_courses=[code for code in COURSES if code not in new_courses],
+        updated_courses=[code for code in new_courses if code in COURSES and new_courses[code] != COURSES[code]],
+        added_groups=[group for group in new_groups if group not in GROUPS],
+        removed_groups=[group for group in GROUPS if group not in new_groups],
+        courses=new_courses,
+        groups=new_groups,
+    )
+
+
+def apply_config_change(session, change: ConfigChange, update_state: bool = True):
+    """
+    Apply a configuration change to the running bot.
+
+    Args:
+        session: Logged-in portal session, used for the baseline of new courses
+        change: Result of `ConfigWatcher.poll()`
+        update_state: Whether to baseline new courses and drop removed ones from
+                      the stored state (False for processes that do not own it)
+    """
+    apply_config(change)
+    if update_state:
+        update_tracked_state(session, change)
+
+
+def apply_config(change: ConfigChange):
+    """
+    Update the shared COURSES and GROUPS in place so all importers see the change.
+
+    Call it from the thread that reads them (the event loop in bot.py).
+    """
+    if not change:
+        return
+    for course_code in change.removed_courses:
+        del COURSES[course_code]
+    for course_code in change.added_courses + change.updated_courses:
+        COURSES[course_code] = change.courses[course_code]
+    GROUPS[:] = change.groups
+
+    if change.added_groups or change.removed_groups:
+        logging.info(f"Chats updated: added {change.added_groups}, removed {change.removed_groups}")
+
+
+def update_tracked_state(session, change: ConfigChange):
+    """
+    Baseline new and changed courses and drop removed ones from the stored
+    state and the crawl plan, after `apply_config()`. Makes portal requests.
+    Must not run during a check cycle.
+    """
+    if not change:
+        return
+    removed = set(change.removed_courses)
+    rebaselined = change.added_courses + change.updated_courses
+    planner.forget_courses(change.removed_courses + change.updated_courses)
+    assignments = load_assignments()
+    if removed:
+        logging.info(f"Stopped tracking courses: {', '.join(change.removed_courses)}")
+        journal.append([{'type': 'course_removed', 'course': code} for code in change.removed_courses
+                        if code in journal.load()['courses']])
+    assignments = {k: v for k, v in assignments.items()
+                   if v.course_code not in removed and v.course_code not in change.updated_courses}
+
+    # Baseline new and changed courses without notifying, so only later changes are reported
+    for course_code in rebaselined:
+        try:
+            logging.info(f"{'Started tracking' if course_code in change.added_courses else 'Rebaselining'} course {course_code}")
+            journal.record_courses({course_code: scrape_course(session, course_code)})
+            for assignment in get_course_assignments(session, course_code, assignments):
+                if is_active_assignment(assignment):
+                    assignments[assignment.id] = assignment
+        except Exception as e:
+            # The course is picked up by the next regular check instead
+            logging.error(f"Error creating baseline for course {course_code}: {str(e)}")
+
+    if removed or rebaselined:
+        save_assignments(assignments)
+        journal.record_assignments({k: v.to_dict() for k, v in assignments.items()})
@@ -0,0 +1,151 @@
+"""
+Course Tracker for UniMAP Student Bot
+
+This module scrapes course pages into a tree of sections and activities,
+compares it with the previous state and formats course update
+notifications.
+"""
+
+import copy
+from bs4 import BeautifulSoup
+from config import COURSES
+from journal import journal
+from page_fingerprint import fingerprint, page_cache
+
+# Function to load previous state (last checkpoint plus journaled changes)
+def load_previous_state():
+    return copy.deepcopy(journal.load()['courses'])
+
+# Function to save current state (appends only what changed to the journal)
+def save_current_state(state):
+    journal.record_courses(state)
+
+# Function to check for updates
+def check_for_updates(current_state, previous_state):
+    updates = {}
+    for course_code, course_data in current_state.items():
+        course_updates = {
+            'new_sections': [],
+            'modified_sections': [],
+            'new_activities': [],
+            'modified_activities': []
+        }
+        
+        # Check if this is a new course
+        if course_code not in previous_state:
+            updates[course_code] = course_data
+            continue
+            
+        prev_course_data = previous_state[course_code]
+        
+        # Compare sections
+        for section_id, section in course_data.items():
+            # New section
+            if section_id not in prev_course_data:
+                course_updates['new_sections'].append(section)
+                continue
+                
+            prev_section = prev_course_data[section_id]
+            
+            # Compare activities within sections
+            current_activities = {act['name']: act for act in section['activities']}
+            previous_activities = {act['name']: act for act in prev_section['activities']}
+            
+            # Find new activities
+            for act_name, activity in current_activities.items():
+                if act_name not in previous_activities:
+                    course_updates['new_activities'].append(activity)
+                else:
+                    # Check if activity was modified
+                    prev_activity = previous_activities[act_name]
+                    if activity != prev_activity:
+                        course_updates['modified_activities'].append({
+                            'name': act_name,
+                            'old': prev_activity,
+                            'new': activity
+                        })
+        
+        # Only include course in updates if there are actual changes
+        if any(updates for updates in course_updates.values()):
+            updates[course_code] = course_updates
+    
+    return updates
+
+# Function to format notification message
+def format_notification(updates):
+    message = "📚 UniMAP E-Learning Updates\n\n"
+    
+    for course_code, course_updates in updates.items():
+        message += f"Course: {COURSES.get(course_code, {}).get('name', course_code)}\n"
+        message += "----------------------------------------\n"
+        
+        if isinstance(course_updates, dict) and 'new_sections' in course_updates:
+            # New sections
+            if course_updates['new_sections']:
+                message += "🆕 New Sections:\n"
+                for section in course_updates['new_sections']:
+                    message += f"• {section['name']}\n"
+            
+            # New activities
+            if course_updates['new_activities']:
+                message += "\n🆕 New Activities:\n"
+                for activity in course_updates['new_activities']:
+                    message += f"• {activity['name']}\n"
+                    message += f"  Status: {activity['status']}\n"
+            
+            # Modified activities
+            if course_updates['modified_activities']:
+                message += "\n📝 Modified Activities:\n"
+                for change in course_updates['modified_activities']:
+                    message += f"• {change['name']}\n"
+                    if change['old']['status'] != change['new']['status']:
+                        message += f"  Status changed: {change['old']['status']} ➡️ {change['new']['status']}\n"
+        else:
+            # Handle case where entire course is new
+            message += "New/Updated Activities:\n"
+            for section in course_updates.values():
+                for activity in section['activities']:
+                    message += f"• {activity['name']}\n"
+                    message += f"  Status: {activity['status']}\n"
+        
+        message += "----------------------------------------\n\n"
+    
+    return message
+
+# Function to scrape a single course (the parse is skipped if the page did not change)
+def scrape_course(session, course_code):
+    url = COURSES[course_code]['url']
+    response = session.get(url)
+    page_fingerprint = fingerprint(response.content)
+    cached = page_cache.get(course_code, page_fingerprint)
+    if cached is not None:
+        return cached
+    soup = BeautifulSoup(response.text, "html.parser")
+    
+    sections = {}
+    for section in soup.find_all("li", class_="section main clearfix"):
+        section_id = section.get("id")
+        section_name = section.find("h3", class_="sectionname")
+        if section_name:
+            section_name = section_name.text.strip()
+        else:
+            continue
+        
+        activities = []
+        for activity in section.find_all("li", class_="activity"):
+            name_elem = activity.find("span", class_="instancename")
+            if name_elem:
+                activity_name = name_elem.text.strip()
+                activity_status = activity.find("img", alt=True)["alt"] if activity.find("img", alt=True) else "Unknown"
+                activities.append({
+                    "name": activity_name,
+                    "status": activity_status
+                })
+        
+        sections[section_id] = {
+            "name": section_name,
+            "activities": activities
+        }
+    
+    page_cache.put(course_code, page_fingerprint, sections)
+    return sections
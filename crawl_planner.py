@@ -0,0 +1,348 @@
+"""
+Crawl Planner for UniMAP Student Bot
+
+Orders the work of a check cycle by priority and stops it when the cycle's
+time or request budget runs out. Work that did not fit is carried over and
+done first in the next cycle, which is scheduled early (CARRY_OVER_DELAY).
+
+Priority, highest first:
+1. Courses and assignments carried over from the last cycle or never seen before
+2. Courses with an open assignment due soon or a recent change
+3. Everything else, least recently crawled first
+
+Within each group, assignments due sooner come first.
+
+Progress is checkpointed per unit of work (course page, assignment index,
+assignment page) together with its result. A cycle that was interrupted
+(the portal timed out, say) or left work behind is resumed by the next one
+within RESUME_WINDOW, which reuses the finished units and only fetches what
+is missing. Courses whose page or index could not be fetched are marked
+stale until they are fetched again, so notifications can say which courses
+show old data. A course going stale and recovering is announced once each
+(`stale_changes()`), and everything recorded about a course is forgotten
+when it stops being tracked (`forget_courses()`).
+
+The planner also decides when a course may be checked incrementally,
+through its recent activity report (see recent_activity.py), and when it
+is due a full crawl.
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import pytz
+from models import Assignment
+from clock import clock
+
+PLAN_FILE = "crawl_plan.json"
+CYCLE_TIME_BUDGET = 15 * 60  # seconds per check cycle
+CYCLE_REQUEST_BUDGET = 300  # portal requests per check cycle
+CARRY_OVER_DELAY = 15 * 60  # seconds until a cycle with carried-over work runs
+DUE_SOON_WINDOW = 2 * 24 * 3600  # Assignments due within 2 days raise a course's priority
+RECENT_CHANGE_WINDOW = 7 * 24 * 3600  # Changes within 7 days raise a course's priority
+RESUME_WINDOW = 2 * 3600  # seconds within which an unfinished cycle is resumed instead of started over
+INCREMENTAL_CHECKS = True  # Check courses through their recent activity report between full crawls
+FULL_CRAWL_INTERVAL = 20 * 3600  # seconds; each course is crawled in full about once a day
+REPORT_OVERLAP = 5 * 60  # seconds the recent activity window reaches back, for clock differences
+
+
+class CrawlBudget:
+    """Time and request budget of one check cycle."""
+
+    def __init__(self, max_seconds: float = CYCLE_TIME_BUDGET, max_requests: int = CYCLE_REQUEST_BUDGET):
+        self.max_seconds = max_seconds
+        self.max_requests = max_requests
+        self.started = time.monotonic()
+        self.requests = 0
+
+    def exhausted(self) -> bool:
+        return (self.requests >= self.max_requests
+                or time.monotonic() - self.started >= self.max_seconds)
+
+    def spend(self, requests: int = 1):
+        self.requests += requests
+
+
+def new_checkpoint() -> Dict:
+    return {'started': clock.time(), 'done': {'courses': {}, 'indexes': {}, 'assignments': {}}}
+
+
+def load_stale_courses(path: str = PLAN_FILE) -> Dict[str, float]:
+    """
+    Courses that could not be fetched, read from the plan file so it works
+    in any process.
+
+    Returns:
+        Dict[str, float]: Course code -> time of the first failed fetch
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            stale = json.load(f).get('stale', {})
+    except Exception as e:
+        logging.error(f"Error loading stale courses: {str(e)}")
+        return {}
+    return merge_stale(stale)
+
+
+def merge_stale(stale: Dict[str, Dict[str, float]]) -> Dict[str, float]:
+    """Stale courses of every kind, with the time of their first failed fetch"""
+    courses = {}
+    for failures in stale.values():
+        for course_code, since in failures.items():
+            courses[course_code] = min(courses.get(course_code, since), since)
+    return courses
+
+
+class CrawlPlanner:
+    """Priority ordering, budgeting and carry-over of crawl work."""
+
+    def __init__(self, path: str = PLAN_FILE):
+        self.path = path
+        self.budget: Optional[CrawlBudget] = None
+        self.carry_over = {'courses': [], 'indexes': [], 'assignments': []}
+        self.deferred = {'courses': [], 'indexes': [], 'assignments': []}
+        self.last_changed: Dict[str, float] = {}
+        self.last_crawled: Dict[str, Dict[str, float]] = {'courses': {}, 'indexes': {}}
+        self.stale: Dict[str, Dict[str, float]] = {'courses': {}, 'indexes': {}}  # kind -> course code -> failing since
+        self.checkpoint: Optional[Dict] = None  # Units done in the current or unfinished cycle, with their results
+        self.last_checked: Dict[str, float] = {}  # course code -> start of its last committed check
+        self.last_full_crawl: Dict[str, float] = {}  # course code -> start of its last full crawl
+        self.announced_stale: List[str] = []  # Stale courses the chats were told about
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            self.carry_over.update(data.get('carry_over', {}))
+            self.last_changed = data.get('last_changed', {})
+            self.last_crawled.update(data.get('last_crawled', {}))
+            self.stale.update(data.get('stale', {}))
+            self.checkpoint = data.get('checkpoint')
+            self.last_checked = data.get('last_checked', {})
+            self.last_full_crawl = data.get('last_full_crawl', {})
+            self.announced_stale = data.get('announced_stale', [])
+        except Exception as e:
+            logging.error(f"Error loading crawl plan: {str(e)}")
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'carry_over': self.carry_over,
+                    'last_changed': self.last_changed,
+                    'last_crawled': self.last_crawled,
+                    'stale': self.stale,
+                    'checkpoint': self.checkpoint,
+                    'last_checked': self.last_checked,
+                    'last_full_crawl': self.last_full_crawl,
+                    'announced_stale': self.announced_stale,
+                }, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error saving crawl plan: {str(e)}")
+
+    def start_cycle(self, budget: Optional[CrawlBudget] = None):
+        """Start budgeting a check cycle, resuming the last one if it did not finish."""
+        self.budget = budget or CrawlBudget()
+        self.deferred = {'courses': [], 'indexes': [], 'assignments': []}
+        if self.checkpoint and clock.time() - self.checkpoint['started'] < RESUME_WINDOW:
+            done = sum(len(units) for units in self.checkpoint['done'].values())
+            logging.info(f"Resuming unfinished check cycle, {done} units already done")
+        else:
+            self.checkpoint = new_checkpoint()
+
+    def finish_cycle(self, completed: bool = False):
+        """
+        Stop budgeting and carry the deferred work into the next cycle.
+
+        Args:
+            completed: Whether the cycle ran to the end. The checkpoint is kept
+                       for the next cycle to resume unless the cycle completed
+                       with nothing deferred or failed.
+        """
+        if self.budget is not None:
+            deferred = sum(len(items) for items in self.deferred.values())
+            logging.info(f"Crawl cycle used {self.budget.requests} requests in "
+                         f"{time.monotonic() - self.budget.started:.0f}s, {deferred} items deferred")
+        if completed and not any(self.deferred.values()):
+            self.checkpoint = None
+        self.carry_over = self.deferred
+        self.budget = None
+        self.save()
+
+    def has_pending(self) -> bool:
+        """Whether work was carried over from the last cycle."""
+        return any(self.carry_over.values())
+
+    def allow(self, kind: str, key: str) -> bool:
+        """
+        Check the budget before doing one unit of work (one request).
+
+        Args:
+            kind: "courses", "indexes" or "assignments"
+            key: Course code or assignment ID
+
+        Returns:
+            bool: True if the work may be done; False if it was deferred
+        """
+        if self.budget is None:
+            return True
+        if self.budget.exhausted():
+            self.deferred[kind].append(key)
+            return False
+        self.budget.spend()
+        return True
+
+    def charge(self, requests: int):
+        """Charge requests made without asking first (e.g. the assignment page fallback)."""
+        if self.budget is not None:
+            self.budget.spend(requests)
+
+    def is_done(self, kind: str, key: str) -> bool:
+        """Whether a unit of work was done earlier in this (resumed) cycle."""
+        return self.budget is not None and key in self.checkpoint['done'][kind]
+
+    def result(self, kind: str, key: str):
+        """The checkpointed result of a unit of work, or None if it was not done."""
+        if self.budget is None:
+            return None
+        return self.checkpoint['done'][kind].get(key)
+
+    def record_done(self, kind: str, key: str, result=None):
+        """Checkpoint a finished unit of work with its (JSON serializable) result."""
+        if self.budget is not None:
+            self.checkpoint['done'][kind][key] = result
+
+    def record_failed(self, kind: str, key: str):
+        """Retry a failed unit of work in the next cycle and mark its course stale."""
+        if self.budget is not None:
+            self.deferred[kind].append(key)
+        if kind in self.stale:
+            self.stale[kind].setdefault(key, clock.time())
+
+    def record_crawled(self, kind: str, course_code: str):
+        self.last_crawled[kind][course_code] = clock.time()
+        self.stale[kind].pop(course_code, None)
+
+    def stale_courses(self) -> Dict[str, float]:
+        """Course code -> time of the first failed fetch, of the courses that are stale"""
+        return merge_stale(self.stale)
+
+    def stale_changes(self) -> Tuple[Dict[str, float], List[str]]:
+        """
+        Courses that went stale or recovered since the last `record_announced()`.
+
+        Returns:
+            tuple: (newly stale courses with the time of their first failed fetch,
+                    recovered courses)
+        """
+        stale = self.stale_courses()
+        went_stale = {course_code: since for course_code, since in stale.items()
+                      if course_code not in self.announced_stale}
+        return went_stale, [course_code for course_code in self.announced_stale if course_code not in stale]
+
+    def record_announced(self):
+        """Record that the chats were told about the current stale courses."""
+        self.announced_stale = sorted(self.stale_courses())
+
+    def forget_courses(self, course_codes: Iterable[str]):
+        """Drop everything recorded about courses that are no longer tracked (or changed their page)."""
+        course_codes = set(course_codes)
+        if not course_codes:
+            return
+        for records in (self.last_crawled, self.stale):
+            for kind in records:
+                for course_code in course_codes:
+                    records[kind].pop(course_code, None)
+        for records in (self.last_changed, self.last_checked, self.last_full_crawl):
+            for course_code in course_codes:
+                records.pop(course_code, None)
+        for kind in ('courses', 'indexes'):
+            self.carry_over[kind] = [key for key in self.carry_over[kind] if key not in course_codes]
+            if self.checkpoint:
+                for course_code in course_codes:
+                    self.checkpoint['done'][kind].pop(course_code, None)
+        self.announced_stale = [course_code for course_code in self.announced_stale if course_code not in course_codes]
+        self.save()
+
+    def record_checked(self, course_code: str, started: float, full: bool):
+        """Record a committed check of a course that started at `started` (a Unix timestamp)."""
+        self.last_checked[course_code] = started
+        if full:
+            self.last_full_crawl[course_code] = started
+
+    def incremental_since(self, course_code: str) -> Optional[float]:
+        """
+        Time to ask a course's recent activity report from.
+
+        Returns:
+            Optional[float]: Unix timestamp, or None if the course is due a full
+                             crawl (never crawled in full, crawled in full more
+                             than FULL_CRAWL_INTERVAL ago or failing)
+        """
+        full = self.last_full_crawl.get(course_code)
+        if (not INCREMENTAL_CHECKS or full is None or clock.time() - full >= FULL_CRAWL_INTERVAL
+                or any(course_code in failures for failures in self.stale.values())):
+            return None
+        return self.last_checked.get(course_code, full) - REPORT_OVERLAP
+
+    def record_changed(self, course_codes: Iterable[str]):
+        now = clock.time()
+        for course_code in course_codes:
+            self.last_changed[course_code] = now
+
+    def order_courses(self, kind: str, course_codes: Iterable[str],
+                      assignments: Dict[str, Assignment]) -> List[str]:
+        """
+        Order courses for one kind of work.
+
+        Args:
+            kind: "courses" (course pages) or "indexes" (assignment indexes)
+            course_codes: Courses to crawl
+            assignments: Tracked assignments, used to find courses with deadlines coming up
+        """
+        now = clock.time()
+        crawled = self.last_crawled[kind]
+        carried = set(self.carry_over.get(kind, []))
+        nearest_due: Dict[str, float] = {}
+        for assignment in assignments.values():
+            if assignment.due_date:
+                seconds = assignment.due_date.timestamp() - now
+                if seconds > 0:
+                    nearest_due[assignment.course_code] = min(nearest_due.get(assignment.course_code, seconds), seconds)
+
+        def priority(course_code: str) -> Tuple:
+            due_in = nearest_due.get(course_code, float('inf'))
+            changed_ago = now - self.last_changed.get(course_code, 0)
+            if course_code in carried or course_code not in crawled:
+                return (0, due_in, changed_ago)
+            if due_in <= DUE_SOON_WINDOW or changed_ago <= RECENT_CHANGE_WINDOW:
+                return (1, due_in, changed_ago)
+            return (2, crawled[course_code])
+
+        return sorted(course_codes, key=priority)
+
+    def order_assignments(self, items: List[Tuple[Assignment, Optional[Assignment]]]) -> List[Tuple[Assignment, Optional[Assignment]]]:
+        """Order (assignment, previous record) pairs whose pages need to be fetched."""
+        carried = set(self.carry_over.get('assignments', []))
+        far_future = datetime.max.replace(tzinfo=pytz.utc)
+
+        def priority(item):
+            assignment, previous = item
+            tier = 0 if assignment.id in carried or previous is None else 1
+            return (tier, assignment.due_date or far_future)
+
+        return sorted(items, key=priority)
+
+
+# Planner shared by the scrape and assignment phases of a cycle
+planner = CrawlPlanner()
@@ -0,0 +1,120 @@
+"""
+Pinned Dashboard for UniMAP Student Bot
+
+Keeps one pinned message per chat with the currently tracked assignments.
+The message is edited in place when the summary changes instead of sending
+a new one. Message IDs and the hash of the last rendered text are stored in
+dashboard.json, so an unchanged summary costs no Telegram calls at all. A
+dashboard that was deleted in the chat is sent and pinned again.
+"""
+
+import os
+import json
+import hashlib
+import logging
+from typing import Dict, Iterable
+from telegram import Bot
+from telegram.error import BadRequest
+
+DASHBOARD_FILE = "dashboard.json"
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit for message text
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class Dashboard:
+    """Pinned, edited-in-place summary message of every chat."""
+
+    def __init__(self, path: str = DASHBOARD_FILE):
+        self.path = path
+        self.messages: Dict[str, Dict] = {}  # chat ID -> {'message_id': ..., 'hash': ...}
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.messages = json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading dashboard messages: {str(e)}")
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.messages, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error saving dashboard messages: {str(e)}")
+
+    async def create(self, bot: Bot, chat_id: str, text: str):
+        """Send a new dashboard message and pin it."""
+        message = await bot.send_message(chat_id, text)
+        self.messages[chat_id] = {'message_id': message.message_id, 'hash': content_hash(text)}
+        try:
+            await bot.pin_chat_message(chat_id, message.message_id, disable_notification=True)
+        except Exception as e:
+            # Pinning needs admin rights; the dashboard is still edited in place
+            logging.warning(f"Could not pin dashboard in chat {chat_id}: {e}")
+
+    async def publish(self, bot: Bot, chat_id: str, text: str, force: bool = False) -> bool:
+        """
+        Show `text` on the dashboard of a chat.
+
+        Args:
+            bot: Telegram bot
+            chat_id: Chat to update
+            text: Rendered dashboard
+            force: Edit even if the text did not change, to find out whether
+                   the message still exists (used at startup)
+
+        Returns:
+            bool: True if Telegram was called
+        """
+        if len(text) > MAX_MESSAGE_LENGTH:
+            text = text[:MAX_MESSAGE_LENGTH - 20] + "\n… (truncated)"
+        stored = self.messages.get(chat_id)
+        if stored is None:
+            await self.create(bot, chat_id, text)
+            return True
+        if stored['hash'] == content_hash(text) and not force:
+            return False
+
+        try:
+            await bot.edit_message_text(text, chat_id=chat_id, message_id=stored['message_id'])
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                pass  # Same text as before, the message still exists
+            elif "not found" in str(e).lower():
+                logging.info(f"Dashboard in chat {chat_id} was deleted, sending a new one")
+                await self.create(bot, chat_id, text)
+                return True
+            else:
+                raise
+        stored['hash'] = content_hash(text)
+        return True
+
+    async def update_all(self, bot: Bot, chats: Iterable[str], text: str, force: bool = False) -> int:
+        """
+        Show `text` on the dashboard of every chat.
+
+        Returns:
+            int: Number of chats Telegram was called for
+        """
+        calls = 0
+        for chat_id in chats:
+            try:
+                if await self.publish(bot, str(chat_id), text, force):
+                    calls += 1
+            except Exception as e:
+                logging.error(f"Failed to update dashboard in chat {chat_id}: {e}")
+        if calls:
+            self.save()
+        return calls
+
+
+# Dashboards of the current process
+dashboard = Dashboard()
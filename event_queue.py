@@ -0,0 +1,150 @@
+"""
+Durable Event Queue for UniMAP Student Bot
+
+A small SQLite-backed queue connecting the crawler and notifier workers,
+also used by bot.py as its outbox (see outbox.py). Events survive restarts
+of either side. A consumer claims events with a lease; if it dies before
+acknowledging them, the lease expires and another consumer picks them up
+again. Each event records the chats it was delivered to, so a redelivered
+event only goes to the remaining chats.
+
+Events can be published together with the state they were derived from,
+in the same transaction. The state stays pending until it has been
+persisted, so a crash in between neither loses nor repeats notifications.
+"""
+
+import json
+import time
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+QUEUE_FILE = "events.db"
+LEASE_SECONDS = 300  # Claimed events are redelivered after this long without an ack
+
+
+class EventQueue:
+    """SQLite-backed FIFO queue of JSON events."""
+
+    def __init__(self, path: str = QUEUE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                claimed_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                delivered_to TEXT NOT NULL DEFAULT '[]'
+            )
+        """)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(events)")]
+        if 'delivered_to' not in columns:
+            self.conn.execute("ALTER TABLE events ADD COLUMN delivered_to TEXT NOT NULL DEFAULT '[]'")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_states (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+
+    def publish(self, events: List[Dict], state: Optional[Dict] = None) -> Optional[int]:
+        """
+        Append events to the queue in one transaction.
+
+        Args:
+            events: Events to append
+            state: State to store as pending in the same transaction
+
+        Returns:
+            Optional[int]: ID of the pending state, to pass to `state_applied()`
+        """
+        now = time.time()
+        state_id = None
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO events (payload, created_at) VALUES (?, ?)",
+                [(json.dumps(event), now) for event in events]
+            )
+            if state is not None:
+                state_id = self.conn.execute(
+                    "INSERT INTO pending_states (payload, created_at) VALUES (?, ?)",
+                    (json.dumps(state), now)
+                ).lastrowid
+        return state_id
+
+    def pending_states(self) -> List[Tuple[int, Dict]]:
+        """States published but not yet persisted, oldest first."""
+        rows = self.conn.execute("SELECT id, payload FROM pending_states ORDER BY id").fetchall()
+        return [(row[0], json.loads(row[1])) for row in rows]
+
+    def state_applied(self, state_id: int):
+        """Forget a pending state once it has been persisted."""
+        self.conn.execute("DELETE FROM pending_states WHERE id = ?", (state_id,))
+
+    def claim(self, limit: int = 10) -> List[Dict]:
+        """
+        Claim up to `limit` events for processing, oldest first.
+
+        Returns:
+            List[Dict]: Items with the keys id, event, created_at, attempts and
+                        delivered_to (chats the event was already sent to)
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute(
+                "SELECT id, payload, created_at, attempts, delivered_to FROM events "
+                "WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                (now - LEASE_SECONDS, limit)
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE events SET claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now, row[0]) for row in rows]
+            )
+        return [
+            {'id': row[0], 'event': json.loads(row[1]), 'created_at': row[2], 'attempts': row[3] + 1,
+             'delivered_to': json.loads(row[4])}
+            for row in rows
+        ]
+
+    def ack(self, event_id: int):
+        """Remove a processed event from the queue."""
+        self.conn.execute("DELETE FROM events WHERE id = ?", (event_id,))
+
+    def mark_delivered(self, event_id: int, chat_id: str):
+        """Record that an event was sent to a chat."""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute("SELECT delivered_to FROM events WHERE id = ?", (event_id,)).fetchone()
+            if row is None:
+                return
+            delivered_to = json.loads(row[0])
+            if chat_id not in delivered_to:
+                delivered_to.append(chat_id)
+                self.conn.execute("UPDATE events SET delivered_to = ? WHERE id = ?",
+                                  (json.dumps(delivered_to), event_id))
+
+    def release(self, event_id: int):
+        """Return a claimed event to the queue so it is retried."""
+        self.conn.execute("UPDATE events SET claimed_at = NULL WHERE id = ?", (event_id,))
+
+    def release_all(self):
+        """Return all claimed events to the queue (only safe for the sole consumer, at startup)."""
+        self.conn.execute("UPDATE events SET claimed_at = NULL")
+
+    def depth(self) -> int:
+        """Number of events waiting or being processed."""
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def lag_seconds(self) -> float:
+        """Age of the oldest unprocessed event in seconds (0 if the queue is empty)."""
+        oldest: Optional[float] = self.conn.execute("SELECT MIN(created_at) FROM events").fetchone()[0]
+        return time.time() - oldest if oldest is not None else 0.0
+
+    def close(self):
+        self.conn.close()
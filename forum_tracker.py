@@ -0,0 +1,251 @@
+"""
+Forum Tracker for UniMAP Student Bot
+
+Watches the announcement forums of the tracked courses for new posts.
+Lecturers post urgent news (class cancelled, deadline extended) there, so
+forums are polled every few minutes instead of only at the scheduled checks.
+
+Polling is incremental and cheap:
+- Forums are found once per course (one course page request) and again
+  after FORUM_DISCOVERY_INTERVAL.
+- A forum with an RSS feed is polled through the feed with a conditional
+  request, so an unchanged feed costs a 304 response. Only entries newer
+  than the last seen discussion are parsed.
+- Other forums are polled through their discussion list page.
+- Discussion IDs only grow in Moodle, so the highest ID seen per forum is
+  all that is stored (forum_state.json). The first poll of a forum only
+  records it, without notifying about existing posts.
+"""
+
+import io
+import os
+import re
+import json
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+import xml.etree.ElementTree as ET
+from bs4 import BeautifulSoup
+from config import COURSES
+from clock import clock
+from portal_client import fetch
+
+FORUM_STATE_FILE = "forum_state.json"
+FORUM_POLL_INTERVAL = 5 * 60  # seconds between forum polls
+FORUM_DISCOVERY_INTERVAL = 24 * 3600  # seconds between searches for new forums in a course
+ANNOUNCEMENT_FORUM_NAMES = ("announcement", "news")  # Forums whose name contains one of these are tracked
+TRACK_ALL_FORUMS = os.getenv("TRACK_ALL_FORUMS", "").lower() in ("1", "true", "yes")
+MAX_POST_LENGTH = 500  # characters of a post included in the notification
+
+DISCUSSION_ID_PATTERN = re.compile(r'discuss\.php\?d=(\d+)')
+
+
+def load_forum_state() -> Dict:
+    """Load the known forums and the last seen discussion of each"""
+    if not os.path.exists(FORUM_STATE_FILE):
+        return {}
+    try:
+        with open(FORUM_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Error loading forum state: {str(e)}")
+        return {}
+
+
+def save_forum_state(state: Dict):
+    try:
+        tmp_path = f"{FORUM_STATE_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, FORUM_STATE_FILE)
+    except Exception as e:
+        logging.error(f"Error saving forum state: {str(e)}")
+
+
+def is_tracked_forum(name: str) -> bool:
+    return TRACK_ALL_FORUMS or any(word in name.lower() for word in ANNOUNCEMENT_FORUM_NAMES)
+
+
+def find_forums(html: str, course_url: str) -> Dict[str, Dict]:
+    """Find the tracked forums on a course page, keyed by course module ID"""
+    soup = BeautifulSoup(html, 'html.parser')
+    forums = {}
+    for activity in soup.find_all('li', class_='modtype_forum'):
+        link = activity.find('a', href=True)
+        if not link or 'id=' not in link['href']:
+            continue
+        name_elem = activity.find('span', class_='instancename') or link
+        for label in name_elem.find_all(class_='accesshide'):
+            label.extract()  # Hidden "Forum" label for screen readers
+        name = name_elem.text.strip()
+        if is_tracked_forum(name):
+            forum_id = link['href'].split('id=')[1].split('&')[0]
+            forums[forum_id] = {'name': name, 'url': urljoin(course_url, link['href'])}
+    return forums
+
+
+def parse_discussion_list(html: str, page_url: str) -> List[Dict]:
+    """
+    Parse the discussions of a forum view page, newest first.
+
+    Returns:
+        List[Dict]: Discussions with id, title and url
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    discussions = {}
+    for link in soup.find_all('a', href=DISCUSSION_ID_PATTERN):
+        discussion_id = int(DISCUSSION_ID_PATTERN.search(link['href']).group(1))
+        title = link.text.strip()
+        if title and discussion_id not in discussions:
+            discussions[discussion_id] = {'id': discussion_id, 'title': title,
+                                          'url': urljoin(page_url, link['href'].split('#')[0])}
+    return sorted(discussions.values(), key=lambda d: d['id'], reverse=True)
+
+
+def find_rss_url(html: str) -> Optional[str]:
+    """Get the RSS feed advertised by a forum view page, if RSS is enabled"""
+    soup = BeautifulSoup(html, 'html.parser')
+    link = soup.find('link', attrs={'type': 'application/rss+xml'}, href=True)
+    return link['href'] if link else None
+
+
+def parse_rss_entries(xml: bytes, last_seen_id: int) -> List[Dict]:
+    """
+    Parse the entries of an RSS feed newer than `last_seen_id`.
+
+    A posts feed lists every reply, newest first, so a discussion can
+    appear several times and replies to old discussions can come before
+    new ones. Only the first (newest) entry of each discussion is kept.
+    """
+    entries = []
+    seen = set()
+    for _, item in ET.iterparse(io.BytesIO(xml)):
+        if item.tag != 'item':
+            continue
+        link = item.findtext('link') or item.findtext('guid') or ''
+        match = DISCUSSION_ID_PATTERN.search(link)
+        discussion_id = int(match.group(1)) if match else None
+        if discussion_id is None or discussion_id <= last_seen_id or discussion_id in seen:
+            item.clear()
+            continue
+        seen.add(discussion_id)
+        description = BeautifulSoup(item.findtext('description') or '', 'html.parser').get_text(' ', strip=True)
+        published = item.findtext('pubDate')
+        entries.append({
+            'id': discussion_id,
+            'title': (item.findtext('title') or '').strip(),
+            'url': link,
+            'message': description[:MAX_POST_LENGTH],
+            'published': parsedate_to_datetime(published).isoformat() if published else None,
+        })
+        item.clear()
+    return entries
+
+
+def discover_forums(session, course_code: str, course_state: Dict) -> None:
+    """Find the tracked forums of a course and record them (without posts)"""
+    course_url = COURSES[course_code]['url']
+    found = find_forums(fetch(session, course_url).text, course_url)
+    forums = course_state.setdefault('forums', {})
+    for forum_id, forum in found.items():
+        if forum_id not in forums:
+            logging.info(f"Tracking forum '{forum['name']}' of {course_code}")
+            forums[forum_id] = {**forum, 'rss_url': None, 'last_seen_id': None}
+    for forum_id in list(forums):
+        if forum_id not in found:
+            del forums[forum_id]
+    course_state['discovered_at'] = clock.time()
+
+
+def poll_forum(session, forum: Dict) -> List[Dict]:
+    """
+    Get the new discussions of a forum and update its last seen ID.
+
+    Returns:
+        List[Dict]: New discussions, oldest first (empty on the first poll)
+    """
+    last_seen_id = forum.get('last_seen_id')
+    if forum.get('rss_url') and last_seen_id is not None:
+        headers = {}
+        if forum.get('etag'):
+            headers['If-None-Match'] = forum['etag']
+        if forum.get('last_modified'):
+            headers['If-Modified-Since'] = forum['last_modified']
+        response = fetch(session, forum['rss_url'], headers=headers)
+        if response.status_code == 304:
+            return []
+        if response.status_code == 200:
+            forum['etag'] = response.headers.get('ETag')
+            forum['last_modified'] = response.headers.get('Last-Modified')
+            discussions = parse_rss_entries(response.content, last_seen_id)
+        else:
+            logging.warning(f"RSS feed of forum '{forum['name']}' returned {response.status_code}, "
+                            "using the discussion list")
+            forum['rss_url'] = None
+            return poll_forum(session, forum)
+    else:
+        response = fetch(session, forum['url'])
+        forum['rss_url'] = find_rss_url(response.text)
+        discussions = parse_discussion_list(response.text, forum['url'])
+        if last_seen_id is not None:
+            discussions = [d for d in discussions if d['id'] > last_seen_id]
+
+    if discussions:
+        forum['last_seen_id'] = max(last_seen_id or 0, max(d['id'] for d in discussions))
+    elif last_seen_id is None:
+        forum['last_seen_id'] = 0
+    if last_seen_id is None:
+        return []  # First poll: only remember where the forum stands
+    return sorted(discussions, key=lambda d: d['id'])
+
+
+def check_forum_updates(session, state: Dict) -> List[Dict]:
+    """
+    Poll the tracked forums of every course, updating `state` in place.
+
+    Courses and forums are processed in isolation; failures are logged and
+    retried at the next poll.
+
+    Returns:
+        List[Dict]: New posts with course_code, course_name and forum added
+    """
+    posts = []
+    for course_code in list(state):
+        if course_code not in COURSES:
+            del state[course_code]  # Course is no longer tracked
+    for course_code, course in COURSES.items():
+        course_state = state.setdefault(course_code, {})
+        try:
+            if clock.time() - course_state.get('discovered_at', 0) >= FORUM_DISCOVERY_INTERVAL:
+                discover_forums(session, course_code, course_state)
+        except Exception as e:
+            logging.error(f"Error finding forums of course {course_code}: {str(e)}")
+            continue
+        for forum in course_state.get('forums', {}).values():
+            try:
+                for post in poll_forum(session, forum):
+                    posts.append({**post, 'course_code': course_code,
+                                  'course_name': course['name'], 'forum': forum['name']})
+            except Exception as e:
+                logging.error(f"Error polling forum '{forum['name']}' of {course_code}: {str(e)}")
+    if posts:
+        logging.info(f"Found {len(posts)} new forum posts")
+    return posts
+
+
+def format_forum_post(post: Dict) -> str:
+    """Format a new forum post for Telegram notification"""
+    message = f"""📢 New Announcement!
+
+Course: {post['course_name']}
+Forum: {post['forum']}
+----------------------------------------
+{post['title']}
+"""
+    if post.get('message'):
+        message += f"\n{post['message']}\n"
+    message += f"""
+Link: {post['url']}
+----------------------------------------"""
+    return message
@@ -74,6 +74,7 @@ def get_chat_ids():
         if seen_chats:
             print("\n✅ Copy the chat IDs you need and add them to your .env file:")
             print("TELEGRAM_CHAT_IDS=chat_id_1,chat_id_2,chat_id_3")
+            print("💡 Once the bot runs, groups it is added to are registered automatically.")
         
     except requests.exceptions.RequestException as e:
         print(f"❌ Network Error: {e}")
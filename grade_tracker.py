@@ -0,0 +1,178 @@
+"""
+Grade Tracker for UniMAP Student Bot
+
+Notifies when marks are released. Assignment pages only show a grading
+status and are no longer fetched once an assignment is submitted, so grades
+are read from Moodle's grade reports instead:
+
+- The overview report (`grade/report/overview/index.php`) lists the course
+  total of every course in one page and is fetched after every check.
+- The user report of a course (`grade/report/user/index.php?id=<course>`)
+  lists its grade items and is only fetched when the course total changed.
+
+Only the course totals and the grade text of each graded item are stored
+(grade_state.json), which is all a diff needs. The first time a course is
+seen its grades are recorded without notifying.
+
+The bot reads the grades of the account it logs in with, so notifications
+say which item was graded but leave the mark out unless SHOW_GRADES is set.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, List
+from urllib.parse import urljoin, urlparse, parse_qs
+from bs4 import BeautifulSoup
+from config import COURSES
+from moodle_ajax import course_code_by_id
+from portal_client import fetch
+
+BASE_URL = "https://elearning.unimap.edu.my"
+OVERVIEW_URL = f"{BASE_URL}/grade/report/overview/index.php"
+GRADE_STATE_FILE = "grade_state.json"
+SHOW_GRADES = os.getenv("SHOW_GRADES", "").lower() in ("1", "true", "yes")  # Include marks in notifications
+UNGRADED = {"", "-", "–"}  # Grade texts of items without a grade
+
+
+def load_grade_state() -> Dict:
+    """Load the last seen course totals and item grades"""
+    if not os.path.exists(GRADE_STATE_FILE):
+        return {}
+    try:
+        with open(GRADE_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logging.error(f"Error loading grade state: {str(e)}")
+        return {}
+
+
+def save_grade_state(state: Dict):
+    try:
+        tmp_path = f"{GRADE_STATE_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, GRADE_STATE_FILE)
+    except Exception as e:
+        logging.error(f"Error saving grade state: {str(e)}")
+
+
+def user_report_url(course_id: str) -> str:
+    return f"{BASE_URL}/grade/report/user/index.php?id={course_id}"
+
+
+def parse_grade_overview(html: str) -> Dict[str, str]:
+    """
+    Parse the grade overview report.
+
+    Returns:
+        Dict[str, str]: Course total by Moodle course ID
+
+    Raises:
+        ValueError: If the page has no overview table (e.g. the login page)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    table = soup.find('table', id='overview-grade')
+    if table is None:
+        raise ValueError("No grade overview table found (session expired?)")
+    totals = {}
+    for row in table.find_all('tr'):
+        cells = row.find_all('td')
+        link = cells[0].find('a', href=True) if cells else None
+        if link is None or len(cells) < 2:
+            continue
+        course_id = parse_qs(urlparse(link['href']).query).get('id', [None])[0]
+        if course_id:
+            totals[course_id] = cells[1].get_text(" ", strip=True)
+    return totals
+
+
+def parse_user_report(html: str, page_url: str) -> Dict[str, Dict]:
+    """
+    Parse the grade items of a course's user report.
+
+    Returns:
+        Dict[str, Dict]: Items keyed by course module ID (or name if the item
+                         is not an activity), with name, grade, range and url
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    items = {}
+    for row in soup.select('table.user-grade tr'):
+        name_cell = row.find(class_='column-itemname')
+        grade_cell = row.find('td', class_='column-grade')
+        if name_cell is None or grade_cell is None:
+            continue
+        name = name_cell.get_text(" ", strip=True)
+        if name.lower().endswith("total"):
+            continue  # Course and category totals are covered by the overview
+        link = name_cell.find('a', href=True)
+        url = urljoin(page_url, link['href']) if link else page_url
+        module_id = parse_qs(urlparse(url).query).get('id', [None])[0] if link else None
+        range_cell = row.find('td', class_='column-range')
+        items[module_id or name] = {
+            'name': name,
+            'grade': grade_cell.get_text(" ", strip=True),
+            'range': range_cell.get_text(" ", strip=True) if range_cell else "",
+            'url': url,
+        }
+    return items
+
+
+def check_grade_updates(session, state: Dict) -> List[Dict]:
+    """
+    Find newly released and changed grades, updating `state` in place.
+
+    Costs one request for the overview plus one per course whose total
+    changed. Courses are processed in isolation; a failing course keeps its
+    stored grades and is retried after the next check.
+
+    Returns:
+        List[Dict]: Released grades with course_code, course_name, name, grade,
+                    previous grade (None if newly released), range and url
+    """
+    totals = parse_grade_overview(fetch(session, OVERVIEW_URL).text)
+    codes = course_code_by_id()
+    grades = []
+    for course_id, total in totals.items():
+        course_code = codes.get(course_id)
+        if course_code is None:
+            continue
+        course_state = state.get(course_code)
+        if course_state is not None and course_state['total'] == total:
+            continue
+        try:
+            url = user_report_url(course_id)
+            items = parse_user_report(fetch(session, url).text, url)
+        except Exception as e:
+            logging.error(f"Error getting grades of course {course_code}: {str(e)}")
+            continue
+        if course_state is not None:
+            for key, item in items.items():
+                previous = course_state['items'].get(key)
+                if item['grade'] not in UNGRADED and item['grade'] != previous:
+                    grades.append({**item, 'course_code': course_code, 'course_name': COURSES[course_code]['name'],
+                                   'previous': None if previous in UNGRADED else previous})
+        state[course_code] = {'total': total, 'items': {key: item['grade'] for key, item in items.items()
+                                                         if item['grade'] not in UNGRADED}}
+    for course_code in list(state):
+        if course_code not in COURSES:
+            del state[course_code]  # Course is no longer tracked
+    if grades:
+        logging.info(f"Found {len(grades)} released grades")
+    return grades
+
+
+def format_grade(grade: Dict) -> str:
+    """Format a released grade for Telegram notification"""
+    message = f"""🎓 {'Grade Updated' if grade.get('previous') else 'Marks Released'}!
+
+Course: {grade['course_name']}
+----------------------------------------
+{grade['name']}
+"""
+    if SHOW_GRADES:
+        message += f"Grade: {grade['grade']}" + (f" (range {grade['range']})" if grade.get('range') else "") + "\n"
+    message += f"""
+Link: {grade['url']}
+----------------------------------------"""
+    return message
@@ -0,0 +1,300 @@
+"""
+State Journal for UniMAP Student Bot
+
+Instead of rewriting the whole course tree after every check, the bot
+appends the differences (a section was added, an activity changed, an
+assignment's due date moved, ...) to an append-only journal. Every
+CHECKPOINT_EVERY events the full state is written to a checkpoint and the
+journal segment is archived, so loading the state means reading one
+checkpoint plus a short tail of events. Archived segments are kept as an
+audit trail and can be replayed with replay_journal.py.
+
+The journaled state has two parts:
+    courses: {course_code: {section_id: {"name": ..., "activities": [...]}}}
+    assignments: {assignment_id: Assignment.to_dict()}
+"""
+
+import os
+import json
+import copy
+import glob
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Set
+from log_config import cycle_id_var
+
+JOURNAL_DIR = "journal"
+JOURNAL_FILE = os.path.join(JOURNAL_DIR, "current.jsonl")
+CHECKPOINT_FILE = os.path.join(JOURNAL_DIR, "checkpoint.json")
+BASE_FILE = os.path.join(JOURNAL_DIR, "base.json")  # State the first archived segment starts from
+LEGACY_STATE_FILE = "previous_state.json"
+CHECKPOINT_EVERY = 500  # Events between checkpoints
+
+
+def empty_state() -> Dict:
+    return {'courses': {}, 'assignments': {}}
+
+
+def diff_courses(previous: Dict, current: Dict) -> List[Dict]:
+    """
+    Compute the events that turn one course tree into another.
+
+    Only courses present in `current` are compared; courses missing from it
+    are left untouched (they may have failed to scrape this cycle).
+    """
+    events = []
+    for course_code, sections in current.items():
+        if course_code not in previous:
+            events.append({'type': 'course_added', 'course': course_code, 'sections': sections})
+            continue
+        prev_sections = previous[course_code]
+
+        for section_id, section in sections.items():
+            if section_id not in prev_sections:
+                events.append({'type': 'section_added', 'course': course_code,
+                               'section_id': section_id, 'section': section})
+                continue
+            prev_section = prev_sections[section_id]
+            if section == prev_section:
+                continue
+            events.extend(diff_section(course_code, section_id, prev_section, section))
+
+        for section_id in prev_sections:
+            if section_id not in sections:
+                events.append({'type': 'section_removed', 'course': course_code, 'section_id': section_id})
+    return events
+
+
+def diff_section(course_code: str, section_id: str, previous: Dict, current: Dict) -> List[Dict]:
+    """Compute activity level events for a changed section."""
+    events = []
+    base = {'course': course_code, 'section_id': section_id}
+    if previous['name'] != current['name']:
+        events.append({**base, 'type': 'section_renamed', 'name': current['name']})
+
+    prev_activities = {act['name']: act for act in previous['activities']}
+    curr_activities = {act['name']: act for act in current['activities']}
+    for act_name in prev_activities:
+        if act_name not in curr_activities:
+            events.append({**base, 'type': 'activity_removed', 'name': act_name})
+    for index, activity in enumerate(current['activities']):
+        prev_activity = prev_activities.get(activity['name'])
+        if prev_activity is None:
+            events.append({**base, 'type': 'activity_added', 'index': index, 'activity': activity})
+        elif prev_activity != activity:
+            events.append({**base, 'type': 'activity_changed', 'old': prev_activity, 'new': activity})
+
+    # Fall back to replacing the section when the fine grained events would
+    # not reproduce it exactly (e.g. activities were reordered)
+    state = {'courses': {course_code: {section_id: copy.deepcopy(previous)}}}
+    for event in events:
+        apply_event(state, event)
+    if state['courses'][course_code][section_id] != current:
+        return [{**base, 'type': 'section_replaced', 'section': current}]
+    return events
+
+
+def diff_assignments(previous: Dict[str, Dict], current: Dict[str, Dict]) -> List[Dict]:
+    """Compute the events that turn one set of assignment records into another."""
+    events = []
+    for assignment_id, assignment in current.items():
+        prev_assignment = previous.get(assignment_id)
+        if prev_assignment is None:
+            events.append({'type': 'assignment_added', 'id': assignment_id, 'assignment': assignment})
+            continue
+        changes = {k: v for k, v in assignment.items() if prev_assignment.get(k) != v and k != 'time_remaining'}
+        if 'due_date' in changes:
+            events.append({'type': 'due_date_moved', 'id': assignment_id,
+                           'old': prev_assignment.get('due_date'), 'new': changes.pop('due_date')})
+        if changes:
+            events.append({'type': 'assignment_changed', 'id': assignment_id, 'fields': changes})
+    for assignment_id in previous:
+        if assignment_id not in current:
+            events.append({'type': 'assignment_removed', 'id': assignment_id})
+    return events
+
+
+def apply_event(state: Dict, event: Dict):
+    """Apply a single journal event to a state in place."""
+    kind = event['type']
+    courses = state.setdefault('courses', {})
+    assignments = state.setdefault('assignments', {})
+
+    if kind == 'course_added':
+        courses[event['course']] = copy.deepcopy(event['sections'])
+    elif kind == 'course_removed':
+        courses.pop(event['course'], None)
+    elif kind in ('section_added', 'section_replaced'):
+        courses[event['course']][event['section_id']] = copy.deepcopy(event['section'])
+    elif kind == 'section_removed':
+        courses[event['course']].pop(event['section_id'], None)
+    elif kind == 'section_renamed':
+        courses[event['course']][event['section_id']]['name'] = event['name']
+    elif kind == 'activity_added':
+        activities = courses[event['course']][event['section_id']]['activities']
+        activities.insert(event['index'], copy.deepcopy(event['activity']))
+    elif kind == 'activity_changed':
+        activities = courses[event['course']][event['section_id']]['activities']
+        for index, activity in enumerate(activities):
+            if activity['name'] == event['old']['name']:
+                activities[index] = copy.deepcopy(event['new'])
+                break
+    elif kind == 'activity_removed':
+        section = courses[event['course']][event['section_id']]
+        section['activities'] = [act for act in section['activities'] if act['name'] != event['name']]
+    elif kind == 'assignment_added':
+        assignments[event['id']] = copy.deepcopy(event['assignment'])
+    elif kind == 'assignment_changed':
+        assignments[event['id']].update(event['fields'])
+    elif kind == 'due_date_moved':
+        assignments[event['id']]['due_date'] = event['new']
+    elif kind == 'assignment_removed':
+        assignments.pop(event['id'], None)
+    else:
+        logging.warning(f"Unknown journal event type: {kind}")
+
+
+def read_events(path: str) -> Iterator[Dict]:
+    """Read events from a journal segment, skipping a torn final line."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Skipping unreadable journal line in {path}")
+
+
+def archived_segments() -> List[str]:
+    """Archived journal segments, oldest first."""
+    return sorted(glob.glob(os.path.join(JOURNAL_DIR, "segment-*.jsonl")))
+
+
+def write_json_atomic(path: str, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class Journal:
+    """Append-only journal of state changes with periodic checkpoints."""
+
+    def __init__(self):
+        self.state: Optional[Dict] = None
+        self.seq = 0
+        self.checkpoint_seq = 0
+        # Written from the event loop (outbox) and the portal worker thread
+        # (config baselines); reentrant since appends load and checkpoint
+        self.lock = threading.RLock()
+        self.changed_courses: Optional[Set[str]] = None  # Courses changed since the last snapshot, None if unknown
+
+    def load(self) -> Dict:
+        """Load the state as the last checkpoint plus the events after it."""
+        with self.lock:
+            return self._load()
+
+    def _load(self) -> Dict:
+        if self.state is not None:
+            return self.state
+
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        state = empty_state()
+        if os.path.exists(CHECKPOINT_FILE):
+            with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            state = checkpoint['state']
+            self.checkpoint_seq = self.seq = checkpoint['seq']
+        elif os.path.exists(LEGACY_STATE_FILE):
+            # Start the journal from the old full-snapshot state file
+            logging.info(f"Migrating {LEGACY_STATE_FILE} to the state journal")
+            with open(LEGACY_STATE_FILE, 'r') as f:
+                state['courses'] = json.load(f)
+            write_json_atomic(BASE_FILE, {'seq': 0, 'state': state})
+            write_json_atomic(CHECKPOINT_FILE, {'seq': 0, 'state': state})
+
+        for event in read_events(JOURNAL_FILE):
+            if event['seq'] > self.seq:
+                apply_event(state, event)
+                self.seq = event['seq']
+
+        self.state = state
+        return state
+
+    def append(self, events: List[Dict]):
+        """Apply events to the in-memory state and append them to the journal."""
+        if not events:
+            return
+        with self.lock:
+            self._append(events)
+
+    def _append(self, events: List[Dict]):
+        state = self.load()
+        timestamp = datetime.now(timezone.utc).isoformat()
+        lines = []
+        for event in events:
+            self.seq += 1
+            event = {'seq': self.seq, 'ts': timestamp, 'cycle': cycle_id_var.get(), **event}
+            apply_event(state, event)
+            lines.append(json.dumps(event))
+            if self.changed_courses is not None and 'course' in event:
+                self.changed_courses.add(event['course'])
+
+        with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        logging.info(f"Journaled {len(events)} state changes")
+
+        if self.seq - self.checkpoint_seq >= CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Write a compacted checkpoint and archive the current journal segment."""
+        with self.lock:
+            state = self.load()
+            write_json_atomic(CHECKPOINT_FILE, {'seq': self.seq, 'state': state})
+            if os.path.exists(JOURNAL_FILE):
+                os.replace(JOURNAL_FILE, os.path.join(JOURNAL_DIR, f"segment-{self.seq:012d}.jsonl"))
+            self.checkpoint_seq = self.seq
+            logging.info(f"Wrote state checkpoint at event {self.seq}")
+
+    def take_changed_courses(self) -> Optional[Set[str]]:
+        """Courses changed since the last call, or None if not known (every course may have changed)"""
+        with self.lock:
+            changed, self.changed_courses = self.changed_courses, set()
+            return changed
+
+    def record_courses(self, courses: Dict):
+        with self.lock:
+            self.append(diff_courses(self.load()['courses'], courses))
+
+    def record_assignments(self, assignments: Dict[str, Dict]):
+        with self.lock:
+            self.append(diff_assignments(self.load()['assignments'], assignments))
+
+
+def iter_history() -> Iterator[Dict]:
+    """Yield every journaled event from the start of the history, oldest first."""
+    for path in archived_segments():
+        yield from read_events(path)
+    yield from read_events(JOURNAL_FILE)
+
+
+def load_base_state() -> Dict:
+    """State the journal history starts from."""
+    if os.path.exists(BASE_FILE):
+        with open(BASE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)['state']
+    return empty_state()
+
+
+# Journal shared by the course and assignment trackers
+journal = Journal()
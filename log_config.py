@@ -0,0 +1,142 @@
+"""
+Logging Setup for UniMAP Student Bot
+
+Log records are put on an in-memory queue by the calling thread and written
+by a background listener thread, so logging never does file I/O on the
+event loop. The log file receives one JSON object per line, rotates by size
+and has credentials, cookies and tokens redacted before anything is written.
+Each check cycle gets a correlation ID that is attached to every record
+logged while that cycle runs.
+"""
+
+import os
+import re
+import json
+import uuid
+import queue
+import atexit
+import logging
+import logging.handlers
+import contextvars
+from datetime import datetime, timezone
+
+# Log file settings
+LOG_FILE = "bot.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024  # Rotate after 5 MB
+LOG_BACKUP_COUNT = 3  # Keep bot.log.1 ... bot.log.3
+
+# Environment variables whose values must never reach the log
+SECRET_ENV_VARS = ("PORTAL_PASSWORD", "TELEGRAM_BOT_TOKEN")
+
+# Patterns for secrets that show up in messages, replaced with group 1 + mask
+REDACT_PATTERNS = [
+    re.compile(r'((?:password|passwd|logintoken|sesskey|token)["\']?\s*[=:]\s*["\']?)[^\s&"\',;]+', re.IGNORECASE),
+    re.compile(r'((?:MoodleSession\w*|Cookie\s+\S+:)\s*[=:]?\s*)[^\s;,]+', re.IGNORECASE),
+    re.compile(r'(Set-Cookie:\s*)[^\n]+', re.IGNORECASE),
+    re.compile(r'(api\.telegram\.org/bot)[^/\s]+'),
+]
+MASK = "[REDACTED]"
+
+# Correlation ID of the check cycle currently running
+cycle_id_var = contextvars.ContextVar("cycle_id", default="-")
+
+_listener = None
+
+
+def new_cycle_id() -> str:
+    """Start a new correlation ID for the current check cycle and return it."""
+    cycle_id = uuid.uuid4().hex[:12]
+    cycle_id_var.set(cycle_id)
+    return cycle_id
+
+
+def redact(text: str) -> str:
+    """Mask credentials, cookies and tokens in a log message."""
+    for pattern in REDACT_PATTERNS:
+        text = pattern.sub(lambda m: m.group(1) + MASK, text)
+    for name in SECRET_ENV_VARS:
+        value = os.getenv(name)
+        if value and len(value) >= 4:
+            text = text.replace(value, MASK)
+    return text
+
+
+class CycleIdFilter(logging.Filter):
+    """Attach the current cycle's correlation ID to each record."""
+
+    def filter(self, record):
+        record.cycle_id = cycle_id_var.get()
+        return True
+
+
+class RedactingFilter(logging.Filter):
+    """Redact secrets from the fully formatted message of a record."""
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'cycle_id': getattr(record, 'cycle_id', '-'),
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def setup_logging(level: int = logging.INFO, log_file: str = LOG_FILE):
+    """
+    Configure the root logger with a queue handler and a background listener.
+
+    The listener writes JSON records to a size-rotated file and plain text
+    to the console. Calling this more than once has no effect.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - [%(cycle_id)s] %(message)s'))
+
+    for handler in (file_handler, console_handler):
+        handler.addFilter(RedactingFilter())
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(CycleIdFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,71 @@
+"""
+Metrics for UniMAP Student Bot
+
+A minimal in-process metrics registry. Counters and gauges are kept in
+memory and periodically written as JSON to a metrics file (one per
+process), which can be scraped or inspected by hand.
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Dict
+
+METRICS_FILE = "metrics.json"
+
+
+class Metrics:
+    """Counters and gauges for one process."""
+
+    def __init__(self, path: str = METRICS_FILE):
+        self.path = path
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+
+    def incr(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def snapshot(self) -> Dict:
+        return {'ts': time.time(), 'counters': dict(self.counters), 'gauges': dict(self.gauges)}
+
+    def flush(self):
+        """Write the current values to the metrics file."""
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error writing metrics to {self.path}: {str(e)}")
+
+
+# Metrics of the current process
+metrics = Metrics()
+
+
+class StartupTimer:
+    """
+    Record how long each startup phase took to reach, measured from process start.
+
+    Each phase is also stored as a gauge named `startup.<phase>_seconds`.
+    """
+
+    def __init__(self, started: float = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        seconds = round(time.perf_counter() - self.started, 3)
+        self.phases[phase] = seconds
+        metrics.gauge(f'startup.{phase}_seconds', seconds)
+        logging.info(f"Startup phase '{phase}' reached after {seconds:.3f}s")
+        return seconds
+
+    def report(self):
+        """Log the startup report and write it to the metrics file."""
+        logging.info(f"Startup report: {json.dumps(self.phases)}")
+        metrics.flush()
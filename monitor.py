@@ -0,0 +1,228 @@
+"""
+Portal Monitor for UniMAP Student Bot
+
+This module holds the check cycle itself: when to check, how to scrape the
+portal and how the differences are turned into change events and messages.
+It does not depend on Telegram, so it is shared by the single-process bot
+(bot.py) and the crawler and notifier workers (workers.py).
+"""
+
+import logging
+import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+import pytz
+import requests
+from config import COURSES
+from models import Assignment
+from course_tracker import load_previous_state, check_for_updates, format_notification, scrape_course
+from assignment_tracker import load_assignments, check_assignment_updates, format_assignment_notification
+from crawl_planner import planner, CARRY_OVER_DELAY
+from clock import clock
+from recent_activity import fetch_recent_activity
+from forum_tracker import format_forum_post
+from grade_tracker import format_grade
+
+CHECK_TIMES = [(7, 0), (19, 0)]  # Check times: 7:00 AM and 7:00 PM (GMT+8)
+TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8 timezone
+
+# Function to scrape the courses one at a time
+def iter_course_updates(client, previous_state: Dict, assignments: Dict[str, Assignment] = None) -> Iterator[Tuple[str, Dict, Dict]]:
+    """
+    Log in if needed, then scrape the courses one at a time and diff each
+    against `previous_state` as soon as it is fetched.
+
+    Courses are scraped in the order and within the budget of the crawl
+    planner; `assignments` (the tracked assignments) lets it put courses with
+    deadlines coming up first. Each course is scraped in isolation: a failing
+    or deferred course is logged and skipped (its stored state is kept)
+    instead of failing the whole cycle, and a failing course is marked stale.
+    Courses already done in a resumed cycle are skipped; a course counts as
+    done once the caller asks for the next one, i.e. after it was committed.
+    
+    Between full crawls a course is first checked through its recent
+    activity report (recent_activity.py) and only scraped if the report
+    lists changes. The report is kept as the course's checkpoint result, so
+    the assignment phase can fetch just the assignments it lists.
+
+    Yields:
+        tuple: (course code, course updates in the format of `check_for_updates()`
+                (empty if nothing changed), scraped course state)
+    """
+    try:
+        client.ensure_logged_in()
+    except requests.exceptions.ConnectionError as e:
+        logging.error(f"Connection error details: {str(e)}")
+        raise ValueError("Failed to connect to the portal. Please check your internet connection.")
+    except requests.exceptions.Timeout as e:
+        logging.error(f"Timeout error details: {str(e)}")
+        raise ValueError("Portal request timed out. Please try again later.")
+    
+    for course_code in planner.order_courses('courses', list(COURSES), assignments or {}):
+        if planner.is_done('courses', course_code):
+            logging.debug(f"Course {course_code} already checked in this cycle")
+            continue
+        if not planner.allow('courses', course_code):
+            logging.info(f"Crawl budget used up, deferring course {course_code} to the next cycle")
+            continue
+        started = clock.time()
+        
+        # Between full crawls, only fetch the course page if the recent activity report lists changes
+        activity = None
+        since = planner.incremental_since(course_code)
+        if since is not None:
+            try:
+                activity = fetch_recent_activity(client, course_code, since)
+            except Exception as e:
+                logging.warning(f"Recent activity of course {course_code} unavailable ({str(e)}), crawling it in full")
+            if activity is not None and activity.quiet():
+                logging.info(f"No recent activity in course {course_code}")
+                planner.record_checked(course_code, started, full=False)
+                planner.record_done('courses', course_code, activity.to_dict())
+                continue
+            planner.charge(1)
+        
+        try:
+            logging.info(f"Scraping course {course_code}...")
+            course_state = scrape_course(client, course_code)
+            planner.record_crawled('courses', course_code)
+            logging.info(f"Successfully scraped course {course_code}")
+        except Exception as e:
+            logging.error(f"Error scraping course {course_code}: {str(e)}")
+            planner.record_failed('courses', course_code)
+            continue
+        
+        previous = {course_code: previous_state[course_code]} if course_code in previous_state else {}
+        yield course_code, check_for_updates({course_code: course_state}, previous), course_state
+        planner.record_checked(course_code, started, full=activity is None)
+        planner.record_done('courses', course_code, activity.to_dict() if activity else None)
+
+def get_next_check_time():
+    """
+    Get the next check time from the defined schedule.
+
+    If the last cycle ran out of budget, the next one runs after
+    CARRY_OVER_DELAY instead so the carried-over work is not left for hours.
+    """
+    # Get current time in GMT+8
+    now = clock.now()
+    today = now.replace(second=0, microsecond=0)
+    
+    # Convert check times to full datetime objects for today
+    check_times = [today.replace(hour=h, minute=m, second=0, microsecond=0) for h, m in CHECK_TIMES]
+    
+    # Add tomorrow's times if needed
+    tomorrow = today + datetime.timedelta(days=1)
+    tomorrow_times = [tomorrow.replace(hour=h, minute=m, second=0, microsecond=0) for h, m in CHECK_TIMES]
+    all_times = check_times + tomorrow_times
+    
+    # Find the next check time
+    next_time = min((t for t in all_times if t > now), default=tomorrow_times[0])
+    if planner.has_pending():
+        next_time = min(next_time, now + datetime.timedelta(seconds=CARRY_OVER_DELAY))
+    return next_time
+
+# Function to run a single check cycle
+def stream_check_cycle(client) -> Iterator[Tuple[List[Dict], Optional[Dict], Optional[Dict[str, Assignment]]]]:
+    """
+    Check the portal course by course, yielding each piece of work as soon
+    as it is diffed so it can be notified and persisted right away.
+
+    Every course page is yielded on its own; the assignments of all courses
+    follow in one final step (the calendar sync and the assignment page
+    budget work across courses). Only the course being processed is held in
+    memory, besides the stored state. Nothing is persisted here; the caller
+    passes each step to `outbox.commit_changes()`.
+
+    If the cycle is interrupted, the next one resumes it: the courses,
+    indexes and assignment pages already done are not fetched again (see
+    crawl_planner.py).
+
+    The final step also announces courses that went stale (could not be
+    fetched) or recovered since the last completed cycle.
+
+    Yields:
+        tuple: (change events, course state of the step or None,
+                all current assignments or None)
+    """
+    # Load previous state
+    previous_state = load_previous_state()
+    
+    planner.forget_courses(set(planner.stale_courses()) - set(COURSES))  # No longer tracked
+    planner.start_cycle()
+    completed = False
+    try:
+        logging.info("Starting portal scrape...")
+        changed_courses = set()
+        for course_code, updates, course_state in iter_course_updates(client, previous_state, load_assignments()):
+            if updates:
+                changed_courses.add(course_code)
+            yield change_events(updates, [], []), {course_code: course_state}, None
+        logging.info("Portal scrape completed successfully")
+        
+        # Check for assignment updates
+        new_assignments, modified_assignments, current_assignments = check_assignment_updates(client, save=False)
+        planner.record_changed(changed_courses | {a.course_code for a in new_assignments + modified_assignments})
+        went_stale, recovered = planner.stale_changes()
+        events = change_events({}, new_assignments, modified_assignments)
+        events += [course_stale_event(course_code, since) for course_code, since in went_stale.items()]
+        events += [course_recovered_event(course_code) for course_code in recovered]
+        yield events, None, current_assignments
+        planner.record_announced()
+        completed = True
+    finally:
+        planner.finish_cycle(completed)
+
+# Function to turn the result of a check cycle into change events
+def change_events(updates, new_assignments: List[Assignment], modified_assignments: List[Assignment]) -> List[Dict]:
+    """
+    Build JSON serializable change events from the result of a check cycle.
+
+    Events are formatted into messages with `format_event()`, which can
+    happen in another process (see workers.py).
+    """
+    events = []
+    if updates:
+        events.append({'type': 'course_updates', 'updates': updates})
+    for assignment in new_assignments:
+        events.append({'type': 'new_assignment', 'assignment': assignment.to_dict()})
+    for assignment in modified_assignments:
+        events.append({'type': 'modified_assignment', 'assignment': assignment.to_dict()})
+    return events
+
+def due_date_event(assignment: Assignment) -> Dict:
+    return {'type': 'due_date_moved', 'assignment': assignment.to_dict()}
+
+def forum_post_event(post: Dict) -> Dict:
+    return {'type': 'forum_post', 'post': post}
+
+def grade_event(grade: Dict) -> Dict:
+    return {'type': 'grade_released', 'grade': grade}
+
+def course_stale_event(course_code: str, since: float) -> Dict:
+    return {'type': 'course_stale', 'course_code': course_code,
+            'course_name': COURSES[course_code]['name'], 'since': since}
+
+def course_recovered_event(course_code: str) -> Dict:
+    return {'type': 'course_recovered', 'course_code': course_code, 'course_name': COURSES[course_code]['name']}
+
+# Function to format a change event as a Telegram message
+def format_event(event: Dict) -> str:
+    if event['type'] == 'course_updates':
+        return format_notification(event['updates'])
+    if event['type'] == 'forum_post':
+        return format_forum_post(event['post'])
+    if event['type'] == 'grade_released':
+        return format_grade(event['grade'])
+    if event['type'] == 'course_stale':
+        since = datetime.datetime.fromtimestamp(event['since'], TIMEZONE).strftime('%d %b, %I:%M %p')
+        return (f"⚠️ Course Not Updating\n\n{event['course_name']} could not be checked since {since}. "
+                "Its pinned summary shows the last known data until it can be checked again.")
+    if event['type'] == 'course_recovered':
+        return f"✅ Course Updating Again\n\n{event['course_name']} can be checked again."
+    
+    assignment = Assignment.from_dict(event['assignment'])
+    if event['type'] == 'new_assignment':
+        return "🆕 New Assignment!\n" + format_assignment_notification(assignment)
+    if event['type'] == 'due_date_moved':
+        return "📅 Due Date Changed!\n" + format_assignment_notification(assignment)
+    return "📝 Assignment Updated!\n" + format_assignment_notification(assignment)
@@ -0,0 +1,235 @@
+"""
+Moodle AJAX Client for UniMAP Student Bot
+
+Moodle pages load their data through `lib/ajax/service.php`, which accepts
+several web service calls in one POST and authenticates them with the
+logged-in web session and its sesskey. No web service token is needed, so
+the bot can use it with the session it already has.
+
+One batched request returns the upcoming deadlines of every course
+(`core_calendar_get_action_events_by_timesort`) together with the enrolled
+courses (`core_course_get_enrolled_courses_by_timeline_classification`),
+instead of one HTML page load per course and assignment.
+"""
+
+import re
+import json
+import weakref
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+import pytz
+from models import Assignment
+from config import COURSES
+from portal_client import SESSKEY_PATTERN
+from clock import clock
+
+BASE_URL = "https://elearning.unimap.edu.my"
+SERVICE_URL = f"{BASE_URL}/lib/ajax/service.php"
+TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8
+
+EVENTS_PER_PAGE = 50  # Most action events Moodle returns per call
+MAX_EVENT_PAGES = 10  # Pages of action events fetched at most
+DEADLINE_LOOKBACK = 7 * 24 * 3600  # seconds; recently passed deadlines are included
+
+MODULE_ID_PATTERN = re.compile(r'mod/assign/view\.php\?id=(\d+)')
+SESSION_ERRORS = {"invalidsesskey", "servicerequireslogin", "requireloginerror"}  # Fixed by logging in again
+
+
+class AjaxClient:
+    """
+    Batched calls to Moodle's AJAX service over a logged-in session.
+
+    Args:
+        session: Logged-in `PortalClient` (or anything with `get()`, `post()`
+                 and `ensure_logged_in()`)
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.sesskey: Optional[str] = None
+
+    def get_sesskey(self) -> str:
+        """
+        Get the sesskey of the session, from the client or a dashboard page.
+
+        Raises:
+            ValueError: If no page carries a sesskey (not logged in)
+        """
+        if self.sesskey is None:
+            self.sesskey = getattr(self.session, 'sesskey', None)
+        if self.sesskey is None:
+            match = SESSKEY_PATTERN.search(self.session.get(f"{BASE_URL}/my/").text)
+            if not match:
+                raise ValueError("No sesskey found on the dashboard, is the session logged in?")
+            self.sesskey = match.group(1)
+        return self.sesskey
+
+    def post_calls(self, calls: List[Tuple[str, Dict]]) -> List[Dict]:
+        payload = [{"index": index, "methodname": method, "args": args}
+                   for index, (method, args) in enumerate(calls)]
+        response = self.session.post(
+            SERVICE_URL,
+            params={"sesskey": self.get_sesskey(), "info": ",".join(method for method, _ in calls)},
+            data=json.dumps(payload),
+            headers={"Content-Type": "application/json", "X-Requested-With": "XMLHttpRequest"},
+        )
+        if response.status_code != 200:
+            raise ValueError(f"AJAX service returned status code {response.status_code}")
+        try:
+            results = json.loads(response.text)
+        except json.JSONDecodeError:
+            raise ValueError("AJAX service did not return JSON (session expired?)")
+        if isinstance(results, dict):
+            results = [results]  # The whole request failed
+        return results
+
+    def call_many(self, calls: List[Tuple[str, Dict]]) -> List:
+        """
+        Run several web service functions in one request.
+
+        Args:
+            calls: (function name, arguments) pairs
+
+        Returns:
+            List: The data returned by each call, in order
+
+        Raises:
+            ValueError: If the request or one of the calls failed
+        """
+        results = self.post_calls(calls)
+        if any(result.get('error') and error_code(result) in SESSION_ERRORS for result in results):
+            logging.info("AJAX session expired, logging in again")
+            self.sesskey = None
+            self.session.ensure_logged_in()
+            results = self.post_calls(calls)
+
+        data = []
+        for (method, _), result in zip(calls, results):
+            if result.get('error'):
+                exception = result.get('exception') or {}
+                raise ValueError(f"{method} failed: {exception.get('message', error_code(result))}")
+            data.append(result.get('data'))
+        if len(data) != len(calls):
+            raise ValueError(f"AJAX service answered {len(data)} of {len(calls)} calls")
+        return data
+
+    def call(self, method: str, **args):
+        """Run a single web service function and return its data"""
+        return self.call_many([(method, args)])[0]
+
+
+def error_code(result: Dict) -> str:
+    return (result.get('exception') or {}).get('errorcode', 'unknown error')
+
+
+# One client per session, so the sesskey is looked up once per login
+_clients = weakref.WeakKeyDictionary()
+
+
+def ajax_client(session) -> AjaxClient:
+    """Get the AJAX client of a session"""
+    client = _clients.get(session)
+    if client is None:
+        client = _clients[session] = AjaxClient(session)
+    return client
+
+
+def action_events_call(after_event_id: Optional[int] = None) -> Tuple[str, Dict]:
+    args = {"limitnum": EVENTS_PER_PAGE, "timesortfrom": int(clock.time()) - DEADLINE_LOOKBACK}
+    if after_event_id:
+        args["aftereventid"] = after_event_id
+    return "core_calendar_get_action_events_by_timesort", args
+
+
+def enrolled_courses_call() -> Tuple[str, Dict]:
+    return ("core_course_get_enrolled_courses_by_timeline_classification",
+            {"classification": "inprogress", "limit": 0, "offset": 0, "sort": "fullname"})
+
+
+def course_code_by_id() -> Dict[str, str]:
+    """Configured course codes by Moodle course ID"""
+    codes = {}
+    for course_code, course in COURSES.items():
+        course_id = parse_qs(urlparse(course['url']).query).get('id', [None])[0]
+        if course_id:
+            codes[course_id] = course_code
+    return codes
+
+
+def event_to_assignment(event: Dict, codes: Dict[str, str]) -> Optional[Assignment]:
+    """Map an assignment action event of a tracked course to an `Assignment` (None otherwise)"""
+    if event.get('modulename') != 'assign':
+        return None
+    course_code = codes.get(str((event.get('course') or {}).get('id')))
+    match = MODULE_ID_PATTERN.search(event.get('url', ''))
+    if not course_code or not match:
+        return None
+    return Assignment(
+        course_code=course_code,
+        course_name=COURSES[course_code]['name'],
+        name=event.get('activityname') or event.get('name', ''),
+        due_date=datetime.fromtimestamp(event['timesort'], TIMEZONE) if event.get('timesort') else None,
+        url=event['url'],
+        id=match.group(1),
+    )
+
+
+def courses_to_config(courses: List[Dict]) -> Dict[str, Dict]:
+    """Map enrolled courses to the format of config.COURSES"""
+    return {
+        course['shortname']: {
+            'name': course['fullname'],
+            'url': course.get('viewurl') or f"{BASE_URL}/course/view.php?id={course['id']}"
+        }
+        for course in courses
+    }
+
+
+def fetch_overview(session) -> Tuple[Dict[str, Dict], Dict[str, Assignment]]:
+    """
+    Get the enrolled courses and the upcoming assignment deadlines in one request.
+
+    More requests are only made if there are more than EVENTS_PER_PAGE deadlines.
+
+    Returns:
+        tuple: (enrolled courses in config.COURSES format,
+                assignments of tracked courses by ID, with name, URL and due date)
+
+    Raises:
+        ValueError: If the AJAX service failed
+    """
+    client = ajax_client(session)
+    result, courses = client.call_many([action_events_call(), enrolled_courses_call()])
+    events = list(result.get('events', []))
+    for _ in range(MAX_EVENT_PAGES - 1):
+        if len(result.get('events', [])) < EVENTS_PER_PAGE:
+            break
+        result = client.call_many([action_events_call(result.get('lastid'))])[0]
+        events.extend(result.get('events', []))
+
+    codes = course_code_by_id()
+    assignments = {}
+    for event in events:
+        assignment = event_to_assignment(event, codes)
+        if assignment:
+            assignments[assignment.id] = assignment
+    return courses_to_config(courses.get('courses', [])), assignments
+
+
+def apply_deadlines(assignments: Dict[str, Assignment], upcoming: Dict[str, Assignment]) -> List[Assignment]:
+    """
+    Update the due dates of tracked assignments from `fetch_overview()`.
+
+    Returns:
+        List[Assignment]: Assignments whose due date changed
+    """
+    moved = []
+    for assignment_id, event in upcoming.items():
+        assignment = assignments.get(assignment_id)
+        if assignment and event.due_date and assignment.due_date != event.due_date:
+            logging.info(f"Due date of {assignment.name} moved from {assignment.due_date} to {event.due_date}")
+            assignment.due_date = event.due_date
+            moved.append(assignment)
+    return moved
@@ -0,0 +1,169 @@
+"""
+Notification Outbox for UniMAP Student Bot
+
+Makes notifications survive crashes without being sent twice:
+
+1. `commit_changes()` publishes the change events of a cycle together with
+   the new state to the durable queue (event_queue.py) in one transaction,
+   then persists the state and marks it applied.
+2. `apply_pending_states()` persists states whose commit was interrupted by
+   a crash, at the next start.
+3. `deliver_event()` sends an event to every chat that has not received it
+   yet and marks each chat as soon as its send succeeded. `deliver_batch()`
+   does this for the oldest queued events, in order.
+
+A crash before step 1 finishes leaves neither new state nor notifications,
+so the next cycle finds the same changes again. A crash after it resumes
+delivery where it stopped. Only a crash between a successful send and its
+delivery mark can repeat that single message in that single chat.
+
+Texts longer than Telegram allows are sent in several messages, split at
+line breaks.
+"""
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+from telegram import Bot
+from telegram.error import BadRequest, Forbidden
+from models import Assignment
+from journal import journal
+from event_queue import EventQueue
+from course_tracker import save_current_state
+from assignment_tracker import save_assignments
+from forum_tracker import save_forum_state
+from grade_tracker import save_grade_state
+from portal_client import backoff_delay
+from subscriptions import subscriptions
+from chat_registry import chat_registry
+from monitor import format_event
+
+MAX_MESSAGE_LENGTH = 4096  # Telegram's limit for message text
+PERMANENT_ERRORS = ("chat not found",)  # BadRequest messages that mean the chat is gone
+RETRY_BACKOFF_BASE = 60  # First retry of a failed check or delivery after up to 1 minute
+RETRY_BACKOFF_MAX = 3600  # Never wait more than 1 hour between retries
+OUTBOX_BATCH_SIZE = 10  # Notifications claimed from the outbox at once
+
+
+def apply_state(state: Dict):
+    """Persist a committed state (courses, assignments, forums and/or grades); safe to repeat"""
+    if 'courses' in state:
+        save_current_state(state['courses'])
+    if 'assignments' in state:
+        save_assignments({k: Assignment.from_dict(v) for k, v in state['assignments'].items()})
+        journal.record_assignments(state['assignments'])
+    if 'forums' in state:
+        save_forum_state(state['forums'])
+    if 'grades' in state:
+        save_grade_state(state['grades'])
+
+
+def commit_changes(queue: EventQueue, events: List[Dict], courses: Optional[Dict] = None,
+                   assignments: Optional[Dict[str, Assignment]] = None, forums: Optional[Dict] = None,
+                   grades: Optional[Dict] = None):
+    """
+    Queue the events of a cycle and persist the state they were derived from.
+
+    Args:
+        queue: Outbox queue
+        events: Change events to deliver
+        courses: New course state, if it was scraped
+        assignments: New assignment state, if it was scraped
+        forums: New forum state (see forum_tracker.py), if forums were polled
+        grades: New grade state (see grade_tracker.py), if grades were checked
+    """
+    state = {}
+    if courses is not None:
+        state['courses'] = courses
+    if assignments is not None:
+        state['assignments'] = {k: v.to_dict() for k, v in assignments.items()}
+    if forums is not None:
+        state['forums'] = forums
+    if grades is not None:
+        state['grades'] = grades
+    if not events:
+        apply_state(state)  # Nothing to notify, so nothing to keep in step with
+        return
+    state_id = queue.publish(events, state)
+    apply_state(state)
+    queue.state_applied(state_id)
+
+
+def apply_pending_states(queue: EventQueue) -> int:
+    """Persist states left pending by a crash, returning how many there were"""
+    pending = queue.pending_states()
+    for state_id, state in pending:
+        logging.info(f"Applying state {state_id} left pending by an interrupted cycle")
+        apply_state(state)
+        queue.state_applied(state_id)
+    return len(pending)
+
+
+def split_message(text: str) -> List[str]:
+    """Split a text into parts Telegram accepts, at line breaks where possible"""
+    parts = []
+    while len(text) > MAX_MESSAGE_LENGTH:
+        cut = text.rfind("\n", 0, MAX_MESSAGE_LENGTH)
+        if cut <= 0:
+            cut = MAX_MESSAGE_LENGTH
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    return parts + [text] if text or not parts else parts
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """Whether a send failed because the chat is gone (removed, blocked or deleted)"""
+    if isinstance(error, Forbidden):
+        return True
+    return isinstance(error, BadRequest) and any(message in str(error).lower() for message in PERMANENT_ERRORS)
+
+
+async def deliver_event(bot: Bot, queue: EventQueue, item: Dict, chats: Iterable[str], text: str) -> bool:
+    """
+    Send a claimed event to every chat that did not get it yet.
+
+    Chats the bot can no longer write to (removed, blocked or deleted) are
+    skipped for good. Other failures leave the chat pending. A chat that
+    failed in the middle of a split text gets the whole text again.
+
+    Returns:
+        bool: True if every chat got the event (it can be acknowledged)
+    """
+    complete = True
+    for chat_id in chats:
+        chat_id = str(chat_id)
+        if chat_id in item['delivered_to']:
+            continue
+        try:
+            for part in split_message(text):
+                await bot.send_message(chat_id, part)
+        except Exception as e:
+            if not is_permanent_failure(e):
+                logging.error(f"Failed to send event {item['id']} to chat {chat_id}: {e}")
+                complete = False
+                continue
+            logging.error(f"Skipping event {item['id']} for chat {chat_id} permanently: {e}")
+        queue.mark_delivered(item['id'], chat_id)
+    return complete
+
+
+async def deliver_batch(bot: Bot, queue: EventQueue, limit: int = OUTBOX_BATCH_SIZE) -> Tuple[List[Dict], Optional[float]]:
+    """
+    Deliver the oldest queued events to the notification chats and their subscribers.
+
+    Delivered events are acknowledged. The first event that could not reach
+    every chat is released together with the rest of the batch, so it is
+    retried first and the order is kept.
+
+    Returns:
+        tuple: (delivered events, seconds to wait before retrying or None
+               if nothing failed); both empty when the queue was empty
+    """
+    items = queue.claim(limit)
+    for position, item in enumerate(items):
+        chats = chat_registry.notification_chats() + subscriptions.recipients(item['event'])
+        if not await deliver_event(bot, queue, item, chats, format_event(item['event'])):
+            for pending in items[position:]:
+                queue.release(pending['id'])
+            return items[:position], backoff_delay(item['attempts'], RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX)
+        queue.ack(item['id'])
+    return items, None
@@ -0,0 +1,108 @@
+"""
+Page Fingerprints for UniMAP Student Bot
+
+Moodle pages embed values that change on every request (the sesskey,
+timestamps, generated element IDs, inline scripts), so the raw HTML of a
+course differs between fetches even when nothing changed. `fingerprint()`
+strips those regions from the raw bytes with a few regular expressions and
+hashes the rest, without parsing the page.
+
+`PageCache` remembers the fingerprint of each course page together with
+the parsed result (stored in the blob store). When a page comes back with
+the same fingerprint, the parsed result is reused and BeautifulSoup is not
+run at all. The cache is kept in fingerprints.json.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+from typing import Dict, List, Optional
+from blob_store import blobs, encode_json
+
+FINGERPRINT_FILE = "fingerprints.json"
+
+# Regions of a Moodle page that change between requests without the content changing.
+# Every pattern starts with a literal, which keeps the regex engine fast on large pages.
+VOLATILE_PATTERNS = [
+    (re.compile(rb'<script\b[^>]*>.*?</script>', re.DOTALL | re.IGNORECASE), b''),  # M.cfg, sesskey, YUI setup
+    (re.compile(rb'sesskey=[A-Za-z0-9]+'), b'sesskey='),  # Links carrying the session key
+    (re.compile(rb'(name="sesskey"\s+value=")[A-Za-z0-9]*'), rb'\1'),  # Hidden form fields
+    (re.compile(rb'yui_[0-9_]+'), b'yui'),  # Generated YUI element IDs
+    (re.compile(rb'1[0-9]{9,12}'), b'0'),  # Unix timestamps in seconds or milliseconds (until 2033)
+] + [
+    (re.compile(base + rb'[0-9a-f]{13}'), base)  # IDs from html_writer::random_id() (base + uniqid())
+    for base in (b'random', b'single_button', b'action_link', b'url_select')
+]
+
+
+def normalize(html: bytes) -> bytes:
+    """Remove the volatile regions from raw page HTML"""
+    for pattern, replacement in VOLATILE_PATTERNS:
+        html = pattern.sub(replacement, html)
+    return html
+
+
+def fingerprint(html: bytes) -> str:
+    """Hash of a page that only changes when its content does"""
+    return hashlib.blake2b(normalize(html), digest_size=16).hexdigest()
+
+
+class PageCache:
+    """Parsed course pages by page fingerprint."""
+
+    def __init__(self, path: str = FINGERPRINT_FILE):
+        self.path = path
+        self.entries: Optional[Dict[str, Dict]] = None  # course code -> {'fingerprint': ..., 'parsed': blob hash}
+        self.hits = 0
+        self.misses = 0
+
+    def load(self) -> Dict[str, Dict]:
+        if self.entries is None:
+            self.entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        self.entries = json.load(f)
+                except Exception as e:
+                    logging.error(f"Error loading page fingerprints: {str(e)}")
+        return self.entries
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error saving page fingerprints: {str(e)}")
+
+    def get(self, key: str, page_fingerprint: str):
+        """Get the parsed result of a page if its fingerprint did not change, else None"""
+        entry = self.load().get(key)
+        if entry and entry['fingerprint'] == page_fingerprint:
+            try:
+                parsed = blobs.get_json(entry['parsed'])
+                self.hits += 1
+                return parsed
+            except ValueError:
+                pass  # Blob was pruned; parse the page again
+        self.misses += 1
+        return None
+
+    def put(self, key: str, page_fingerprint: str, parsed):
+        """Remember the parsed result of a page"""
+        entries = self.load()
+        parsed_ref = blobs.put(encode_json(parsed))
+        if entries.get(key) != {'fingerprint': page_fingerprint, 'parsed': parsed_ref}:
+            entries[key] = {'fingerprint': page_fingerprint, 'parsed': parsed_ref}
+            self.save()
+
+    def refs(self) -> List[str]:
+        """Blob hashes the cache refers to (kept when snapshots are pruned)"""
+        return [entry['parsed'] for entry in self.load().values()]
+
+
+# Course page cache of the current process
+page_cache = PageCache()
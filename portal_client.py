@@ -0,0 +1,346 @@
+"""
+Portal Client for UniMAP Student Bot
+
+This module wraps the HTTP session used to talk to the UniMAP e-learning
+portal. Every request goes through a global token bucket, a circuit breaker
+for its endpoint and a retry loop with exponential backoff and jitter, so a
+portal outage slows the bot down instead of crashing it.
+"""
+
+import os
+import re
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlparse
+from typing import Dict, Optional
+import requests
+from bs4 import BeautifulSoup
+from artifact_store import save_artifact
+
+# Portal URLs
+BASE_URL = "https://elearning.unimap.edu.my"
+LOGIN_URL = f"{BASE_URL}/login/index.php"
+
+# Request settings
+REQUEST_TIMEOUT = 30  # seconds
+MAX_RETRIES = 3  # Retries per request after the first attempt
+BACKOFF_BASE = 2  # seconds
+BACKOFF_MAX = 60  # seconds
+
+# Global rate limit shared by all requests
+REQUEST_RATE = 2.0  # tokens added per second
+REQUEST_BURST = 5  # maximum tokens in the bucket
+
+# Circuit breaker settings
+BREAKER_FAILURE_THRESHOLD = 5  # Consecutive failures before opening
+BREAKER_RESET_TIMEOUT = 300  # seconds before a trial request is allowed
+
+# Status codes worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Session key Moodle embeds in every page (M.cfg), needed for AJAX calls
+SESSKEY_PATTERN = re.compile(r'"sesskey":"([A-Za-z0-9]+)"')
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Connection': 'keep-alive',
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is refused because its endpoint's circuit is open."""
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """
+    Exponential backoff with full jitter.
+
+    Args:
+        attempt: 1-based retry attempt number
+        base: Delay for the first attempt in seconds
+        cap: Upper bound for the delay in seconds
+
+    Returns:
+        float: Seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class TokenBucket:
+    """Token bucket limiting the request rate across the whole client."""
+
+    def __init__(self, rate: float = REQUEST_RATE, capacity: int = REQUEST_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()  # Callers may run in several threads
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)  # Without the lock, so other threads can refill too
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for a single portal endpoint.
+
+    The breaker opens after `failure_threshold` consecutive failures and
+    refuses requests until `reset_timeout` seconds have passed. It then lets
+    one trial request through (half-open) and closes again if it succeeds.
+    Other requests are refused while the trial is pending; a trial that
+    never reports back is replaced after another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started: Optional[float] = None  # When the pending trial request was let through
+        self.lock = threading.Lock()  # Callers may run in several threads
+
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent to this endpoint."""
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+            elif self.trial_started is not None and now - self.trial_started < self.reset_timeout:
+                return False  # Half-open and the trial request is still pending
+            self.trial_started = now
+            logging.info(f"Circuit for {self.name} is half-open, sending trial request")
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trial_started = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self.trial_started = None
+
+
+class PortalClient:
+    """
+    Rate limited, retrying HTTP client for the e-learning portal.
+
+    The client exposes `get()` and `post()` with the same signatures as
+    `requests.Session`, so it can be passed anywhere a session was used.
+    It keeps its session between cycles and only logs in again when the
+    portal has actually expired it.
+    """
+
+    def __init__(self, username: Optional[str] = None, password: Optional[str] = None,
+                 session: Optional[requests.Session] = None):
+        self.username = username or os.getenv("PORTAL_USERNAME")
+        self.password = password or os.getenv("PORTAL_PASSWORD")
+        self.session = session or requests.Session()
+        self.session.headers.update(HEADERS)
+        self.bucket = TokenBucket()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.breakers_lock = threading.Lock()
+        self.logged_in = False
+        self.sesskey: Optional[str] = None
+
+    @property
+    def cookies(self):
+        return self.session.cookies
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        """Get the circuit breaker for the endpoint (URL path) of a request."""
+        endpoint = urlparse(url).path or "/"
+        with self.breakers_lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint)
+            return self.breakers[endpoint]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Send a request through the rate limiter, circuit breaker and retry loop.
+
+        Raises:
+            CircuitOpenError: If the endpoint's circuit is open
+            requests.exceptions.RequestException: If every attempt failed
+        """
+        breaker = self.breaker_for(url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open, skipping request")
+
+        kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+        for attempt in range(MAX_RETRIES + 1):
+            self.bucket.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                if response.status_code in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                breaker.record_success()
+                return response
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                    requests.exceptions.HTTPError) as e:
+                if attempt == MAX_RETRIES:
+                    breaker.record_failure()
+                    raise
+                delay = backoff_delay(attempt + 1)
+                logging.warning(f"Request to {breaker.name} failed ({e}), retrying in {delay:.1f}s "
+                                f"(attempt {attempt + 1}/{MAX_RETRIES})")
+                time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, data=None, **kwargs) -> requests.Response:
+        return self.request("POST", url, data=data, **kwargs)
+
+    def is_logged_in(self) -> bool:
+        """Check whether the current session is still authenticated."""
+        dashboard_check = self.get(f"{BASE_URL}/my/")
+        self.remember_sesskey(dashboard_check.text)
+        return "login/index.php" not in dashboard_check.url
+
+    def remember_sesskey(self, html: str):
+        match = SESSKEY_PATTERN.search(html)
+        self.sesskey = match.group(1) if match else None
+
+    def ensure_logged_in(self):
+        """Reuse the existing session if it is still valid, otherwise log in."""
+        if self.logged_in and self.is_logged_in():
+            logging.info("Existing portal session is still valid")
+            return
+        self.login()
+
+    def login(self):
+        """Log in to the portal with the configured credentials."""
+        self.logged_in = False
+        if not self.username or not self.password:
+            raise ValueError("Portal credentials not found in .env file")
+
+        logging.info("Attempting to log in to portal...")
+
+        # Get the login page
+        initial_response = self.get(LOGIN_URL)
+        if initial_response.status_code != 200:
+            raise ValueError(f"Failed to access login page. Status code: {initial_response.status_code}")
+
+        # Parse the login form
+        soup = BeautifulSoup(initial_response.text, 'html.parser')
+        login_form = soup.find('form', id='login')
+
+        if not login_form:
+            artifact = save_artifact("login_form_missing", initial_response.text)
+            raise ValueError(f"Login form not found on page - page saved to {artifact}")
+
+        # Get login form action URL
+        form_action = login_form.get('action', LOGIN_URL)
+        if not form_action.startswith('http'):
+            form_action = BASE_URL + form_action
+        logging.debug(f"Login form action URL: {form_action}")
+
+        # Get all form inputs including hidden fields
+        form_inputs = login_form.find_all('input')
+
+        # Build the login payload with all form fields
+        payload = {}
+
+        # Add any hidden fields to payload first
+        for input_field in form_inputs:
+            input_name = input_field.get('name')
+            input_value = input_field.get('value', '')
+            input_type = input_field.get('type')
+
+            if input_name:
+                if input_type != 'submit':
+                    payload[input_name] = input_value
+
+        # Now add our login credentials
+        payload.update({
+            "username": self.username,
+            "password": self.password,
+            "anchor": ""  # Required by Moodle
+        })
+
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Origin': BASE_URL,
+            'Referer': LOGIN_URL,
+            'Upgrade-Insecure-Requests': '1',
+            'Cache-Control': 'max-age=0'
+        }
+
+        # Try to login
+        logging.info("Sending login request...")
+        response = self.post(form_action, data=payload, headers=headers, allow_redirects=True)
+        logging.info(f"Login response status code: {response.status_code}")
+
+        # Verify login success by checking if redirected to dashboard
+        dashboard_check = self.get(f"{BASE_URL}/my/")
+
+        if "login/index.php" in dashboard_check.url:
+            # Get any error messages
+            error_soup = BeautifulSoup(dashboard_check.text, 'html.parser')
+
+            # Check for different types of error messages
+            error_msg = error_soup.find('div', {'class': 'loginerrors'})
+            if not error_msg:
+                error_msg = error_soup.find('div', {'class': 'alert-danger'})
+            if not error_msg:
+                error_msg = error_soup.find('div', {'class': 'alert'})
+            if not error_msg:
+                error_msg = error_soup.find('div', {'id': 'notice'})
+
+            error_text = error_msg.text.strip() if error_msg else "No specific error message found"
+
+            # Keep the page for debugging without writing it to the log
+            artifact = save_artifact("login_failed", dashboard_check.text)
+            raise ValueError(f"Login failed: {error_text} (page saved to {artifact})")
+
+        self.remember_sesskey(dashboard_check.text)
+        self.logged_in = True
+        logging.info("Login successful!")
+
+
+def fetch(session, url: str, **kwargs):
+    """GET a page, logging in again if the session expired"""
+    response = session.get(url, **kwargs)
+    if "login/index.php" in getattr(response, 'url', ''):
+        session.ensure_logged_in()
+        response = session.get(url, **kwargs)
+    return response
@@ -0,0 +1,105 @@
+"""
+Recent Activity Feed for UniMAP Student Bot
+
+Moodle's recent activity report (`course/recent.php?id=<course>&date=<timestamp>`)
+lists the activities of a course that were added, updated or deleted since
+a given time. In incremental mode (see `CrawlPlanner.incremental_since()`)
+a check cycle first asks each course's report what changed since the course
+was last checked, and then only fetches:
+
+- the course page, if the report lists any activity,
+- the pages of the assignments the report lists, or the course's whole
+  assignment index if something was deleted.
+
+A quiet course then costs one small request per cycle. Every course is
+still crawled in full every FULL_CRAWL_INTERVAL as a safety net for
+changes the report does not show.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List
+from urllib.parse import urlparse, parse_qs
+from bs4 import BeautifulSoup
+from config import COURSES
+
+BASE_URL = "https://elearning.unimap.edu.my"
+REPORT_PAGE_ID = "page-course-recent"  # Body ID of the report, missing on the login page
+
+MODULE_LINK_PATTERN = re.compile(r'/mod/(\w+)/view\.php\?id=(\d+)')
+DELETED_PATTERN = re.compile(r'\bDeleted\b')
+
+
+@dataclass
+class RecentActivity:
+    """
+    What the recent activity report of a course lists.
+
+    Attributes:
+        modules: Module ID -> module type (e.g. "assign") of the listed activities
+        deleted: Whether an activity was deleted (deleted activities have no link)
+    """
+    modules: Dict[str, str] = field(default_factory=dict)
+    deleted: bool = False
+
+    def quiet(self) -> bool:
+        return not self.modules and not self.deleted
+
+    def assignment_ids(self) -> List[str]:
+        return sorted(module_id for module_id, module_type in self.modules.items() if module_type == 'assign')
+
+    def to_dict(self) -> dict:
+        return {'modules': self.modules, 'deleted': self.deleted}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RecentActivity':
+        return cls(modules=dict(data.get('modules', {})), deleted=data.get('deleted', False))
+
+
+def recent_activity_url(course_code: str, since: float) -> str:
+    course_id = parse_qs(urlparse(COURSES[course_code]['url']).query)['id'][0]
+    return f"{BASE_URL}/course/recent.php?id={course_id}&date={int(since)}"
+
+
+def module_url(module_type: str, module_id: str) -> str:
+    return f"{BASE_URL}/mod/{module_type}/view.php?id={module_id}"
+
+
+def parse_recent_activity(html: str) -> RecentActivity:
+    """
+    Parse a recent activity report.
+
+    Raises:
+        ValueError: If the page is not a recent activity report (e.g. the login page)
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    body = soup.find('body')
+    if body is None or body.get('id') != REPORT_PAGE_ID:
+        raise ValueError("Not a recent activity report (session expired?)")
+    report = soup.find(id='region-main') or body
+
+    activity = RecentActivity()
+    for link in report.find_all('a', href=True):
+        match = MODULE_LINK_PATTERN.search(link['href'])
+        if match:
+            activity.modules[match.group(2)] = match.group(1)
+    activity.deleted = bool(DELETED_PATTERN.search(report.get_text(" ")))
+    return activity
+
+
+def fetch_recent_activity(session, course_code: str, since: float) -> RecentActivity:
+    """
+    Ask a course's recent activity report what changed since `since`.
+
+    Args:
+        session: Logged-in portal session
+        course_code: Course to ask about
+        since: Unix timestamp the report starts at
+
+    Raises:
+        ValueError: If the report could not be fetched
+    """
+    response = session.get(recent_activity_url(course_code, since))
+    if response.status_code != 200:
+        raise ValueError(f"Recent activity report returned status code {response.status_code}")
+    return parse_recent_activity(response.text)
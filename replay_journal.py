@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Journal Replay Tool
+
+Replays the state journal from the start of its history. Each batch of
+events (one check cycle) is applied to the state and the bot's diffing and
+formatting code is run on it again, exactly as it ran live. This is useful
+to audit what the bot saw over time and as a realistic benchmark workload.
+
+It can also compare the current state with a snapshot kept in the blob
+store (blob_store.py), to see what changed since then.
+
+Usage:
+    python replay_journal.py            # print the messages of every cycle
+    python replay_journal.py --quiet    # only print timing statistics
+    python replay_journal.py --snapshots          # list the stored snapshots
+    python replay_journal.py --since-snapshot [NAME]  # changes since a snapshot (the newest by default)
+"""
+
+import sys
+import copy
+import time
+from itertools import groupby
+from journal import journal, iter_history, load_base_state, apply_event
+from blob_store import blobs
+from course_tracker import check_for_updates, format_notification
+from assignment_tracker import format_assignment_notification
+from models import Assignment
+
+
+def format_changes(previous: dict, current: dict, added, modified) -> list:
+    """Messages for the changes from one state to another, as the bot would have sent them"""
+    messages = []
+    updates = check_for_updates(current['courses'], previous['courses'])
+    if updates:
+        messages.append(format_notification(updates))
+    for assignment_id in added:
+        assignment = Assignment.from_dict(current['assignments'][assignment_id])
+        messages.append("🆕 New Assignment!\n" + format_assignment_notification(assignment))
+    for assignment_id in sorted(set(modified) - set(added)):
+        if assignment_id in current['assignments']:
+            assignment = Assignment.from_dict(current['assignments'][assignment_id])
+            messages.append("📝 Assignment Updated!\n" + format_assignment_notification(assignment))
+    return messages
+
+
+def since_snapshot(name: str = None) -> list:
+    """
+    Messages for the changes between a stored snapshot and the current state.
+
+    Raises:
+        ValueError: If there is no such snapshot
+    """
+    snapshot = blobs.load_snapshot(name)
+    current = journal.load()
+    previous_assignments = snapshot['assignments']
+    added = [k for k in current['assignments'] if k not in previous_assignments]
+    modified = [k for k, v in current['assignments'].items()
+                if k in previous_assignments and previous_assignments[k] != v]
+    return format_changes(snapshot, current, added, modified)
+
+
+def batch_key(event: dict) -> str:
+    cycle = event.get('cycle', '-')
+    return event['ts'] if cycle == '-' else cycle
+
+
+def replay(quiet: bool = False) -> dict:
+    """
+    Replay the journal and return statistics about the replay.
+
+    Returns:
+        dict: Number of cycles, events and messages and the time spent
+              diffing and formatting
+    """
+    state = load_base_state()
+    stats = {'cycles': 0, 'events': 0, 'messages': 0, 'seconds': 0.0}
+
+    # Events appended in the same check cycle share a cycle ID (or a timestamp
+    # when they were recorded outside a check cycle)
+    for _, batch in groupby(iter_history(), key=batch_key):
+        batch = list(batch)
+        previous = copy.deepcopy(state)
+        for event in batch:
+            apply_event(state, event)
+        timestamp = batch[0]['ts']
+
+        started = time.perf_counter()
+        added = [e['id'] for e in batch if e['type'] == 'assignment_added']
+        modified = {e['id'] for e in batch if e['type'] in ('assignment_changed', 'due_date_moved')}
+        messages = format_changes(previous, state, added, modified)
+        stats['seconds'] += time.perf_counter() - started
+
+        stats['cycles'] += 1
+        stats['events'] += len(batch)
+        stats['messages'] += len(messages)
+        if not quiet:
+            print(f"=== Cycle at {timestamp} ({len(batch)} events) ===")
+            for message in messages:
+                print(message)
+                print()
+
+    return stats
+
+
+if __name__ == "__main__":
+    if "--snapshots" in sys.argv:
+        for name in blobs.list_snapshots():
+            print(name)
+        sys.exit(0)
+    if "--since-snapshot" in sys.argv:
+        position = sys.argv.index("--since-snapshot")
+        name = sys.argv[position + 1] if len(sys.argv) > position + 1 else None
+        try:
+            messages = since_snapshot(name)
+        except ValueError as e:
+            print(str(e))
+            sys.exit(1)
+        for message in messages:
+            print(message)
+            print()
+        print(f"{len(messages)} messages since snapshot {name or '(latest)'}")
+        sys.exit(0)
+    stats = replay(quiet="--quiet" in sys.argv)
+    print(f"Replayed {stats['cycles']} cycles, {stats['events']} events, "
+          f"{stats['messages']} messages in {stats['seconds'] * 1000:.1f} ms of diffing and formatting")
@@ -0,0 +1,249 @@
+"""
+Assignment Search for UniMAP Student Bot
+
+An in-memory inverted index over the names, descriptions and course names
+of the tracked assignments, behind the /search command and inline queries
+(`@bot lab report`).
+
+The index is built from assignments.json on first use and then kept up to
+date by the trackers, which pass it the assignments they found new, changed
+or gone. Only assignments whose text changed are tokenized again.
+
+Every query word has to match, apart from common words such as "the" or
+"due", which are not indexed. The last word also matches as a prefix, so
+inline queries find results while the user is still typing. Results are
+ranked by the sum of each matching term's weight (its field weight times
+its inverse document frequency), then by due date. Postings are grouped by
+weight, so assignments with the same score are handled as one set and a
+query costs a few set operations rather than a loop over every match.
+"""
+
+import re
+import math
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from models import Assignment
+
+FIELD_WEIGHTS = {'name': 3.0, 'course': 2.0, 'description': 1.0}  # Score of a term by the field it is in
+MAX_PREFIX_TERMS = 50  # Index terms a prefix is expanded to at most
+MIN_PREFIX_LENGTH = 2  # Shorter last words only match whole terms
+MAX_RESULTS = 10  # Results returned by default
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Words too common to search by, including those of questions like "when is the lab report due?"
+STOP_WORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it its of on or our so that the their this
+to was we what when where which will with you your due deadline
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in TOKEN_PATTERN.findall(text.casefold()) if word not in STOP_WORDS]
+
+
+def document_terms(assignment: Assignment) -> Dict[str, float]:
+    """Weighted terms of an assignment, each counted once per field"""
+    terms = defaultdict(float)
+    fields = {
+        'name': assignment.name,
+        'course': f"{assignment.course_code} {assignment.course_name}",
+        'description': assignment.description,
+    }
+    for field, text in fields.items():
+        for term in set(tokenize(text)):
+            terms[term] += FIELD_WEIGHTS[field]
+    return dict(terms)
+
+
+class SearchIndex:
+    """Inverted index of the tracked assignments (updated from worker threads, searched from the bot)."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.built = False
+        self.clear()
+
+    def clear(self):
+        self.assignments: Dict[str, Assignment] = {}
+        self.postings: Dict[str, Dict[float, Set[str]]] = {}  # term -> {weight: assignment IDs}
+        self.frequency: Dict[str, int] = {}  # term -> number of assignments containing it
+        self.doc_terms: Dict[str, Dict[str, float]] = {}  # assignment ID -> {term: weight}
+        self.due_order: Dict[str, float] = {}  # assignment ID -> due timestamp, to break ties
+        self.by_due_date: Optional[List[str]] = None  # Assignment IDs by due date, rebuilt after changes
+        self.vocabulary: List[str] = []  # Sorted terms, for prefix lookups
+
+    def build(self, assignments: Dict[str, Assignment]):
+        """Index all assignments, replacing the current contents"""
+        with self.lock:
+            self.clear()
+            self.built = True
+            self.update(assignments.values())
+        logging.info(f"Search index built with {len(self.assignments)} assignments and {len(self.postings)} terms")
+
+    def ensure_built(self, load: Callable[[], Dict[str, Assignment]]):
+        """Build the index from `load()` unless it was built already"""
+        if not self.built:
+            self.build(load())
+
+    def update(self, assignments: Iterable[Assignment]):
+        """Add new and changed assignments (no-op until the index is built)"""
+        if not self.built:
+            return
+        with self.lock:
+            for assignment in assignments:
+                terms = document_terms(assignment)
+                if self.doc_terms.get(assignment.id) != terms:
+                    self.remove_terms(assignment.id)
+                    for term, weight in terms.items():
+                        if term not in self.postings:
+                            self.postings[term] = {}
+                            self.frequency[term] = 0
+                            bisect.insort(self.vocabulary, term)
+                        self.postings[term].setdefault(weight, set()).add(assignment.id)
+                        self.frequency[term] += 1
+                    self.doc_terms[assignment.id] = terms
+                self.assignments[assignment.id] = assignment
+                self.due_order[assignment.id] = assignment.due_date.timestamp() if assignment.due_date else math.inf
+            self.by_due_date = None
+
+    def remove(self, assignment_ids: Iterable[str]):
+        """Drop assignments that are no longer tracked"""
+        with self.lock:
+            for assignment_id in assignment_ids:
+                self.remove_terms(assignment_id)
+                self.assignments.pop(assignment_id, None)
+                self.due_order.pop(assignment_id, None)
+            self.by_due_date = None
+
+    def remove_terms(self, assignment_id: str):
+        for term, weight in self.doc_terms.pop(assignment_id, {}).items():
+            classes = self.postings[term]
+            classes[weight].discard(assignment_id)
+            if not classes[weight]:
+                del classes[weight]
+            self.frequency[term] -= 1
+            if not self.frequency[term]:
+                del self.postings[term]
+                del self.frequency[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+
+    def expand_prefix(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def idf(self, term: str) -> float:
+        return math.log(1 + len(self.assignments) / self.frequency[term])
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> List[Assignment]:
+        """
+        Find the assignments matching every word of a query, best first.
+
+        Args:
+            query: Words to search for; the last one may be incomplete
+            limit: Maximum number of results
+
+        Returns:
+            List[Assignment]: Matching assignments
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        with self.lock:
+            return self.ranked(words, limit)
+
+    def ranked(self, words: List[str], limit: int) -> List[Assignment]:
+        # Assignments are scored in classes of equal score, so the work is done
+        # with set operations instead of per assignment
+        combined = None
+        for position, word in enumerate(words):
+            if position == len(words) - 1 and len(word) >= MIN_PREFIX_LENGTH:
+                terms = self.expand_prefix(word)
+            else:
+                terms = [word] if word in self.postings else []
+            if not terms:
+                return []
+            classes = self.word_classes(terms)
+            if combined is None:
+                combined = classes
+                continue
+            # An assignment must match every word; its score is the sum of its word scores
+            merged = defaultdict(set)
+            for score, ids in combined:
+                for word_score, word_ids in classes:
+                    common = ids & word_ids
+                    if common:
+                        merged[score + word_score] |= common
+            combined = list(merged.items())
+            if not combined:
+                return []
+
+        # Best score first, equal scores by due date
+        results = []
+        for score, ids in sorted(combined, key=lambda item: -item[0]):
+            needed = limit - len(results)
+            if needed <= 0:
+                break
+            if len(ids) <= needed:
+                results.extend(sorted(ids, key=self.due_order.get))
+            else:
+                results.extend(self.soonest_due(ids, needed))
+        return [self.assignments[assignment_id] for assignment_id in results]
+
+    def word_classes(self, terms: List[str]) -> List[Tuple[float, Set[str]]]:
+        """(score, assignment IDs) of a query word, where each assignment scores its best matching term"""
+        classes = sorted(((weight * self.idf(term), ids) for term in terms
+                          for weight, ids in self.postings[term].items()), key=lambda item: -item[0])
+        if len(terms) == 1:
+            return classes
+        best, seen = [], set()
+        for score, ids in classes:
+            new = ids - seen
+            if new:
+                best.append((score, new))
+                seen |= new
+        return best
+
+    def soonest_due(self, ids: Set[str], count: int) -> List[str]:
+        if self.by_due_date is None:
+            self.by_due_date = sorted(self.due_order, key=self.due_order.get)
+        soonest = []
+        for assignment_id in self.by_due_date:
+            if assignment_id in ids:
+                soonest.append(assignment_id)
+                if len(soonest) == count:
+                    break
+        return soonest
+
+
+def format_search_result(assignment: Assignment) -> str:
+    """Format one search result for Telegram"""
+    message = f"📝 {assignment.name}\n"
+    message += f"📚 {assignment.course_name or assignment.course_code}\n"
+    if assignment.due_date:
+        message += f"⏰ Due: {assignment.due_date.strftime('%d %b %Y, %I:%M %p')}\n"
+    message += f"Status: {assignment.submission_status}\n"
+    if assignment.url:
+        message += f"🔗 {assignment.url}\n"
+    return message
+
+
+def format_search_results(query: str, results: List[Assignment]) -> str:
+    """Format the results of /search for Telegram"""
+    if not results:
+        return f"🔍 No tracked assignments match \"{query}\"."
+    message = f"🔍 Results for \"{query}\"\n\n"
+    message += "\n".join(format_search_result(assignment) for assignment in results)
+    return message
+
+
+# Search index of the current process
+search_index = SearchIndex()
@@ -0,0 +1,203 @@
+"""
+Course Subscriptions for UniMAP Student Bot
+
+Besides the groups in TELEGRAM_CHAT_IDS, which get every notification,
+users can subscribe by direct message to the courses they take:
+
+- to every course or to specific course codes,
+- to everything (course updates, announcements, assignments, grades) or
+  to assignments and grades only,
+- optionally only to assignments due within a chosen number of days.
+
+Subscriptions are kept in subscriptions.json. Delivery looks the
+recipients of an event up in an index from (course, kind of event) to
+subscribers, which is updated whenever a subscription changes, so the cost
+of fanning an event out grows with the number of interested users rather
+than with the number of subscribers.
+"""
+
+import os
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+import pytz
+from clock import clock
+
+SUBSCRIPTIONS_FILE = "subscriptions.json"
+TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8
+ALL_COURSES = "*"  # Course key of subscriptions to every course
+
+# Kinds of events subscribers choose between
+UPDATES = "updates"  # Course content changes, announcements and courses that stopped updating
+ASSIGNMENTS = "assignments"  # New, changed and rescheduled assignments
+GRADES = "grades"  # Released marks
+
+
+@dataclass
+class Subscription:
+    """
+    A user's notification preferences.
+
+    Attributes:
+        user_id: Telegram user ID (also the ID of the private chat)
+        courses: Subscribed course codes, empty for every course
+        assignments_only: Skip course updates and announcements
+        within_days: Only notify about assignments due within this many days (None for all)
+    """
+    user_id: str
+    courses: List[str] = field(default_factory=list)
+    assignments_only: bool = False
+    within_days: Optional[int] = None
+
+    def kinds(self) -> List[str]:
+        return [ASSIGNMENTS, GRADES] if self.assignments_only else [UPDATES, ASSIGNMENTS, GRADES]
+
+    def index_keys(self) -> List[Tuple[str, str]]:
+        """Keys of the fan-out index this subscription is listed under"""
+        return [(course_code, kind) for course_code in (self.courses or [ALL_COURSES]) for kind in self.kinds()]
+
+    def to_dict(self) -> dict:
+        return {
+            'user_id': self.user_id,
+            'courses': self.courses,
+            'assignments_only': self.assignments_only,
+            'within_days': self.within_days
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Subscription':
+        return cls(
+            user_id=str(data['user_id']),
+            courses=list(data.get('courses', [])),
+            assignments_only=data.get('assignments_only', False),
+            within_days=data.get('within_days')
+        )
+
+
+def event_targets(event: Dict) -> Tuple[str, List[str]]:
+    """The kind of an event and the course codes it is about"""
+    if event['type'] == 'course_updates':
+        return UPDATES, list(event['updates'])
+    if event['type'] == 'forum_post':
+        return UPDATES, [event['post']['course_code']]
+    if event['type'] == 'grade_released':
+        return GRADES, [event['grade']['course_code']]
+    if event['type'] in ('course_stale', 'course_recovered'):
+        return UPDATES, [event['course_code']]
+    return ASSIGNMENTS, [event['assignment']['course_code']]
+
+
+def due_within(event: Dict, days: int) -> bool:
+    """Whether the assignment of an event is due within `days` days (or has no due date)"""
+    due_date = event['assignment'].get('due_date')
+    if not due_date:
+        return True
+    remaining = datetime.fromisoformat(due_date) - clock.now()
+    return remaining.total_seconds() <= days * 86400
+
+
+class SubscriptionStore:
+    """Subscriptions by user and the index used to fan events out."""
+
+    def __init__(self, path: str = SUBSCRIPTIONS_FILE):
+        self.path = path
+        self.subscriptions: Optional[Dict[str, Subscription]] = None
+        self.index: Dict[Tuple[str, str], Set[str]] = {}  # (course code or ALL_COURSES, kind) -> user IDs
+        self.indexed_keys: Dict[str, List[Tuple[str, str]]] = {}  # user ID -> keys the user is listed under
+
+    def load(self) -> Dict[str, Subscription]:
+        if self.subscriptions is None:
+            self.subscriptions = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, 'r') as f:
+                        records = json.load(f)
+                    self.subscriptions = {user_id: Subscription.from_dict(record) for user_id, record in records.items()}
+                except Exception as e:
+                    logging.error(f"Error loading subscriptions: {str(e)}")
+            for subscription in self.subscriptions.values():
+                self.add_to_index(subscription)
+        return self.subscriptions
+
+    def save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({user_id: s.to_dict() for user_id, s in self.subscriptions.items()}, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logging.error(f"Error saving subscriptions: {str(e)}")
+
+    def add_to_index(self, subscription: Subscription):
+        keys = subscription.index_keys()
+        for key in keys:
+            self.index.setdefault(key, set()).add(subscription.user_id)
+        self.indexed_keys[subscription.user_id] = keys
+
+    def remove_from_index(self, user_id: str):
+        for key in self.indexed_keys.pop(user_id, []):
+            users = self.index[key]
+            users.discard(user_id)
+            if not users:
+                del self.index[key]
+
+    def get(self, user_id: str) -> Optional[Subscription]:
+        return self.load().get(str(user_id))
+
+    def put(self, subscription: Subscription):
+        """Add or replace a user's subscription and save"""
+        subscriptions = self.load()
+        self.remove_from_index(subscription.user_id)
+        subscriptions[subscription.user_id] = subscription
+        self.add_to_index(subscription)
+        self.save()
+
+    def remove(self, user_id: str) -> bool:
+        """Delete a user's subscription, returning whether there was one"""
+        subscription = self.load().pop(str(user_id), None)
+        if subscription is None:
+            return False
+        self.remove_from_index(subscription.user_id)
+        self.save()
+        return True
+
+    def recipients(self, event: Dict) -> List[str]:
+        """
+        Users to send an event to, looked up in the fan-out index.
+
+        Only the users listed for the event's courses and kind are looked at,
+        so the cost grows with the number of interested users.
+        """
+        self.load()
+        kind, course_codes = event_targets(event)
+        users = set(self.index.get((ALL_COURSES, kind), ()))
+        for course_code in course_codes:
+            users.update(self.index.get((course_code, kind), ()))
+        if kind == ASSIGNMENTS:
+            users = {user_id for user_id in users
+                     if self.subscriptions[user_id].within_days is None
+                     or due_within(event, self.subscriptions[user_id].within_days)}
+        return sorted(users)
+
+
+def format_subscription(subscription: Optional[Subscription], course_names: Dict[str, str]) -> str:
+    """Describe a user's subscription for Telegram"""
+    if subscription is None:
+        return "You are not subscribed. Send /subscribe all or /subscribe <course code> to start."
+    message = "🔔 Your subscription\n\n"
+    if subscription.courses:
+        message += "Courses:\n"
+        for course_code in subscription.courses:
+            message += f"• {course_names.get(course_code, course_code)} ({course_code})\n"
+    else:
+        message += "Courses: all tracked courses\n"
+    message += f"\nNotifications: {'assignments and grades only' if subscription.assignments_only else 'everything'}\n"
+    if subscription.within_days is not None:
+        message += f"Assignments: only those due within {subscription.within_days} days\n"
+    return message
+
+
+# Subscriptions of the current process
+subscriptions = SubscriptionStore()
@@ -0,0 +1,375 @@
+"""
+Synthetic Portal for UniMAP Student Bot
+
+Generates Moodle course pages, assignment indexes, assignment pages,
+recent activity reports, grade reports, announcement forums and state
+snapshots of any size, in the same markup the scrapers parse. Used by the scaling benchmark
+(benchmarks/scaling.py) to see how the bot copes with hundreds of courses
+without touching the real portal.
+
+`SyntheticPortal` can stand in for a logged-in `PortalClient`: it answers
+`get()` for the generated pages and 404 for everything else.
+"""
+
+import json
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+import pytz
+from models import Assignment
+from clock import clock
+
+BASE_URL = "https://elearning.unimap.edu.my"
+TIMEZONE = pytz.timezone('Asia/Kuala_Lumpur')  # GMT+8
+FIRST_COURSE_ID = 100000
+STATUSES = ["Not completed", "Completed", "Not completed: Submit", "Done: View"]
+MOODLE_DATE_FORMAT = '%A, %d %B %Y, %I:%M %p'
+
+
+def synthetic_courses(num_courses: int) -> Dict[str, Dict]:
+    """Course configuration in the format of config.COURSES"""
+    return {
+        f"SYN{i:04d}": {
+            "name": f"SYN{i:04d}(Synthetic Course {i})",
+            "url": f"{BASE_URL}/course/view.php?id={FIRST_COURSE_ID + i}"
+        }
+        for i in range(num_courses)
+    }
+
+
+class SyntheticResponse:
+    """The parts of requests.Response the scrapers use."""
+
+    def __init__(self, url: str, text: str = "", status_code: int = 200):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+        self.ok = status_code < 400
+
+    @property
+    def content(self) -> bytes:
+        return self.text.encode('utf-8')
+
+    def iter_lines(self, decode_unicode: bool = False):
+        return iter(self.text.splitlines())
+
+    def close(self):
+        pass
+
+
+class SyntheticPortal:
+    """
+    Deterministic fake Moodle portal.
+
+    Args:
+        num_courses: Number of courses (see `synthetic_courses()`)
+        sections: Sections per course
+        activities: Activities per course, spread over the sections
+        assignments: Assignments per course, counted in `activities`
+        seed: Seed for names, statuses and due dates
+        now: Time due dates are generated relative to
+        forums: Whether each course has an announcement forum
+    """
+
+    def __init__(self, num_courses: int = 10, sections: int = 10, activities: int = 100,
+                 assignments: int = 5, seed: int = 0, now: Optional[datetime] = None, forums: bool = False):
+        self.courses = synthetic_courses(num_courses)
+        self.sections = sections
+        self.activities = activities
+        self.assignments_per_course = min(assignments, activities)
+        self.random = random.Random(seed)
+        self.now = now or clock.now()
+        self.requests = 0
+        self.statuses: Dict[str, Dict[int, str]] = {code: {} for code in self.courses}
+        self.extra_activities: Dict[str, int] = {code: 0 for code in self.courses}
+        self.activity_log: List[Tuple[float, str, str, str]] = []  # (time, course code, module type, module ID)
+        self.grades: Dict[str, float] = {}  # assignment ID -> released grade
+        self.forums = forums
+        self.forum_courses = {self.forum_id(code): code for code in self.courses}
+        self.discussions: Dict[str, List[int]] = {code: [] for code in self.courses}  # Announcement IDs per course
+        self.due_dates: Dict[str, datetime] = {}
+        for course_code in self.courses:
+            for number in range(self.assignments_per_course):
+                days = self.random.randint(1, 60)
+                self.due_dates[self.assignment_id(course_code, number)] = (
+                    self.now + timedelta(days=days)).replace(second=0, microsecond=0)
+
+    # Session interface
+
+    def ensure_logged_in(self):
+        pass
+
+    def get(self, url: str, **kwargs) -> SyntheticResponse:
+        self.requests += 1
+        parsed = urlparse(url)
+        item_id = parse_qs(parsed.query).get('id', [''])[0]
+        if parsed.path == "/course/view.php":
+            course_code = self.course_by_id(item_id)
+            if course_code:
+                return SyntheticResponse(url, self.course_page(course_code))
+        elif parsed.path == "/mod/assign/index.php":
+            course_code = self.course_by_id(item_id)
+            if course_code:
+                return SyntheticResponse(url, self.assignment_index(course_code))
+        elif parsed.path == "/mod/assign/view.php" and item_id in self.due_dates:
+            return SyntheticResponse(url, self.assignment_page(item_id))
+        elif parsed.path == "/mod/forum/view.php" and self.forums:
+            course_code = self.forum_courses.get(item_id)
+            if course_code:
+                return SyntheticResponse(url, self.forum_page(course_code))
+        elif parsed.path == "/course/recent.php":
+            course_code = self.course_by_id(item_id)
+            if course_code:
+                since = float(parse_qs(parsed.query).get('date', ['0'])[0])
+                return SyntheticResponse(url, self.recent_activity(course_code, since))
+        elif parsed.path == "/grade/report/overview/index.php":
+            return SyntheticResponse(url, self.grade_overview())
+        elif parsed.path == "/grade/report/user/index.php":
+            course_code = self.course_by_id(item_id)
+            if course_code:
+                return SyntheticResponse(url, self.grade_report(course_code))
+        elif parsed.path == "/my/":
+            return SyntheticResponse(url, self.page_header() + "<h2>Dashboard</h2></body></html>")
+        return SyntheticResponse(url, "Not found", 404)
+
+    def post(self, url: str, data=None, **kwargs) -> SyntheticResponse:
+        self.requests += 1
+        if urlparse(url).path == "/lib/ajax/service.php":
+            return SyntheticResponse(url, json.dumps([self.ajax_call(call) for call in json.loads(data)]))
+        return SyntheticResponse(url, "Not found", 404)
+
+    # Changes
+
+    def mutate(self, changes: int):
+        """Change the status of `changes` random activities and add one activity per changed course."""
+        for _ in range(changes):
+            course_code = self.random.choice(list(self.courses))
+            number = self.random.randrange(self.activities)
+            self.statuses[course_code][number] = self.random.choice(STATUSES)
+            added = self.activities + self.extra_activities[course_code]
+            self.extra_activities[course_code] += 1
+            for changed in (number, added):
+                self.activity_log.append((clock.time(), course_code, *self.module(course_code, changed)))
+
+    def release_grade(self, assignment_id: str, grade: float):
+        """Grade an assignment (out of 100)"""
+        self.grades[assignment_id] = grade
+
+    def post_announcement(self, course_code: str):
+        """Start a discussion in a course's announcement forum"""
+        self.discussions[course_code].append(sum(len(ids) for ids in self.discussions.values()) + 1)
+
+    # Pages
+
+    def course_by_id(self, course_id: str) -> Optional[str]:
+        try:
+            code = f"SYN{int(course_id) - FIRST_COURSE_ID:04d}"
+        except ValueError:
+            return None
+        return code if code in self.courses else None
+
+    def forum_id(self, course_code: str) -> str:
+        return f"{int(course_code[3:]) + 1}800000"
+
+    def assignment_id(self, course_code: str, number: int) -> str:
+        return f"{int(course_code[3:]) + 1}{number:04d}"
+
+    def module(self, course_code: str, number: int) -> Tuple[str, str]:
+        """Module type and ID of an activity"""
+        if number < self.assignments_per_course:
+            return "assign", self.assignment_id(course_code, number)
+        return "resource", f"{int(course_code[3:]) + 1}9{number:05d}"
+
+    def activity_status(self, course_code: str, number: int) -> str:
+        return self.statuses[course_code].get(number, STATUSES[number % 2])
+
+    def section_activities(self, course_code: str) -> List[range]:
+        """Activity numbers of each section; added activities go to the last section"""
+        per_section = max(1, -(-self.activities // self.sections))
+        ranges = [range(section * per_section, min(self.activities, (section + 1) * per_section))
+                  for section in range(self.sections)]
+        ranges[-1] = range(ranges[-1].start, self.activities + self.extra_activities[course_code])
+        return ranges
+
+    def page_header(self, page_id: str = "page-course-view") -> str:
+        """Page head with the values Moodle changes on every request (sesskey, timestamps, YUI IDs)"""
+        sesskey = f"{self.random.getrandbits(40):010x}"
+        timestamp = int(self.now.timestamp()) + self.requests
+        return (f'<html><head><script>M.cfg = {{"sesskey":"{sesskey}","time":{timestamp}}};</script></head>'
+                f'<body id="{page_id}" data-generated="{timestamp}000">'
+                f'<div id="yui_3_17_2_1_{timestamp}123_{self.requests}" class="usermenu">'
+                f'<a href="{BASE_URL}/login/logout.php?sesskey={sesskey}">Log out</a></div>')
+
+    def course_page(self, course_code: str) -> str:
+        parts = [self.page_header(), '<ul class="topics">']
+        for section, numbers in enumerate(self.section_activities(course_code)):
+            parts.append(f'<li class="section main clearfix" id="section-{section}">'
+                         f'<h3 class="sectionname">Topic {section + 1}</h3><ul class="section">')
+            if section == 0 and self.forums:
+                parts.append(f'<li class="activity forum modtype_forum"><a class="aalink" '
+                             f'href="{BASE_URL}/mod/forum/view.php?id={self.forum_id(course_code)}">'
+                             f'<span class="instancename">Announcements</span></a></li>')
+            for number in numbers:
+                if number < self.assignments_per_course:
+                    assignment_id = self.assignment_id(course_code, number)
+                    parts.append(f'<li class="activity assign modtype_assign"><a class="aalink" '
+                                 f'href="{BASE_URL}/mod/assign/view.php?id={assignment_id}">'
+                                 f'<span class="instancename">Assignment {number + 1}</span></a>'
+                                 f'<img alt="{self.activity_status(course_code, number)}"></li>')
+                else:
+                    parts.append(f'<li class="activity resource modtype_resource"><a class="aalink" href="#">'
+                                 f'<span class="instancename">Activity {number + 1}</span></a>'
+                                 f'<img alt="{self.activity_status(course_code, number)}"></li>')
+            parts.append('</ul></li>')
+        parts.append('</ul></body></html>')
+        return "".join(parts)
+
+    def recent_activity(self, course_code: str, since: float) -> str:
+        modules = {(module_type, module_id): None for logged, code, module_type, module_id in self.activity_log
+                   if code == course_code and logged >= since}
+        parts = [self.page_header("page-course-recent"), '<div id="region-main"><h2>Recent activity</h2>']
+        if not modules:
+            parts.append('<p>No recent activity</p>')
+        for module_type, module_id in modules:
+            parts.append(f'<p class="activity">Updated {module_type}:<br>'
+                         f'<a href="{BASE_URL}/mod/{module_type}/view.php?id={module_id}">Activity {module_id}</a></p>')
+        parts.append('</div></body></html>')
+        return "".join(parts)
+
+    def forum_page(self, course_code: str) -> str:
+        parts = [self.page_header("page-mod-forum-view"), '<table class="discussion-list"><tbody>']
+        for discussion_id in reversed(self.discussions[course_code]):
+            parts.append(f'<tr><td><a href="{BASE_URL}/mod/forum/discuss.php?d={discussion_id}">'
+                         f'Announcement {discussion_id}</a></td></tr>')
+        parts.append('</tbody></table></body></html>')
+        return "".join(parts)
+
+    def assignment_index(self, course_code: str) -> str:
+        parts = ['<table class="generaltable"><thead><tr><th>Topic</th><th>Assignment</th>'
+                 '<th>Due date</th><th>Submission</th></tr></thead><tbody>']
+        for number in range(self.assignments_per_course):
+            assignment_id = self.assignment_id(course_code, number)
+            parts.append(f'<tr><td>Topic 1</td><td><a href="view.php?id={assignment_id}">Assignment {number + 1}</a></td>'
+                         f'<td>{self.due_dates[assignment_id].strftime(MOODLE_DATE_FORMAT)}</td>'
+                         f'<td>No submission</td></tr>')
+        parts.append('</tbody></table>')
+        return "".join(parts)
+
+    def assignment_page(self, assignment_id: str) -> str:
+        number = int(assignment_id[-4:])
+        return (f'<h2>Assignment {number + 1}</h2><div id="intro">Synthetic assignment {assignment_id}.</div>'
+                f'<table class="generaltable">'
+                f'<tr><th>Submission status</th><td>No attempt</td></tr>'
+                f'<tr><th>Grading status</th><td>Not graded</td></tr>'
+                f'<tr><th>Due date</th><td>{self.due_dates[assignment_id].strftime(MOODLE_DATE_FORMAT)}</td></tr>'
+                f'<tr><th>Time remaining</th><td>-</td></tr>'
+                f'<tr><th>Last modified</th><td>-</td></tr></table>')
+
+    def course_grades(self, course_code: str) -> List[Tuple[str, Optional[float]]]:
+        return [(assignment_id, self.grades.get(assignment_id))
+                for assignment_id in (self.assignment_id(course_code, number)
+                                      for number in range(self.assignments_per_course))]
+
+    def grade_overview(self) -> str:
+        parts = [self.page_header("page-grade-report-overview-index"), '<table id="overview-grade" class="generaltable">'
+                 '<thead><tr><th>Course name</th><th>Grade</th></tr></thead><tbody>']
+        for course_code, course in self.courses.items():
+            grades = [grade for _, grade in self.course_grades(course_code) if grade is not None]
+            total = f"{sum(grades):.2f}" if grades else "-"
+            parts.append(f'<tr><td class="cell c0"><a href="{BASE_URL}/grade/report/user/index.php?id='
+                         f'{FIRST_COURSE_ID + int(course_code[3:])}">{course["name"]}</a></td>'
+                         f'<td class="cell c1">{total}</td></tr>')
+        parts.append('</tbody></table></body></html>')
+        return "".join(parts)
+
+    def grade_report(self, course_code: str) -> str:
+        parts = [self.page_header("page-grade-report-user-index"), '<table class="generaltable user-grade">']
+        for number, (assignment_id, grade) in enumerate(self.course_grades(course_code)):
+            parts.append(f'<tr><th class="level2 column-itemname"><a class="gradeitemheader" '
+                         f'href="{BASE_URL}/mod/assign/view.php?id={assignment_id}">Assignment {number + 1}</a></th>'
+                         f'<td class="level2 column-grade">{"-" if grade is None else f"{grade:.2f}"}</td>'
+                         f'<td class="level2 column-range">0–100</td></tr>')
+        parts.append('<tr><th class="level1 column-itemname">Course total</th><td class="level1 column-grade">-</td></tr>'
+                     '</table></body></html>')
+        return "".join(parts)
+
+    # AJAX service
+
+    def ajax_call(self, call: Dict) -> Dict:
+        """Answer one call to lib/ajax/service.php"""
+        args = call['args']
+        if call['methodname'] == "core_calendar_get_action_events_by_timesort":
+            events = sorted(self.action_events(args.get('timesortfrom', 0)), key=lambda e: (e['timesort'], e['id']))
+            if args.get('aftereventid'):
+                ids = [event['id'] for event in events]
+                events = events[ids.index(args['aftereventid']) + 1:] if args['aftereventid'] in ids else []
+            events = events[:args.get('limitnum', 20)]
+            return {"error": False, "data": {"events": events,
+                                             "firstid": events[0]['id'] if events else 0,
+                                             "lastid": events[-1]['id'] if events else 0}}
+        if call['methodname'] == "core_course_get_enrolled_courses_by_timeline_classification":
+            courses = [{"id": FIRST_COURSE_ID + int(code[3:]), "shortname": code, "fullname": course['name'],
+                        "viewurl": course['url']} for code, course in self.courses.items()]
+            return {"error": False, "data": {"courses": courses, "nextoffset": len(courses)}}
+        return {"error": True, "exception": {"errorcode": "servicenotavailable",
+                                             "message": f"Web service {call['methodname']} is not available"}}
+
+    def action_events(self, timesort_from: int) -> List[Dict]:
+        events = []
+        for course_code in self.courses:
+            for number in range(self.assignments_per_course):
+                assignment_id = self.assignment_id(course_code, number)
+                timesort = int(self.due_dates[assignment_id].timestamp())
+                if timesort >= timesort_from:
+                    events.append({
+                        "id": int(assignment_id), "name": f"Assignment {number + 1} is due",
+                        "activityname": f"Assignment {number + 1}", "modulename": "assign",
+                        "timesort": timesort, "course": {"id": FIRST_COURSE_ID + int(course_code[3:])},
+                        "url": f"{BASE_URL}/mod/assign/view.php?id={assignment_id}",
+                    })
+        return events
+
+    # State snapshots
+
+    def course_state(self, course_code: str) -> Dict:
+        """The state `scrape_course()` returns for a course page"""
+        state = {}
+        for section, numbers in enumerate(self.section_activities(course_code)):
+            state[f"section-{section}"] = {
+                "name": f"Topic {section + 1}",
+                "activities": [
+                    {"name": f"{'Assignment' if number < self.assignments_per_course else 'Activity'} {number + 1}",
+                     "status": self.activity_status(course_code, number)}
+                    for number in numbers
+                ]
+            }
+        return state
+
+    def state(self) -> Dict[str, Dict]:
+        """Course state of every course, as stored by the journal"""
+        return {course_code: self.course_state(course_code) for course_code in self.courses}
+
+    def tracked_assignments(self) -> Dict[str, Assignment]:
+        """Assignments as stored in assignments.json"""
+        assignments = {}
+        for course_code, course in self.courses.items():
+            for number in range(self.assignments_per_course):
+                assignment_id = self.assignment_id(course_code, number)
+                assignments[assignment_id] = Assignment(
+                    course_code=course_code,
+                    course_name=course['name'],
+                    name=f"Assignment {number + 1}",
+                    due_date=self.due_dates[assignment_id],
+                    time_remaining="-",
+                    description=f"Synthetic assignment {assignment_id}.",
+                    url=f"{BASE_URL}/mod/assign/view.php?id={assignment_id}",
+                    last_modified="-",
+                    id=assignment_id
+                )
+        return assignments
+
+
+def synthetic_assignments(num_courses: int, per_course: int, seed: int = 0) -> Dict[str, Assignment]:
+    """Tracked assignments for `num_courses` synthetic courses"""
+    return SyntheticPortal(num_courses, activities=per_course, assignments=per_course, seed=seed).tracked_assignments()
@@ -0,0 +1,45 @@
+"""
+Tests for the Forum Tracker of UniMAP Student Bot
+"""
+
+from forum_tracker import parse_rss_entries
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel>
+<item>
+  <title>Re: Class cancelled</title>
+  <link>https://portal.unimap.edu.my/mod/forum/discuss.php?d=42#p102</link>
+  <description>Moved to Friday</description>
+  <pubDate>Tue, 13 Oct 2026 10:00:00 GMT</pubDate>
+</item>
+<item>
+  <title>Re: Old question</title>
+  <link>https://portal.unimap.edu.my/mod/forum/discuss.php?d=7#p101</link>
+  <description>Answered</description>
+  <pubDate>Tue, 13 Oct 2026 09:00:00 GMT</pubDate>
+</item>
+<item>
+  <title>Class cancelled</title>
+  <link>https://portal.unimap.edu.my/mod/forum/discuss.php?d=42#p100</link>
+  <description>No class today</description>
+  <pubDate>Tue, 13 Oct 2026 08:00:00 GMT</pubDate>
+</item>
+<item>
+  <title>Welcome</title>
+  <link>https://portal.unimap.edu.my/mod/forum/discuss.php?d=41#p99</link>
+  <description>Hello</description>
+  <pubDate>Mon, 12 Oct 2026 08:00:00 GMT</pubDate>
+</item>
+</channel></rss>"""
+
+
+def test_replies_to_one_discussion_give_one_entry():
+    entries = parse_rss_entries(FEED, last_seen_id=10)
+    assert [entry['id'] for entry in entries] == [42, 41]
+    assert entries[0]['title'] == 'Re: Class cancelled'
+    assert entries[0]['message'] == 'Moved to Friday'
+
+
+def test_entries_already_seen_are_skipped():
+    assert parse_rss_entries(FEED, last_seen_id=41) == [parse_rss_entries(FEED, 10)[0]]
+    assert parse_rss_entries(FEED, last_seen_id=42) == []
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Crawler and Notifier Workers
+
+Runs the bot as two independent processes connected by a durable queue
+(event_queue.py):
+
+- The crawler checks the portal on schedule and publishes change events.
+- The notifier consumes the events and sends them to the Telegram groups
+  and to the users subscribed to them (see subscriptions.py).
+
+A slow or failing Telegram send no longer delays the next scrape, and a
+scrape crash does not take the notifier down. Either side can be restarted
+on its own; queued events are kept in events.db in the meantime, and each
+event is published in the same transaction as the state it came from, so
+a crash neither loses nor repeats notifications (see outbox.py). The
+notifier also keeps the pinned dashboards (dashboard.py) up to date. Several
+notifiers can consume the same queue. The crawler stops publishing while
+the queue is above QUEUE_HIGH_WATERMARK, and both sides report queue depth
+and lag in their metrics file.
+
+Usage:
+    python workers.py crawler
+    python workers.py notifier
+"""
+
+# Load environment variables first before any other imports
+from dotenv import load_dotenv
+load_dotenv()
+
+import sys
+import copy
+import time
+import asyncio
+import logging
+from telegram import Bot
+from config import TELEGRAM_BOT_TOKEN
+from portal_client import PortalClient, backoff_delay
+from log_config import setup_logging, new_cycle_id
+from metrics import metrics
+from event_queue import EventQueue
+from config_watcher import ConfigWatcher, apply_config_change, CONFIG_POLL_INTERVAL
+from outbox import commit_changes, apply_pending_states, deliver_batch, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX
+from assignment_tracker import format_tracked_assignments_summary, save_state_snapshot
+from dashboard import dashboard
+from chat_registry import chat_registry, poll_membership_updates
+from clock import clock
+from forum_tracker import load_forum_state, check_forum_updates, FORUM_POLL_INTERVAL
+from grade_tracker import load_grade_state, check_grade_updates
+from monitor import get_next_check_time, stream_check_cycle, forum_post_event, grade_event
+
+QUEUE_HIGH_WATERMARK = 200  # Crawler waits while more events than this are queued
+BACKPRESSURE_POLL_INTERVAL = 30  # seconds between queue depth checks while waiting
+NOTIFIER_POLL_INTERVAL = 5  # seconds between polls of an empty queue
+NOTIFIER_BATCH_SIZE = 10  # Events claimed at once
+
+
+def record_queue_metrics(queue: EventQueue):
+    metrics.gauge('queue.depth', queue.depth())
+    metrics.gauge('queue.lag_seconds', round(queue.lag_seconds(), 1))
+    metrics.flush()
+
+
+def apply_config_updates(watcher: ConfigWatcher, client=None):
+    """
+    Apply changes to config.py and .env.
+
+    Only the crawler (which passes its portal client) updates the stored
+    state; the notifier just picks up the new courses and chats.
+    """
+    try:
+        change = watcher.poll()
+        if (change.added_courses or change.updated_courses) and client is not None:
+            client.ensure_logged_in()
+        apply_config_change(client, change, update_state=client is not None)
+    except Exception as e:
+        logging.error(f"Error applying configuration change: {str(e)}")
+
+
+def poll_forums(client, queue: EventQueue, forum_state):
+    """Publish new announcement forum posts"""
+    try:
+        new_cycle_id()
+        # Poll on a copy: if the commit fails, the posts are found again next time
+        polled = copy.deepcopy(forum_state)
+        posts = check_forum_updates(client, polled)
+        commit_changes(queue, [forum_post_event(post) for post in posts], forums=polled)
+        forum_state.clear()
+        forum_state.update(polled)
+        metrics.incr('crawler.forum_posts', len(posts))
+    except Exception as e:
+        logging.error(f"Error polling forums: {str(e)}")
+
+
+def poll_grades(client, queue: EventQueue, grade_state, cycle_id: str) -> int:
+    """Publish released grades, returning how many there were"""
+    try:
+        # Check on a copy: if the commit fails, the grades are found again next time
+        checked = copy.deepcopy(grade_state)
+        grades = check_grade_updates(client, checked)
+        events = [grade_event(grade) for grade in grades]
+        for event in events:
+            event['cycle_id'] = cycle_id
+        commit_changes(queue, events, grades=checked)
+        grade_state.clear()
+        grade_state.update(checked)
+        return len(events)
+    except Exception as e:
+        logging.error(f"Error checking grades: {str(e)}")
+        return 0
+
+
+def run_crawler():
+    """Check the portal on schedule and publish change events to the queue."""
+    setup_logging(log_file="crawler.log")
+    metrics.path = "crawler_metrics.json"
+    queue = EventQueue()
+    client = PortalClient()
+    watcher = ConfigWatcher()
+    consecutive_failures = 0
+    logging.info("Crawler worker started")
+    apply_pending_states(queue)
+    forum_state = load_forum_state()
+    grade_state = load_grade_state()
+    last_forum_poll = None
+
+    while True:
+        next_check = get_next_check_time()
+        wait_seconds = (next_check - clock.now()).total_seconds()
+        if consecutive_failures:
+            wait_seconds = min(wait_seconds, backoff_delay(consecutive_failures, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX))
+        logging.info(f"Next crawl in {wait_seconds/60:.1f} minutes")
+        deadline = clock.time() + wait_seconds
+        while clock.time() < deadline:
+            if last_forum_poll is None or clock.time() - last_forum_poll >= FORUM_POLL_INTERVAL:
+                last_forum_poll = clock.time()
+                poll_forums(client, queue, forum_state)
+            clock.sleep_blocking(min(CONFIG_POLL_INTERVAL, deadline - clock.time()))
+            apply_config_updates(watcher, client)
+
+        # Backpressure: let the notifier catch up before adding more events
+        while queue.depth() > QUEUE_HIGH_WATERMARK:
+            logging.warning(f"Queue depth {queue.depth()} above {QUEUE_HIGH_WATERMARK}, "
+                            f"lag {queue.lag_seconds():.0f}s - waiting for the notifier")
+            metrics.incr('crawler.backpressure_waits')
+            record_queue_metrics(queue)
+            clock.sleep_blocking(BACKPRESSURE_POLL_INTERVAL)
+
+        try:
+            cycle_id = new_cycle_id()
+            logging.info(f"Starting check cycle {cycle_id}")
+            started = time.monotonic()
+            published = 0
+            # Each course is published and saved as soon as it is scraped
+            for events, courses, assignments in stream_check_cycle(client):
+                for event in events:
+                    event['cycle_id'] = cycle_id
+                commit_changes(queue, events, courses, assignments)
+                published += len(events)
+            published += poll_grades(client, queue, grade_state, cycle_id)
+            save_state_snapshot()
+
+            consecutive_failures = 0
+            metrics.incr('crawler.cycles')
+            metrics.incr('crawler.events_published', published)
+            metrics.gauge('crawler.last_cycle_seconds', round(time.monotonic() - started, 2))
+            logging.info(f"Published {published} events")
+        except Exception as e:
+            consecutive_failures += 1
+            metrics.incr('crawler.failed_cycles')
+            logging.error(f"Error during crawl (attempt {consecutive_failures}): {str(e)}")
+        record_queue_metrics(queue)
+
+
+async def run_notifier():
+    """Consume change events from the queue and send them to Telegram."""
+    setup_logging(log_file="notifier.log")
+    metrics.path = "notifier_metrics.json"
+    queue = EventQueue()
+    watcher = ConfigWatcher()
+    logging.info("Notifier worker started")
+
+    async with Bot(TELEGRAM_BOT_TOKEN) as bot:
+        await dashboard.update_all(bot, chat_registry.notification_chats(), format_tracked_assignments_summary(), force=True)
+        # Register the chats the bot is added to (the notifier is the only worker talking to Telegram)
+        asyncio.create_task(poll_membership_updates(bot))
+        while True:
+            delivered, retry_delay = await deliver_batch(bot, queue, NOTIFIER_BATCH_SIZE)
+            if not delivered and retry_delay is None:
+                apply_config_updates(watcher)
+                record_queue_metrics(queue)
+                await clock.sleep(NOTIFIER_POLL_INTERVAL)
+                continue
+
+            for item in delivered:
+                metrics.incr('notifier.delivered')
+                metrics.gauge('notifier.delivery_lag_seconds', round(time.time() - item['created_at'], 1))
+            if retry_delay is not None:
+                # Some chats are unreachable; only they get the event on the next attempt
+                metrics.incr('notifier.retries')
+                await clock.sleep(retry_delay)
+            
+            # The crawler saved the assignments before publishing, so the
+            # pinned dashboards can be brought up to date now
+            if await dashboard.update_all(bot, chat_registry.notification_chats(), format_tracked_assignments_summary()):
+                metrics.incr('notifier.dashboard_updates')
+            record_queue_metrics(queue)
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else ""
+    try:
+        if mode == "crawler":
+            run_crawler()
+        elif mode == "notifier":
+            asyncio.run(run_notifier())
+        else:
+            print(__doc__)
+            sys.exit(1)
+    except KeyboardInterrupt:
+        print(f"\n{mode.capitalize()} worker stopped by user...")